@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+import time
 from pathlib import Path
 from typing import Dict
 from datetime import datetime
@@ -9,7 +10,7 @@ from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 
 from utils.security_middleware import apply_security_middleware
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from config import load_config, get_pipeline_config, PipelineConfig
 from security.auth_manager import AuthManager
@@ -18,18 +19,24 @@ from pipeline import ContentPipeline
 from analytics.reporting import ReportingService, TimeRange
 from services.factory import create_services
 from utils.logging_config import setup_logging
+from optimization import connection_pool
+from monitoring.structured_logger import get_logger
 from utils.error_handling import error_middleware
-from infrastructure.task_queue import TaskQueue, JobStatus
+from utils.deadline import deadline
+from exceptions import DeadlineExceededError, ServiceError
+from infrastructure.task_queue import SQLiteTaskQueue, JobStatus
+from infrastructure.fair_share import user_weight
 from infrastructure.worker_manager import WorkerManager
 from infrastructure.autoscaler import Autoscaler
 from analytics.usage_tracker import UsageTracker, GenerationRequest as UsageReq, GenerationResult
 from analytics.cost_analyzer import CostAnalyzer
 from analytics.quality_metrics import QualityMetrics
 
+logger = get_logger(__name__)
+
 app = FastAPI()
 apply_security_middleware(app)
 app.middleware("http")(error_middleware)
-queue = TaskQueue()
 auth = AuthManager()
 worker_manager: WorkerManager | None = None
 autoscaler: Autoscaler | None = None
@@ -59,6 +66,25 @@ class GenerationRequest(BaseModel):
     duration: int = Field(default=get_pipeline_config().default_video_duration, ge=1, le=60)
     output_dir: str = Field(default="outputs")
     config_file: str | None = None
+    # Seconds from submission after which the job is abandoned, queue time included.
+    deadline_seconds: int | None = Field(default=None, ge=1, le=86400)
+    _submitted_at: float = PrivateAttr(default_factory=time.time)
+
+    def remaining(self) -> float | None:
+        """Seconds left before the deadline, ``None`` without one."""
+        if self.deadline_seconds is None:
+            return None
+        return self.deadline_seconds - (time.time() - self._submitted_at)
+
+
+_queue_cfg = get_pipeline_config()
+queue = SQLiteTaskQueue(
+    _queue_cfg.task_queue_path,
+    GenerationRequest,
+    visibility_timeout=_queue_cfg.task_queue_visibility_timeout,
+    max_attempts=_queue_cfg.task_queue_max_attempts,
+    max_wait=_queue_cfg.task_queue_max_wait,
+)
 
 
 def _load_custom(path: str) -> PipelineConfig:
@@ -69,39 +95,81 @@ def _load_custom(path: str) -> PipelineConfig:
     return base
 
 
+_ACTIVE = ("queued", "running")
+
+
+def _retryable(exc: BaseException) -> bool:
+    """Whether ``exc``, or an error it was raised from, is a provider or
+    network fault another attempt may get past. A passed deadline never is."""
+    retryable = False
+    while exc is not None:
+        if isinstance(exc, DeadlineExceededError):
+            return False
+        retryable = retryable or isinstance(exc, (ServiceError, ConnectionError, TimeoutError))
+        exc = exc.__cause__
+    return retryable
+
+
 async def _process_job(job_id: str, req: GenerationRequest) -> None:
+    """Run one queued job. Provider and network faults are re-raised so the
+    worker hands the job back to the queue, which retries it or
+    dead-letters it once out of attempts; other errors fail it for good.
+    A job cancelled meanwhile keeps its ``cancelled`` status."""
+    remaining = req.remaining()
+    if remaining is not None and remaining <= 0:
+        # Expired while queued; leave the worker for a job that can still finish.
+        await queue.update_job(
+            job_id, status="failed", error="deadline exceeded", from_status=_ACTIVE
+        )
+        return
     cfg = load_config()
     if req.config_file:
         cfg.pipeline = _load_custom(req.config_file)
     cfg.pipeline.default_video_duration = req.duration
     container = create_services(cfg)
-    pipe = ContentPipeline(cfg, container)
-    status = await queue.get_job_status(job_id)
-    status.status = "running"
+    # Keyed by the job, so a re-claimed job resumes its checkpoints and
+    # reattaches to the provider jobs it had started.
+    pipe = ContentPipeline(cfg, container, pipeline_id=job_id)
+    if not await queue.update_job(job_id, status="running", from_status=_ACTIVE):
+        return
     if reporter:
         await reporter.usage.track_generation_request(
             UsageReq(job_id, {"video_count": req.video_count, "user_id": req.idea_type})
         )
     try:
-        result = await pipe.run_multiple_videos(req.video_count)
         out_dir = Path(req.output_dir)
         out_dir.mkdir(parents=True, exist_ok=True)
-        for idx, item in enumerate(result):
-            Path(item["video"]).rename(out_dir / f"video_{idx}.mp4")
-        status.status = "completed"
+        videos: list[str] = []
+        async with deadline(req.remaining()):
+            async for item in pipe.stream_multiple_videos(req.video_count):
+                dest = out_dir / f"video_{len(videos)}.mp4"
+                Path(item["video"]).rename(dest)
+                videos.append(str(dest))
+                await queue.update_job(
+                    job_id,
+                    progress=len(videos) * 100 // req.video_count,
+                    result={"videos": videos},
+                )
+        await queue.update_job(job_id, status="completed", from_status=("running",))
         if reporter:
             await reporter.usage.track_generation_completion(GenerationResult(job_id, True))
     except Exception as exc:
-        status.status = "failed"
-        status.error = str(exc)
+        if _retryable(exc):
+            raise
+        error = "deadline exceeded" if isinstance(exc, DeadlineExceededError) else str(exc)
+        await queue.update_job(job_id, status="failed", error=error, from_status=_ACTIVE)
         if reporter:
             await reporter.usage.track_generation_completion(GenerationResult(job_id, False))
 
 
 @app.post("/generate")
-async def generate_content(req: GenerationRequest) -> Dict[str, str]:
+async def generate_content(req: GenerationRequest, request: Request) -> Dict[str, str]:
     req.idea_type = await InputValidator.sanitize_text(req.idea_type)
-    job_id = await queue.enqueue_video_generation(req)
+    user = request.state.user
+    weight = user_weight(
+        user.id, user.roles, _queue_cfg.task_queue_user_weights, _queue_cfg.task_queue_role_weights
+    )
+    job_id = await queue.enqueue_video_generation(req, user=user.id, weight=weight)
     return {"job_id": job_id}
 
 
@@ -146,6 +214,10 @@ async def startup() -> None:
     costs = CostAnalyzer()
     quality = QualityMetrics()
     reporter = ReportingService(tracker, costs, quality)
+    try:
+        await connection_pool.warm_up(load_config())
+    except Exception as exc:  # warm-up is best effort; calls create clients lazily
+        logger.warning("client_warm_up_failed", extra={"error": str(exc)})
 
 
 @app.on_event("shutdown")
@@ -154,3 +226,4 @@ async def shutdown() -> None:
         await autoscaler.stop()
     if worker_manager:
         await worker_manager.stop()
+    await connection_pool.close_all()
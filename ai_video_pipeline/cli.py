@@ -31,13 +31,14 @@ async def _run_generate(args: argparse.Namespace) -> None:
     cfg.pipeline.default_video_duration = args.duration
     container = create_services(cfg)
     pipe = ContentPipeline(cfg, container)
-    result = await pipe.run_multiple_videos(args.video_count)
     out_dir = Path(args.output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
-    for idx, item in enumerate(result):
-        dest = out_dir / f"video_{idx}.mp4"
+    videos: List[str] = []
+    async for item in pipe.stream_multiple_videos(args.video_count):
+        dest = out_dir / f"video_{len(videos)}.mp4"
         Path(item["video"]).rename(dest)
-    print({"videos": [str((out_dir / f"video_{i}.mp4")) for i in range(len(result))]})
+        videos.append(str(dest))
+    print({"videos": videos})
 
 
 def main(argv: List[str] | None = None) -> None:
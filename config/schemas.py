@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import field
+from typing import Dict, List, Optional
 from pydantic.dataclasses import dataclass
 from pydantic import Field, model_validator
 from .errors import ConfigError
@@ -21,6 +22,32 @@ class PipelineConfig:
     video_batch_small: int = Field(3, ge=1, le=10)
     video_batch_large: int = Field(5, ge=1, le=10)
     music_only_prompt: str = "ambient soundtrack"
+    openai_max_concurrency: int = Field(8, ge=1, le=100)
+    openai_requests_per_second: float = Field(5.0, gt=0, le=1000)
+    replicate_max_concurrency: int = Field(4, ge=1, le=100)
+    replicate_requests_per_second: float = Field(2.0, gt=0, le=1000)
+    sonauto_max_concurrency: int = Field(3, ge=1, le=100)
+    sonauto_requests_per_second: float = Field(2.0, gt=0, le=1000)
+    sonauto_status_checks_per_second: float = Field(1.0, gt=0, le=100)
+    composition_workers: Optional[int] = Field(None, ge=1, le=64)
+    stage_memo_dir: str = ".stage_memo"
+    stage_memo_max_bytes: int = Field(0, ge=0)
+    checkpoint_journal: str = "state/checkpoints.journal"
+    checkpoint_fsync_interval: float = Field(0.0, ge=0, le=60)
+    openai_batch_mode: bool = False
+    openai_batch_window: float = Field(5.0, gt=0, le=3600)
+    openai_batch_poll_interval: float = Field(30.0, gt=0, le=3600)
+    # Equivalent base URLs (regions, proxies) to balance each provider over.
+    openai_endpoints: List[str] = field(default_factory=list)
+    replicate_endpoints: List[str] = field(default_factory=list)
+    sonauto_endpoints: List[str] = field(default_factory=list)
+    task_queue_path: str = "state/task_queue.db"
+    task_queue_visibility_timeout: float = Field(120.0, gt=0, le=3600)
+    task_queue_max_attempts: int = Field(3, ge=1, le=20)
+    # Queue shares per user id and per role (priority class); unlisted ones weigh 1.
+    task_queue_user_weights: Dict[str, float] = field(default_factory=dict)
+    task_queue_role_weights: Dict[str, float] = field(default_factory=dict)
+    task_queue_max_wait: float = Field(900.0, gt=0, le=86400)
 
     @model_validator(mode="after")
     def check_values(cls, values: "PipelineConfig") -> "PipelineConfig":
@@ -34,6 +61,10 @@ class PipelineConfig:
             raise ConfigError("video_batch_large must be between 1 and 10")
         if not 30 <= values.api_timeout <= 600:
             raise ConfigError("api_timeout must be between 30 and 600")
+        for name in ("task_queue_user_weights", "task_queue_role_weights"):
+            bad = {k: w for k, w in getattr(values, name).items() if not w > 0}
+            if bad:
+                raise ConfigError(f"{name} must be positive: {bad}")
         return values
 
 
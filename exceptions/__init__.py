@@ -6,6 +6,7 @@ from .hierarchy import (
     OpenAIError,
     ReplicateError,
     SonautoError,
+    DeadlineExceededError,
     MediaProcessingError,
     FileOperationError,
     FFmpegError,
@@ -15,7 +16,13 @@ from .hierarchy import (
     ConfigValidationError,
 )
 from .circuit_breaker import CircuitBreaker, CircuitBreakerOpenError
-from .retry_policies import RetryPolicy, get_policy
+from .retry_policies import (
+    RetryBudget,
+    RetryBudgetExhaustedError,
+    RetryPolicy,
+    get_budget,
+    get_policy,
+)
 from .handlers import handle_exception, fallback_response
 
 # Backwards compatibility
@@ -32,6 +39,7 @@ __all__ = [
     "OpenAIError",
     "ReplicateError",
     "SonautoError",
+    "DeadlineExceededError",
     "MediaProcessingError",
     "FileOperationError",
     "FFmpegError",
@@ -42,6 +50,9 @@ __all__ = [
     "CircuitBreaker",
     "CircuitBreakerOpenError",
     "RetryPolicy",
+    "RetryBudget",
+    "RetryBudgetExhaustedError",
+    "get_budget",
     "get_policy",
     "handle_exception",
     "fallback_response",
@@ -1,36 +1,145 @@
 from __future__ import annotations
 
+import asyncio
 import time
-from typing import Awaitable, Callable, TypeVar
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+from prometheus_client import Counter, Gauge
 
 from .hierarchy import ServiceError
 
 T = TypeVar("T")
 
+BREAKER_TRANSITIONS = Counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes",
+    ["breaker", "from_state", "to_state"],
+)
+BREAKER_STATE = Gauge(
+    "circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["breaker"]
+)
+BREAKER_REJECTED = Counter(
+    "circuit_breaker_rejected_total", "Calls rejected by an open circuit breaker", ["breaker"]
+)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
 
 class CircuitBreakerOpenError(ServiceError):
     pass
 
 
 class CircuitBreaker:
-    def __init__(self, max_failures: int = 5, reset_timeout: int = 30) -> None:
+    """Stop calling a provider whose recent calls mostly fail or crawl.
+
+    The outcomes of the last ``window_size`` calls are kept; a call that
+    raises or times out, or runs for ``slow_call_duration`` seconds, is bad.
+    The breaker opens once the window holds at least ``max_failures`` bad
+    calls making up ``failure_rate`` of it, and rejects calls for
+    ``reset_timeout`` seconds. It then half-opens: up to ``half_open_probes``
+    calls are let through at a time while everyone else is still rejected.
+    Once that many probes succeed the breaker closes with a fresh window;
+    any bad probe opens it again.
+    """
+
+    def __init__(
+        self,
+        max_failures: int = 5,
+        reset_timeout: float = 30.0,
+        name: str = "default",
+        window_size: int = 20,
+        failure_rate: float = 0.5,
+        slow_call_duration: Optional[float] = None,
+        half_open_probes: int = 1,
+    ) -> None:
         self.max_failures = max_failures
         self.reset_timeout = reset_timeout
-        self.failures = 0
-        self.open_until = 0.0
-
-    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
-        now = time.time()
-        if self.failures >= self.max_failures:
-            if now < self.open_until:
-                raise CircuitBreakerOpenError("Circuit breaker open")
-            self.failures = 0
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_duration = slow_call_duration
+        self.half_open_probes = half_open_probes
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        BREAKER_STATE.labels(breaker=name).set(0)
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    @property
+    def failures(self) -> int:
+        """Bad calls in the current window."""
+        return sum(1 for ok in self._outcomes if not ok)
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        BREAKER_TRANSITIONS.labels(breaker=self.name, from_state=self._state, to_state=state).inc()
+        BREAKER_STATE.labels(breaker=self.name).set(_STATE_VALUES[state])
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._probe_successes = 0
+        else:
+            self._outcomes.clear()
+
+    def _admit(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN and self._probes < self.half_open_probes:
+            self._probes += 1
+            return True
+        BREAKER_REJECTED.labels(breaker=self.name).inc()
+        raise CircuitBreakerOpenError(f"Circuit breaker {self.name} {state}")
+
+    def _record(self, ok: bool, probe: bool) -> None:
+        if probe:
+            if not ok:
+                self._transition(OPEN)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self._transition(CLOSED)
+            return
+        if self._state != CLOSED:
+            # A call admitted before the breaker opened; it no longer counts.
+            return
+        self._outcomes.append(ok)
+        bad = self.failures
+        if bad >= self.max_failures and bad >= self.failure_rate * len(self._outcomes):
+            self._transition(OPEN)
+
+    def _slow(self, start: float) -> bool:
+        return (
+            self.slow_call_duration is not None
+            and time.monotonic() - start >= self.slow_call_duration
+        )
+
+    async def call(self, func: Callable[[], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """Run ``func()``, cancelling it after ``timeout`` seconds. A call
+        cancelled from outside counts as bad only once it has run slow."""
+        probe = self._admit()
+        start = time.monotonic()
         try:
-            result = await func()
-            self.failures = 0
-            return result
+            result = await asyncio.wait_for(func(), timeout)
         except Exception:
-            self.failures += 1
-            if self.failures >= self.max_failures:
-                self.open_until = now + self.reset_timeout
+            self._record(False, probe)
+            raise
+        except asyncio.CancelledError:
+            if self._slow(start):
+                self._record(False, probe)
             raise
+        finally:
+            if probe:
+                self._probes -= 1
+        self._record(not self._slow(start), probe)
+        return result
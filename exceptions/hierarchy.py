@@ -40,6 +40,9 @@ class ReplicateError(ServiceError):
 class SonautoError(ServiceError):
     pass
 
+class DeadlineExceededError(PipelineBaseException):
+    """The request's deadline passed before its work finished."""
+
 class MediaProcessingError(PipelineBaseException):
     """Errors during media processing."""
 
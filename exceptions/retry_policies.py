@@ -1,11 +1,27 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import Dict
+
+from prometheus_client import Counter, Gauge
+
+from .hierarchy import ServiceError
+
+RETRY_BUDGET_EXHAUSTED = Counter(
+    "retry_budget_exhausted_total", "Retries refused because the service's budget was spent", ["service"]
+)
+RETRY_BUDGET_TOKENS = Gauge(
+    "retry_budget_tokens", "Retries currently available per service", ["service"]
+)
+
 
 @dataclass
 class RetryPolicy:
     max_attempts: int
     max_time: int  # seconds
+    # Retries allowed per successful request, and the most that can bank up.
+    budget_ratio: float = 0.1
+    budget_max: float = 10.0
 
 SERVICE_POLICIES = {
     "openai": RetryPolicy(3, 300),
@@ -16,3 +32,50 @@ SERVICE_POLICIES = {
 
 def get_policy(service: str) -> RetryPolicy:
     return SERVICE_POLICIES.get(service, RetryPolicy(3, 300))
+
+
+class RetryBudgetExhaustedError(ServiceError):
+    """A retry was refused because the service's retry budget is spent."""
+
+
+class RetryBudget:
+    """Token bucket that keeps retries to a fraction of successful calls.
+
+    Every success deposits ``ratio`` tokens, up to ``max_tokens``; every
+    retry withdraws one. The bucket starts full so an occasional failure
+    can always be retried, but while a service is failing most calls the
+    retries it gets shrink to ``ratio`` of the calls that still succeed.
+    """
+
+    def __init__(self, service: str, ratio: float = 0.1, max_tokens: float = 10.0) -> None:
+        self.service = service
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        RETRY_BUDGET_TOKENS.labels(service=service).set(self.tokens)
+
+    def record_success(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+        RETRY_BUDGET_TOKENS.labels(service=self.service).set(self.tokens)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget; ``False`` if none is left."""
+        # Tolerate float drift from summing fractional deposits.
+        if self.tokens < 1 - 1e-9:
+            RETRY_BUDGET_EXHAUSTED.labels(service=self.service).inc()
+            return False
+        self.tokens = max(0.0, self.tokens - 1)
+        RETRY_BUDGET_TOKENS.labels(service=self.service).set(self.tokens)
+        return True
+
+
+_budgets: Dict[str, RetryBudget] = {}
+
+
+def get_budget(service: str) -> RetryBudget:
+    """Return the process-wide retry budget for ``service``."""
+    budget = _budgets.get(service)
+    if budget is None:
+        policy = get_policy(service)
+        budget = _budgets[service] = RetryBudget(service, policy.budget_ratio, policy.budget_max)
+    return budget
@@ -3,14 +3,14 @@ from __future__ import annotations
 import asyncio
 from contextlib import suppress
 
-from .task_queue import TaskQueue
+from .task_queue import SQLiteTaskQueue, TaskQueue
 from .worker_manager import WorkerManager
 
 
 class Autoscaler:
     def __init__(
         self,
-        queue: TaskQueue,
+        queue: TaskQueue | SQLiteTaskQueue,
         manager: WorkerManager,
         min_workers: int = 1,
         max_workers: int = 10,
@@ -34,7 +34,7 @@ class Autoscaler:
 
     async def _monitor(self) -> None:
         while True:
-            depth = self.queue._queue.qsize()
+            depth = await self.queue.depth()
             count = self.manager.worker_count
             if depth > self.threshold and count < self.max_workers:
                 await self.manager.scale(count + 1)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Generic, Iterable, List, Mapping, Tuple, TypeVar
+
+from prometheus_client import Gauge, Histogram
+
+T = TypeVar("T")
+
+DEFAULT_USER = "anonymous"
+
+QUEUE_USER_DEPTH = Gauge("task_queue_user_depth", "Jobs waiting to be claimed per user", ["user"])
+QUEUE_USER_WAIT = Histogram(
+    "task_queue_user_wait_seconds",
+    "Time from enqueue to first claim per user",
+    ["user"],
+    buckets=(1, 5, 15, 60, 300, 900, 1800, 3600, 7200, 14400),
+)
+
+
+def user_weight(
+    user_id: str,
+    roles: Iterable[str],
+    user_weights: Mapping[str, float],
+    role_weights: Mapping[str, float],
+) -> float:
+    """Share of the queue a user gets relative to others: its own weight
+    when one is configured, else the highest weight of its roles (its
+    priority class), else 1."""
+    if user_id in user_weights:
+        return user_weights[user_id]
+    return max((role_weights[r] for r in roles if r in role_weights), default=1.0)
+
+
+def fair_tags(
+    virtual_time: float, last_finish: float, cost: float, weight: float
+) -> Tuple[float, float]:
+    """Start and finish tags of a job under start-time fair queueing.
+
+    A user's jobs are spaced ``cost / weight`` apart in virtual time and
+    served in start-tag order, so backlogged users share the workers in
+    proportion to their weights. A user who was idle starts at the current
+    ``virtual_time`` and gets no credit for the time it was away.
+    """
+    if not weight > 0:
+        raise ValueError(f"queue weight must be positive, got {weight}")
+    start = max(virtual_time, last_finish)
+    return start, start + cost / weight
+
+
+@dataclass
+class _Job(Generic[T]):
+    start: float
+    seq: int
+    enqueued_at: float
+    item: T
+
+
+class FairQueue(Generic[T]):
+    """In-memory weighted fair queue over per-user FIFO backlogs.
+
+    Two heaps hold the head job of every user with a backlog, one by start
+    tag and one by enqueue time, so :meth:`pop` is O(log n) in active users.
+    A head that has waited ``max_wait`` seconds is served before the fair
+    order, so no user waits unboundedly however small their weight.
+    Entries for heads that have since been served are dropped lazily.
+    """
+
+    def __init__(self, max_wait: float = 900.0) -> None:
+        self.max_wait = max_wait
+        self.virtual_time = 0.0
+        self._finish: Dict[str, float] = {}
+        self._backlogs: Dict[str, Deque[_Job[T]]] = {}
+        self._by_tag: List[Tuple[float, int, str]] = []
+        self._by_age: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, user: str, item: T, cost: float = 1.0, weight: float = 1.0) -> None:
+        start, self._finish[user] = fair_tags(
+            self.virtual_time, self._finish.get(user, 0.0), cost, weight
+        )
+        job = _Job(start, next(self._seq), time.monotonic(), item)
+        backlog = self._backlogs.setdefault(user, deque())
+        backlog.append(job)
+        if len(backlog) == 1:
+            self._index(user, job)
+        self._size += 1
+        QUEUE_USER_DEPTH.labels(user=user).set(len(backlog))
+
+    def _index(self, user: str, job: _Job[T]) -> None:
+        heapq.heappush(self._by_tag, (job.start, job.seq, user))
+        heapq.heappush(self._by_age, (job.enqueued_at, job.seq, user))
+
+    def _head(self, heap: List[Tuple[float, int, str]]) -> str:
+        while heap:
+            _, seq, user = heap[0]
+            backlog = self._backlogs.get(user)
+            if backlog and backlog[0].seq == seq:
+                return user
+            heapq.heappop(heap)
+        raise IndexError("pop from an empty FairQueue")
+
+    def pop(self) -> T:
+        user = self._head(self._by_age)
+        now = time.monotonic()
+        if now - self._backlogs[user][0].enqueued_at < self.max_wait:
+            user = self._head(self._by_tag)
+        backlog = self._backlogs[user]
+        job = backlog.popleft()
+        self.virtual_time = max(self.virtual_time, job.start)
+        if backlog:
+            self._index(user, backlog[0])
+        else:
+            del self._backlogs[user]
+        self._size -= 1
+        QUEUE_USER_DEPTH.labels(user=user).set(len(backlog))
+        QUEUE_USER_WAIT.labels(user=user).observe(now - job.enqueued_at)
+        return job.item
+
+    def depth_by_user(self) -> Dict[str, int]:
+        return {user: len(backlog) for user, backlog in self._backlogs.items()}
@@ -1,18 +1,170 @@
 from __future__ import annotations
 
-import asyncio
-from itertools import cycle
-from typing import Iterable
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import urlsplit, urlunsplit
+
+from prometheus_client import Counter, Gauge
+
+ENDPOINT_LATENCY = Gauge(
+    "load_balancer_endpoint_latency_seconds", "Smoothed endpoint latency", ["balancer", "endpoint"]
+)
+ENDPOINT_IN_FLIGHT = Gauge(
+    "load_balancer_endpoint_in_flight", "Requests in flight per endpoint", ["balancer", "endpoint"]
+)
+ENDPOINT_EJECTIONS = Counter(
+    "load_balancer_endpoint_ejections_total",
+    "Endpoints taken out of rotation after repeated failures",
+    ["balancer", "endpoint"],
+)
+
+
+@dataclass
+class Endpoint:
+    url: str
+    latency: Optional[float] = None  # EWMA in seconds; None until measured
+    in_flight: int = 0
+    failures: int = 0  # consecutive
+    ejected_until: float = 0.0
+
+    def rebase(self, url: str) -> str:
+        """``url`` with its origin replaced by this endpoint's, keeping any
+        path prefix the endpoint has."""
+        base = urlsplit(self.url)
+        target = urlsplit(url)
+        path = base.path.rstrip("/") + target.path
+        return urlunsplit((base.scheme, base.netloc, path, target.query, target.fragment))
+
+
+def _endpoint_fault(exc: BaseException) -> bool:
+    """Whether ``exc`` says something about the endpoint rather than the request."""
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status", None) or getattr(response, "status_code", None)
+    return status is None or status >= 500
 
 
 class LoadBalancer:
-    """Round-robin load balancer for API endpoints."""
+    """Spread requests over equivalent endpoints by latency and load.
+
+    Every endpoint keeps an exponentially weighted moving average of its
+    latency and a count of requests in flight. :meth:`acquire` samples two
+    endpoints at random and takes the one with the lower expected wait,
+    ``latency * (in_flight + 1)`` (power of two choices), so slow or busy
+    endpoints get less traffic without every caller piling onto the same
+    fastest one. Endpoints not yet measured are priced at the average of
+    the others. After ``max_failures`` failures in a row an endpoint is
+    ejected for ``eject_seconds``; when every endpoint is ejected they are
+    all used again rather than failing outright.
+    """
+
+    def __init__(
+        self,
+        endpoints: Iterable[str],
+        name: str = "default",
+        alpha: float = 0.3,
+        max_failures: int = 3,
+        eject_seconds: float = 30.0,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.name = name
+        self.endpoints: List[Endpoint] = [Endpoint(url) for url in endpoints]
+        if not self.endpoints:
+            raise ValueError("LoadBalancer needs at least one endpoint")
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self._rng = rng or random.Random()
+
+    def _available(self) -> List[Endpoint]:
+        now = time.monotonic()
+        healthy = [e for e in self.endpoints if e.ejected_until <= now]
+        return healthy or self.endpoints
+
+    def select(self) -> Endpoint:
+        """Pick an endpoint without counting a request against it."""
+        candidates = self._available()
+        if len(candidates) == 1:
+            return candidates[0]
+        measured = [e.latency for e in candidates if e.latency is not None]
+        default = sum(measured) / len(measured) if measured else 0.0
 
-    def __init__(self, endpoints: Iterable[str]) -> None:
-        self._endpoints = cycle(endpoints)
-        self._lock = asyncio.Lock()
+        def cost(endpoint: Endpoint) -> tuple:
+            latency = default if endpoint.latency is None else endpoint.latency
+            return latency * (endpoint.in_flight + 1), endpoint.in_flight
+
+        return min(self._rng.sample(candidates, 2), key=cost)
+
+    def acquire(self) -> Endpoint:
+        endpoint = self.select()
+        endpoint.in_flight += 1
+        ENDPOINT_IN_FLIGHT.labels(balancer=self.name, endpoint=endpoint.url).set(endpoint.in_flight)
+        return endpoint
+
+    def release(self, endpoint: Endpoint, latency: float, ok: Optional[bool] = True) -> None:
+        """Finish a request on ``endpoint``; ``ok=None`` records its latency
+        without counting it as a success or a failure."""
+        endpoint.in_flight -= 1
+        endpoint.latency = (
+            latency
+            if endpoint.latency is None
+            else endpoint.latency + self.alpha * (latency - endpoint.latency)
+        )
+        ENDPOINT_IN_FLIGHT.labels(balancer=self.name, endpoint=endpoint.url).set(endpoint.in_flight)
+        ENDPOINT_LATENCY.labels(balancer=self.name, endpoint=endpoint.url).set(endpoint.latency)
+        if ok:
+            endpoint.failures = 0
+        elif ok is not None:
+            endpoint.failures += 1
+            if endpoint.failures >= self.max_failures:
+                endpoint.failures = 0
+                endpoint.ejected_until = time.monotonic() + self.eject_seconds
+                ENDPOINT_EJECTIONS.labels(balancer=self.name, endpoint=endpoint.url).inc()
+
+    @asynccontextmanager
+    async def request(self) -> AsyncIterator[Endpoint]:
+        """Hold an endpoint for one request and record how it went.
+
+        Errors count against the endpoint unless they carry a status below
+        500; a cancelled request only contributes its latency.
+        """
+        endpoint = self.acquire()
+        start = time.monotonic()
+        ok: Optional[bool] = None
+        try:
+            yield endpoint
+            ok = True
+        except Exception as exc:
+            ok = not _endpoint_fault(exc)
+            raise
+        finally:
+            self.release(endpoint, time.monotonic() - start, ok)
 
     async def get_endpoint(self) -> str:
-        async with self._lock:
-            return next(self._endpoints)
+        return self.select().url
+
+
+_balancers: Dict[str, LoadBalancer] = {}
+
+
+def configure_balancer(provider: str, endpoints: Sequence[str]) -> Optional[LoadBalancer]:
+    """Return the process-wide balancer for ``provider`` over ``endpoints``.
+
+    It is rebuilt when the endpoints change, keeping what was learned about
+    those that remain; with no endpoints the provider is not balanced.
+    """
+    balancer = _balancers.get(provider)
+    if not endpoints:
+        _balancers.pop(provider, None)
+        return None
+    if balancer is None or [e.url for e in balancer.endpoints] != list(endpoints):
+        previous = {e.url: e for e in balancer.endpoints} if balancer else {}
+        balancer = _balancers[provider] = LoadBalancer(endpoints, name=provider)
+        balancer.endpoints = [previous.get(e.url, e) for e in balancer.endpoints]
+    return balancer
+
 
+def get_balancer(provider: str) -> Optional[LoadBalancer]:
+    return _balancers.get(provider)
@@ -1,12 +1,33 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager, suppress
 from dataclasses import dataclass
-from typing import Dict, Tuple
+from pathlib import Path
+from typing import Any, Callable, Collection, Dict, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar
 from uuid import uuid4
 
+from prometheus_client import Counter, Gauge
 from pydantic import BaseModel
 
+from .fair_share import DEFAULT_USER, QUEUE_USER_DEPTH, QUEUE_USER_WAIT, FairQueue, fair_tags
+
+T = TypeVar("T")
+
+QUEUE_CLAIMED = Counter("task_queue_claimed_total", "Jobs leased to a worker")
+QUEUE_RETRIED = Counter(
+    "task_queue_retried_total", "Jobs claimed again after a failed attempt or an expired lease"
+)
+QUEUE_DEAD_LETTERED = Counter(
+    "task_queue_dead_lettered_total", "Jobs given up on after using all their attempts"
+)
+QUEUE_DEPTH = Gauge("task_queue_depth", "Jobs waiting to be claimed")
+
 
 @dataclass
 class JobStatus:
@@ -16,22 +37,48 @@ class JobStatus:
     result: dict | None = None
 
 
+def _cost(request: BaseModel) -> float:
+    """Work a job asks for, in videos."""
+    return float(getattr(request, "video_count", 1))
+
+
 class TaskQueue:
-    """Simple in-memory task queue for video generation jobs."""
+    """Simple in-memory task queue for video generation jobs.
 
-    def __init__(self) -> None:
-        self._queue: asyncio.Queue[Tuple[str, BaseModel]] = asyncio.Queue()
+    Jobs are shared between users by weighted fair queueing (see
+    :class:`~infrastructure.fair_share.FairQueue`), each job costing its
+    ``video_count``. Jobs are lost when the process exits;
+    :class:`SQLiteTaskQueue` is the durable equivalent.
+    """
+
+    def __init__(self, max_wait: float = 900.0) -> None:
+        # One token per queued job; the fair queue decides which job a token claims.
+        self._queue: asyncio.Queue[None] = asyncio.Queue()
+        self._pending: FairQueue[Tuple[str, BaseModel]] = FairQueue(max_wait)
         self._jobs: Dict[str, JobStatus] = {}
 
-    async def enqueue_video_generation(self, request: BaseModel) -> str:
+    async def enqueue_video_generation(
+        self, request: BaseModel, user: str = DEFAULT_USER, weight: float = 1.0
+    ) -> str:
         job_id = uuid4().hex
         self._jobs[job_id] = JobStatus("queued")
-        await self._queue.put((job_id, request))
+        self._pending.push(user, (job_id, request), _cost(request), weight)
+        await self._queue.put(None)
         return job_id
 
     async def get_job_status(self, job_id: str) -> JobStatus:
         return self._jobs[job_id]
 
+    async def update_job(
+        self, job_id: str, *, from_status: Optional[Collection[str]] = None, **fields: Any
+    ) -> bool:
+        status = self._jobs[job_id]
+        if from_status is not None and status.status not in from_status:
+            return False
+        for key, value in fields.items():
+            setattr(status, key, value)
+        return True
+
     async def cancel_job(self, job_id: str) -> bool:
         status = self._jobs.get(job_id)
         if not status or status.status not in {"queued", "running"}:
@@ -40,7 +87,476 @@ class TaskQueue:
         return True
 
     async def get_task(self) -> Tuple[str, BaseModel]:
-        return await self._queue.get()
+        await self._queue.get()
+        return self._pending.pop()
+
+    async def complete(self, job_id: str) -> bool:
+        """Mark a claimed job finished; one its worker already marked
+        ``failed`` or ``cancelled`` keeps that status."""
+        status = self._jobs[job_id]
+        if status.status in {"queued", "running"}:
+            status.status = "completed"
+            status.progress = 100
+        return True
+
+    async def fail(self, job_id: str, error: str) -> bool:
+        await self.update_job(job_id, status="failed", error=error)
+        return True
+
+    async def depth(self) -> int:
+        return len(self._pending)
+
+    async def depth_by_user(self) -> Dict[str, int]:
+        return self._pending.depth_by_user()
 
     def task_done(self) -> None:
         self._queue.task_done()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_token TEXT,
+    enqueued_at REAL NOT NULL,
+    user_id TEXT NOT NULL DEFAULT 'anonymous',
+    start_tag REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS fair_share (
+    user_id TEXT PRIMARY KEY,
+    finish_tag REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue_clock (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    virtual_time REAL NOT NULL
+);
+INSERT OR IGNORE INTO queue_clock VALUES (0, 0);
+"""
+
+# Added to databases created before fair queueing.
+_ADDED_COLUMNS = {
+    "user_id": "TEXT NOT NULL DEFAULT 'anonymous'",
+    "start_tag": "REAL NOT NULL DEFAULT 0",
+}
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, available_at);
+CREATE INDEX IF NOT EXISTS jobs_fair ON jobs (state, start_tag);
+CREATE INDEX IF NOT EXISTS jobs_age ON jobs (state, enqueued_at);
+"""
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    # IMMEDIATE takes the write lock up front, so a claim is atomic across
+    # every process sharing the database.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class SQLiteTaskQueue:
+    """Durable task queue kept in a SQLite database in WAL mode.
+
+    Jobs survive restarts and deploys and can be shared by several
+    processes on one host. Claiming a job leases it for
+    ``visibility_timeout`` seconds, renewed with :meth:`extend_lease` while
+    the worker runs; if the worker dies the lease lapses and the job can be
+    claimed again. Every claim is an attempt. A job whose attempt fails is
+    retried after ``retry_delay`` seconds, and one that has used
+    ``max_attempts`` is dead-lettered instead: marked ``failed`` and listed
+    by :meth:`dead_letters`.
+
+    Users share the queue by weighted fair queueing: every job gets a
+    start tag from :func:`~infrastructure.fair_share.fair_tags`, costing
+    its ``video_count``, and claims take the lowest tags through an index.
+    Jobs that have waited ``max_wait`` seconds are claimed first, oldest
+    first, and expired leases before either. The tags and virtual time
+    live in the database, so every process shares one schedule.
+
+    Requests are stored as JSON and rebuilt as ``request_model``, private
+    attributes included. The database is opened on first use.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        request_model: Type[BaseModel],
+        visibility_timeout: float = 120.0,
+        max_attempts: int = 3,
+        retry_delay: float = 5.0,
+        poll_interval: float = 0.5,
+        max_wait: float = 900.0,
+    ) -> None:
+        self.path = path
+        self.request_model = request_model
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Lease tokens of the jobs this process holds.
+        self._leases: Dict[str, str] = {}
+        # Users whose depth gauge was last set above zero.
+        self._reported_users: set[str] = set()
+        self._wakeups: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Event]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, decl in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+            conn.executescript(_INDEXES)
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        def call() -> T:
+            with self._lock:
+                return fn(self._connect(), *args)
+
+        return await asyncio.to_thread(call)
+
+    def _wakeup(self) -> asyncio.Event:
+        loop = asyncio.get_running_loop()
+        event = self._wakeups.get(loop)
+        if event is None:
+            event = self._wakeups[loop] = asyncio.Event()
+        return event
+
+    @staticmethod
+    def _dump(request: BaseModel) -> str:
+        return json.dumps(
+            {
+                "data": request.model_dump(mode="json"),
+                "private": request.__pydantic_private__ or {},
+            }
+        )
+
+    def _load(self, payload: str) -> BaseModel:
+        raw = json.loads(payload)
+        request = self.request_model.model_validate(raw["data"])
+        if request.__pydantic_private__ is not None:
+            request.__pydantic_private__.update(raw["private"])
+        return request
+
+    async def enqueue_video_generation(
+        self, request: BaseModel, user: str = DEFAULT_USER, weight: float = 1.0
+    ) -> str:
+        return (await self.enqueue_many([request], user, weight))[0]
+
+    async def enqueue_many(
+        self, requests: Sequence[BaseModel], user: str = DEFAULT_USER, weight: float = 1.0
+    ) -> List[str]:
+        """Queue several jobs for ``user`` in one transaction."""
+        now = time.time()
+        rows = [(uuid4().hex, self._dump(r), _cost(r)) for r in requests]
+
+        def insert(conn: sqlite3.Connection) -> None:
+            with _transaction(conn):
+                (virtual_time,) = conn.execute("SELECT virtual_time FROM queue_clock").fetchone()
+                last = conn.execute(
+                    "SELECT finish_tag FROM fair_share WHERE user_id = ?", (user,)
+                ).fetchone()
+                finish = last[0] if last else 0.0
+                values = []
+                for job_id, payload, cost in rows:
+                    start, finish = fair_tags(virtual_time, finish, cost, weight)
+                    values.append((job_id, payload, now, now, user, start))
+                conn.executemany(
+                    "INSERT INTO jobs (id, payload, state, status, available_at, enqueued_at,"
+                    " user_id, start_tag) VALUES (?, ?, 'queued', 'queued', ?, ?, ?, ?)",
+                    values,
+                )
+                conn.execute(
+                    "INSERT INTO fair_share VALUES (?, ?)"
+                    " ON CONFLICT (user_id) DO UPDATE SET finish_tag = excluded.finish_tag",
+                    (user, finish),
+                )
+
+        await self._run(insert)
+        self._wakeup().set()
+        return [job_id for job_id, _, _ in rows]
+
+    async def get_job_status(self, job_id: str) -> JobStatus:
+        def select(conn: sqlite3.Connection) -> Optional[tuple]:
+            return conn.execute(
+                "SELECT status, progress, error, result FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+
+        row = await self._run(select)
+        if row is None:
+            raise KeyError(job_id)
+        status, progress, error, result = row
+        return JobStatus(status, progress, error, json.loads(result) if result else None)
+
+    async def update_job(
+        self, job_id: str, *, from_status: Optional[Collection[str]] = None, **fields: Any
+    ) -> bool:
+        """Set ``status``, ``progress``, ``error`` or ``result`` of a job.
+
+        With ``from_status`` the job is only changed while its status is one
+        of those; returns whether it was changed.
+        """
+        unknown = set(fields) - {"status", "progress", "error", "result"}
+        if unknown:
+            raise ValueError(f"unknown job fields: {sorted(unknown)}")
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        where, params = "id = ?", [job_id]
+        if from_status is not None:
+            where += f" AND status IN ({', '.join('?' * len(from_status))})"
+            params += list(from_status)
+
+        def update(conn: sqlite3.Connection) -> Optional[int]:
+            changed = conn.execute(
+                f"UPDATE jobs SET {columns} WHERE {where}", (*fields.values(), *params)
+            ).rowcount
+            if changed or conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone():
+                return changed
+            return None
+
+        changed = await self._run(update)
+        if changed is None:
+            raise KeyError(job_id)
+        return bool(changed)
+
+    async def cancel_job(self, job_id: str) -> bool:
+        def cancel(conn: sqlite3.Connection) -> bool:
+            # A queued job is never claimed; a running one is left to its worker.
+            return bool(
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled',"
+                    " state = CASE WHEN state = 'queued' THEN 'done' ELSE state END"
+                    " WHERE id = ? AND status IN ('queued', 'running')",
+                    (job_id,),
+                ).rowcount
+            )
+
+        return await self._run(cancel)
+
+    async def claim(self, max_jobs: int = 1) -> List[Tuple[str, BaseModel]]:
+        """Lease up to ``max_jobs`` claimable jobs without waiting: expired
+        leases, then jobs past ``max_wait``, then jobs in fair-share order."""
+        now = time.time()
+        token = uuid4().hex
+        candidates = (
+            (
+                "SELECT id FROM jobs WHERE state = 'leased' AND available_at <= ?"
+                " ORDER BY available_at LIMIT ?",
+                (now,),
+            ),
+            (
+                "SELECT id FROM jobs WHERE state = 'queued' AND enqueued_at <= ?"
+                " AND available_at <= ? ORDER BY enqueued_at LIMIT ?",
+                (now - self.max_wait, now),
+            ),
+            (
+                # Without the hint SQLite ranges over jobs_age and sorts the whole backlog.
+                "SELECT id FROM jobs INDEXED BY jobs_fair WHERE state = 'queued'"
+                " AND enqueued_at > ? AND available_at <= ? ORDER BY start_tag, rowid LIMIT ?",
+                (now - self.max_wait, now),
+            ),
+        )
+
+        def claim(conn: sqlite3.Connection) -> Tuple[List[tuple], int]:
+            with _transaction(conn):
+                dead = conn.execute(
+                    "UPDATE jobs SET state = 'dead', status = 'failed', lease_token = NULL,"
+                    " error = COALESCE(error, 'lease expired') || ?"
+                    " WHERE state = 'leased' AND available_at <= ? AND attempts >= ?",
+                    (f" (gave up after {self.max_attempts} attempts)", now, self.max_attempts),
+                ).rowcount
+                picked: List[str] = []
+                for query, params in candidates:
+                    if len(picked) < max_jobs:
+                        picked += [
+                            job_id
+                            for job_id, in conn.execute(query, (*params, max_jobs - len(picked)))
+                        ]
+                if not picked:
+                    return [], dead
+                rows = conn.execute(
+                    "UPDATE jobs SET state = 'leased', lease_token = ?, available_at = ?,"
+                    f" attempts = attempts + 1 WHERE id IN ({', '.join('?' * len(picked))})"
+                    " RETURNING id, payload, attempts, user_id, start_tag, enqueued_at",
+                    (token, now + self.visibility_timeout, *picked),
+                ).fetchall()
+                conn.execute(
+                    "UPDATE queue_clock SET virtual_time = MAX(virtual_time, ?)",
+                    (max(row[4] for row in rows),),
+                )
+            order = {job_id: i for i, job_id in enumerate(picked)}
+            return sorted(rows, key=lambda row: order[row[0]]), dead
+
+        rows, dead = await self._run(claim)
+        if dead:
+            QUEUE_DEAD_LETTERED.inc(dead)
+        QUEUE_CLAIMED.inc(len(rows))
+        claimed = []
+        for job_id, payload, attempts, user, _, enqueued_at in rows:
+            if attempts > 1:
+                QUEUE_RETRIED.inc()
+            else:
+                QUEUE_USER_WAIT.labels(user=user).observe(now - enqueued_at)
+            self._leases[job_id] = token
+            claimed.append((job_id, self._load(payload)))
+        return claimed
+
+    async def get_tasks(self, max_jobs: int) -> List[Tuple[str, BaseModel]]:
+        """Wait until at least one job is claimable and lease up to ``max_jobs``."""
+        wakeup = self._wakeup()
+        while True:
+            wakeup.clear()
+            claimed = await self.claim(max_jobs)
+            if claimed:
+                return claimed
+            # Jobs queued by other processes are noticed by polling.
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(wakeup.wait(), self.poll_interval)
+
+    async def get_task(self) -> Tuple[str, BaseModel]:
+        return (await self.get_tasks(1))[0]
+
+    async def extend_lease(self, job_id: str) -> bool:
+        """Renew this process's lease on ``job_id``; ``False`` if it was lost."""
+        token = self._leases.get(job_id)
+
+        def extend(conn: sqlite3.Connection) -> int:
+            return conn.execute(
+                "UPDATE jobs SET available_at = ? WHERE id = ? AND lease_token = ?",
+                (time.time() + self.visibility_timeout, job_id, token),
+            ).rowcount
+
+        return bool(token) and bool(await self._run(extend))
+
+    async def complete(self, job_id: str) -> bool:
+        """Release a claimed job as finished; one its worker already marked
+        ``failed`` or ``cancelled`` keeps that status. ``False`` if the lease
+        was lost to another worker."""
+        token = self._leases.pop(job_id, None)
+
+        def complete(conn: sqlite3.Connection) -> int:
+            return conn.execute(
+                "UPDATE jobs SET state = 'done', lease_token = NULL,"
+                " progress = CASE WHEN status IN ('queued', 'running') THEN 100 ELSE progress END,"
+                " status = CASE WHEN status IN ('queued', 'running') THEN 'completed' ELSE status END"
+                " WHERE id = ? AND lease_token = ?",
+                (job_id, token),
+            ).rowcount
+
+        return bool(token) and bool(await self._run(complete))
+
+    async def fail(self, job_id: str, error: str) -> bool:
+        """Release a claimed job whose attempt failed: retry it later, or
+        dead-letter it once it has used all its attempts."""
+        token = self._leases.pop(job_id, None)
+
+        def fail(conn: sqlite3.Connection) -> Optional[str]:
+            with _transaction(conn):
+                row = conn.execute(
+                    "SELECT attempts FROM jobs WHERE id = ? AND lease_token = ?", (job_id, token)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[0] >= self.max_attempts:
+                    conn.execute(
+                        "UPDATE jobs SET state = 'dead', status = 'failed', error = ?,"
+                        " lease_token = NULL WHERE id = ?",
+                        (f"{error} (gave up after {row[0]} attempts)", job_id),
+                    )
+                    return "dead"
+                conn.execute(
+                    "UPDATE jobs SET state = 'queued', status = 'queued', error = ?,"
+                    " lease_token = NULL, available_at = ? WHERE id = ?",
+                    (error, time.time() + self.retry_delay, job_id),
+                )
+                return "queued"
+
+        outcome = await self._run(fail) if token else None
+        if outcome == "dead":
+            QUEUE_DEAD_LETTERED.inc()
+        return outcome is not None
+
+    async def dead_letters(self, limit: int = 100) -> List[Tuple[str, str]]:
+        """``(job_id, error)`` of dead-lettered jobs, most recent first."""
+
+        def select(conn: sqlite3.Connection) -> List[Tuple[str, str]]:
+            return conn.execute(
+                "SELECT id, error FROM jobs WHERE state = 'dead'"
+                " ORDER BY available_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+        return await self._run(select)
+
+    async def requeue(self, job_id: str) -> bool:
+        """Give a dead-lettered job a fresh set of attempts."""
+
+        def requeue(conn: sqlite3.Connection) -> int:
+            return conn.execute(
+                "UPDATE jobs SET state = 'queued', status = 'queued', attempts = 0,"
+                " error = NULL, available_at = ? WHERE id = ? AND state = 'dead'",
+                (time.time(), job_id),
+            ).rowcount
+
+        requeued = bool(await self._run(requeue))
+        if requeued:
+            self._wakeup().set()
+        return requeued
+
+    async def depth(self) -> int:
+        depth = sum((await self.depth_by_user()).values())
+        QUEUE_DEPTH.set(depth)
+        return depth
+
+    async def depth_by_user(self) -> Dict[str, int]:
+        """Jobs waiting to be claimed per user; also sets the per-user gauge."""
+
+        def count(conn: sqlite3.Connection) -> Dict[str, int]:
+            return dict(
+                conn.execute(
+                    "SELECT user_id, COUNT(*) FROM jobs WHERE state = 'queued' GROUP BY user_id"
+                ).fetchall()
+            )
+
+        depths = await self._run(count)
+        for user in self._reported_users - depths.keys():
+            QUEUE_USER_DEPTH.labels(user=user).set(0)
+        for user, depth in depths.items():
+            QUEUE_USER_DEPTH.labels(user=user).set(depth)
+        self._reported_users = set(depths)
+        return depths
+
+    def task_done(self) -> None:
+        """Kept for :class:`TaskQueue` callers; jobs are released by
+        :meth:`complete` or :meth:`fail`."""
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
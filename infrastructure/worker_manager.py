@@ -4,13 +4,13 @@ import asyncio
 from contextlib import suppress
 from typing import Awaitable, Callable, List
 
-from .task_queue import TaskQueue, JobStatus
+from .task_queue import SQLiteTaskQueue, TaskQueue
 
 
 class WorkerManager:
     def __init__(
         self,
-        queue: TaskQueue,
+        queue: TaskQueue | SQLiteTaskQueue,
         worker_fn: Callable[[str, object], Awaitable[None]],
     ) -> None:
         self.queue = queue
@@ -39,20 +39,32 @@ class WorkerManager:
     async def stop(self) -> None:
         await self.scale(0)
 
+    async def _renew(self, job_id: str, lease: float) -> None:
+        while True:
+            await asyncio.sleep(lease / 3)
+            if not await self.queue.extend_lease(job_id):
+                return
+
     async def _worker_loop(self) -> None:
+        # Durable queues lease jobs; keep the lease alive while a job runs.
+        lease = getattr(self.queue, "visibility_timeout", None)
         while True:
             job_id, req = await self.queue.get_task()
             status = await self.queue.get_job_status(job_id)
             if status.status == "cancelled":
+                await self.queue.complete(job_id)
                 self.queue.task_done()
                 continue
-            status.status = "running"
+            await self.queue.update_job(job_id, status="running", from_status=("queued", "running"))
+            renewal = asyncio.create_task(self._renew(job_id, lease)) if lease else None
             try:
                 await self.worker_fn(job_id, req)
-                status.status = "completed"
-                status.progress = 100
-            except Exception as exc:  # pragma: no cover - safety net
-                status.status = "failed"
-                status.error = str(exc)
+            except Exception as exc:
+                # Retried after a delay, or dead-lettered once out of attempts.
+                await self.queue.fail(job_id, str(exc))
+            else:
+                await self.queue.complete(job_id)
             finally:
+                if renewal is not None:
+                    renewal.cancel()
                 self.queue.task_done()
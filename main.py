@@ -34,15 +34,17 @@ async def _run_batch(args: argparse.Namespace) -> None:
             raise ValueError("duration must be between 1 and 60")
         cfg.pipeline.default_video_duration = args.duration
     batch = cfg.pipeline.video_batch_small if args.size == "small" else cfg.pipeline.video_batch_large
-    result = await pipe.run_multiple_videos(batch)
     out_path = Path(args.output)
     if not out_path.is_absolute():
         out_path = validate_file_path(out_path, [Path.cwd()])
     out_dir = out_path.resolve()
     Path(out_dir).mkdir(parents=True, exist_ok=True)
-    for idx, item in enumerate(result):
-        Path(item["video"]).rename(Path(out_dir) / f"video_{idx}.mp4")
-    print({"videos": [str(Path(out_dir) / f"video_{i}.mp4") for i in range(len(result))]})
+    videos: list[str] = []
+    async for item in pipe.stream_multiple_videos(batch):
+        dest = Path(out_dir) / f"video_{len(videos)}.mp4"
+        Path(item["video"]).rename(dest)
+        videos.append(str(dest))
+    print({"videos": videos})
 
 
 async def _run_music_only(args: argparse.Namespace) -> None:
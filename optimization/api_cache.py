@@ -8,16 +8,25 @@ from config import Config
 from services.image_generator import ImageGeneratorService
 from services.music_generator import MusicGeneratorService
 from repositories.media_repository import MediaRepository
+from utils.single_flight import SingleFlight
 from utils.validation import sanitize_prompt
 
 
 class APICache:
-    """Simple in-memory cache for image and music generation."""
+    """Simple in-memory cache for image and music generation.
+
+    Concurrent misses for the same prompt share one generation call.
+    """
 
     def __init__(self, ttl: int = 300, max_items: int = 128) -> None:
         self.ttl = ttl
         self.max_items = max_items
         self._image_cache: Dict[str, Tuple[float, str]] = {}
+        self._flight = SingleFlight("api_cache")
+
+    @property
+    def deduplicated(self) -> int:
+        return self._flight.deduplicated
 
     def _prune(self) -> None:
         now = time.time()
@@ -35,8 +44,15 @@ class APICache:
         cached = self._image_cache.get(key)
         if cached and time.time() - cached[0] < self.ttl:
             return cached[1]
-        result = await ImageGeneratorService(config, repo).generate(key)
-        self._image_cache[key] = (time.time(), result)
+        return await self._flight.do(
+            ("image", key), lambda: self._generate_image(key, config, repo)
+        )
+
+    async def _generate_image(
+        self, prompt: str, config: Config, repo: MediaRepository
+    ) -> str:
+        result = await ImageGeneratorService(config, repo).generate(prompt)
+        self._image_cache[prompt] = (time.time(), result)
         self._prune()
         return result
 
@@ -48,6 +64,14 @@ class APICache:
     async def batch_music_generation(
         self, prompts: List[str], config: Config, repo: MediaRepository
     ) -> List[str]:
-        """Batch multiple music requests when possible."""
-        tasks = [self._generate_music(sanitize_prompt(p), config, repo) for p in prompts]
+        """Batch multiple music requests when possible; repeated prompts
+        share one generation."""
+        tasks = []
+        for p in prompts:
+            key = sanitize_prompt(p)
+            tasks.append(
+                self._flight.do(
+                    ("music", key), lambda key=key: self._generate_music(key, config, repo)
+                )
+            )
         return await asyncio.gather(*tasks)
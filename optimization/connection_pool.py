@@ -1,9 +1,45 @@
 from __future__ import annotations
 
+import asyncio
+import importlib.util
+import time
+import weakref
+from typing import Any, Callable, Dict, Mapping, Tuple
+
 import aiohttp
-from typing import Dict
+import httpx
+import replicate
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from prometheus_client import Counter, Gauge
+
+from infrastructure.load_balancer import get_balancer
+
+CLIENTS_CREATED = Counter(
+    "api_client_pool_created_total", "Long-lived API clients created", ["provider"]
+)
+CLIENTS_REUSED = Counter(
+    "api_client_pool_reused_total", "Calls served by an existing API client", ["provider"]
+)
+POOL_CONNECTIONS = Gauge(
+    "api_client_pool_connections", "Open pooled connections per provider", ["provider"]
+)
+
+# Keep-alive pool shared by all calls through one client.
+POOL_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=20, keepalive_expiry=60
+)
+# HTTP/2 needs the optional ``h2`` package.
+HTTP2 = importlib.util.find_spec("h2") is not None
+# Requests to these hosts may be sent to the provider's configured endpoints.
+_API_HOSTS = {"openai": "api.openai.com", "replicate": "api.replicate.com"}
 
 _sessions: Dict[str, aiohttp.ClientSession] = {}
+# Per-provider callbacks given the status and headers of every response.
+_observers: Dict[str, Callable[[int, Mapping[str, str]], None]] = {}
+# Clients hold connection pools bound to the loop that opened them.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str, float], Any]]" = (
+    weakref.WeakKeyDictionary()
+)
 
 
 async def get_session(timeout: int) -> aiohttp.ClientSession:
@@ -15,7 +51,181 @@ async def get_session(timeout: int) -> aiohttp.ClientSession:
     return session
 
 
+def observe_responses(
+    provider: str, observer: Callable[[int, Mapping[str, str]], None]
+) -> None:
+    """Report the status and headers of each ``provider`` response to ``observer``."""
+    _observers[provider] = observer
+
+
+def _notify(provider: str, status: int, headers: Mapping[str, str]) -> None:
+    observer = _observers.get(provider)
+    if observer is not None:
+        observer(status, headers)
+
+
+async def _openai_response_hook(response: Any) -> None:
+    _notify("openai", response.status_code, response.headers)
+
+
+class _ObservedTransport(httpx.AsyncBaseTransport):
+    """Pass each response's status and headers to the provider's observer."""
+
+    def __init__(self, provider: str, transport: httpx.AsyncBaseTransport) -> None:
+        self.provider = provider
+        self._wrapped_transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._wrapped_transport.handle_async_request(request)
+        _notify(self.provider, response.status_code, response.headers)
+        return response
+
+    async def aclose(self) -> None:
+        await self._wrapped_transport.aclose()
+
+
+class _BalancedTransport(httpx.AsyncBaseTransport):
+    """Send provider API requests to the endpoint the provider's
+    :class:`~infrastructure.load_balancer.LoadBalancer` picks.
+
+    Requests pass through untouched while no balancer is configured or when
+    they are not for the provider's API host (file downloads, stand-ins).
+    """
+
+    def __init__(self, provider: str, transport: httpx.AsyncBaseTransport) -> None:
+        self.provider = provider
+        self._wrapped_transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        balancer = get_balancer(self.provider)
+        if balancer is None or request.url.host != _API_HOSTS[self.provider]:
+            return await self._wrapped_transport.handle_async_request(request)
+        endpoint = balancer.acquire()
+        # ``type(request.url)``: the OpenAI SDK ships its own httpx fork.
+        request.url = type(request.url)(endpoint.rebase(str(request.url)))
+        request.headers["Host"] = request.url.netloc.decode("ascii")
+        start = time.monotonic()
+        ok = None
+        try:
+            response = await self._wrapped_transport.handle_async_request(request)
+            ok = response.status_code < 500
+            return response
+        except Exception:
+            ok = False
+            raise
+        finally:
+            balancer.release(endpoint, time.monotonic() - start, ok)
+
+    async def aclose(self) -> None:
+        await self._wrapped_transport.aclose()
+
+
+def _loop_clients() -> Dict[Tuple[str, str, float], Any]:
+    loop = asyncio.get_running_loop()
+    clients = _clients.get(loop)
+    if clients is None:
+        clients = _clients[loop] = {}
+    return clients
+
+
+def get_openai_client(api_key: str, timeout: float) -> AsyncOpenAI:
+    """Return the shared ``AsyncOpenAI`` client for these credentials and timeout."""
+    clients = _loop_clients()
+    key = ("openai", api_key, timeout)
+    client = clients.get(key)
+    if client is None:
+        http_client = DefaultAsyncHttpxClient(
+            limits=POOL_LIMITS,
+            http2=HTTP2,
+            event_hooks={"response": [_openai_response_hook]},
+        )
+        http_client._transport = _BalancedTransport("openai", http_client._transport)
+        client = clients[key] = AsyncOpenAI(
+            api_key=api_key, timeout=timeout, http_client=http_client
+        )
+        CLIENTS_CREATED.labels(provider="openai").inc()
+    else:
+        CLIENTS_REUSED.labels(provider="openai").inc()
+    return client
+
+
+def get_replicate_client(api_token: str, timeout: float) -> replicate.Client:
+    """Return the shared ``replicate.Client`` for this token and timeout."""
+    clients = _loop_clients()
+    key = ("replicate", api_token, timeout)
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = replicate.Client(
+            api_token=api_token,
+            timeout=httpx.Timeout(timeout),
+            transport=_ObservedTransport(
+                "replicate",
+                _BalancedTransport(
+                    "replicate", httpx.AsyncHTTPTransport(limits=POOL_LIMITS, http2=HTTP2)
+                ),
+            ),
+        )
+        CLIENTS_CREATED.labels(provider="replicate").inc()
+    else:
+        CLIENTS_REUSED.labels(provider="replicate").inc()
+    return client
+
+
+def _http_client(client: Any) -> Any:
+    if isinstance(client, replicate.Client):
+        return client._async_client
+    return client._client
+
+
+def pool_stats() -> Dict[str, int]:
+    """Open pooled connections per provider on the running loop."""
+    stats: Dict[str, int] = {"openai": 0, "replicate": 0}
+    for (provider, _, _), client in _loop_clients().items():
+        transport = getattr(_http_client(client), "_transport", None)
+        # replicate wraps its transport in a RetryTransport and ours.
+        while hasattr(transport, "_wrapped_transport"):
+            transport = transport._wrapped_transport
+        pool = getattr(transport, "_pool", None)
+        stats[provider] += len(getattr(pool, "connections", ()))
+    for provider, count in stats.items():
+        POOL_CONNECTIONS.labels(provider=provider).set(count)
+    return stats
+
+
+async def warm_up(config: Any, connect: bool = True) -> Dict[str, bool]:
+    """Create the shared clients for ``config`` and, with ``connect``, open
+    one keep-alive connection per provider so the first real call skips DNS
+    and the TLS handshake. Returns whether each provider answered."""
+    clients = {
+        "openai": get_openai_client(config.openai_api_key, config.api_timeout),
+        "replicate": get_replicate_client(config.replicate_api_key, config.api_timeout),
+    }
+    await get_session(config.api_timeout)
+    if not connect:
+        return {name: False for name in clients}
+
+    async def ping(client: Any) -> bool:
+        http = _http_client(client)
+        try:
+            await http.head(str(getattr(client, "base_url", "") or http.base_url), timeout=5)
+            return True
+        except Exception:
+            return False
+
+    results = await asyncio.gather(*(ping(c) for c in clients.values()))
+    pool_stats()
+    return dict(zip(clients, results))
+
+
 async def close_all() -> None:
     for session in list(_sessions.values()):
         if not session.closed:
             await session.close()
+    _sessions.clear()
+    try:
+        clients = _loop_clients()
+    except RuntimeError:
+        return
+    for client in list(clients.values()):
+        await _http_client(client).aclose()
+    clients.clear()
@@ -1,8 +1,44 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import inspect
+import os
 from pathlib import Path
-from typing import AsyncIterable
+from typing import Any, AsyncIterable, AsyncIterator
+
+# Largest piece of a download held in memory at once.
+DOWNLOAD_CHUNK_SIZE = 1 << 18
+
+
+async def iter_response(resp: Any, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield the body of a provider response in chunks as it arrives.
+
+    Handles ``aiohttp`` responses, OpenAI streamed responses, Replicate
+    ``FileOutput`` objects and anything else with a ``read()`` method,
+    which is read in one piece.
+    """
+    content = getattr(resp, "content", None)
+    try:
+        if hasattr(content, "iter_chunked"):
+            async for chunk in content.iter_chunked(chunk_size):
+                yield chunk
+        elif hasattr(resp, "iter_bytes"):
+            try:
+                async for chunk in resp.iter_bytes(chunk_size):
+                    yield chunk
+            finally:
+                await resp.close()
+        elif hasattr(resp, "__aiter__"):
+            async for chunk in resp:
+                yield chunk
+        else:
+            data = resp.read()
+            yield await data if inspect.isawaitable(data) else data
+    finally:
+        release = getattr(resp, "release", None)
+        if release is not None:
+            release()
 
 
 async def stream_copy(src: Path, dest: Path, chunk_size: int = 65536) -> None:
@@ -16,9 +52,23 @@ async def stream_copy(src: Path, dest: Path, chunk_size: int = 65536) -> None:
             await loop.run_in_executor(None, w.write, chunk)
 
 
-async def stream_write(dest: Path, data: AsyncIterable[bytes], chunk_size: int = 65536) -> None:
+async def stream_write(dest: Path, data: AsyncIterable[bytes], chunk_size: int = 65536) -> str:
+    """Write ``data`` to ``dest`` and return its sha256, hashed as it is written.
+
+    Chunks go to a temporary file that replaces ``dest`` only once the
+    stream is complete, so a failed download never leaves a partial file.
+    """
     loop = asyncio.get_event_loop()
     dest.parent.mkdir(parents=True, exist_ok=True)
-    with open(dest, "wb") as w:
-        async for chunk in data:
-            await loop.run_in_executor(None, w.write, chunk)
+    tmp = dest.with_name(f".{dest.name}.part")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp, "wb") as w:
+            async for chunk in data:
+                digest.update(chunk)
+                await loop.run_in_executor(None, w.write, chunk)
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return digest.hexdigest()
@@ -2,8 +2,10 @@ from __future__ import annotations
 
 import asyncio
 import time
-from typing import List
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
 
+from pipeline.batch_engine import StagePipelinedBatchEngine
 from pipeline.parallel_scheduler import ParallelPipelineScheduler
 from pipeline.stages import PipelineContext, PipelineStage
 
@@ -33,6 +35,410 @@ async def run_benchmark() -> float:
     return time.perf_counter() - start
 
 
+class ProviderStage(PipelineStage):
+    """Stage that holds a shared provider slot for ``delay`` seconds."""
+
+    def __init__(
+        self,
+        name: str,
+        delay: float,
+        provider: str | None,
+        slots: Dict[str, asyncio.Semaphore],
+        requires: set[str] = frozenset(),
+        produces: set[str] = frozenset(),
+    ) -> None:
+        self.name = name
+        self.delay = delay
+        self.provider = provider
+        self.slots = slots
+        self.requires = frozenset(requires)
+        self.produces = frozenset(produces)
+
+    async def execute(self, ctx: PipelineContext) -> PipelineContext:
+        if self.provider:
+            async with self.slots[self.provider]:
+                await asyncio.sleep(self.delay)
+        else:
+            await asyncio.sleep(self.delay)
+        for f in self.produces:
+            setattr(ctx, f, self.name)
+        return ctx
+
+
+# Provider capacity and relative latency of each stage (video dominates).
+CAPACITY = {"openai": 8, "replicate": 4, "sonauto": 3}
+BATCH_STAGES = [
+    ("idea", 0.02, "openai", set(), {"idea", "prompt"}),
+    ("image", 0.03, "replicate", {"prompt"}, {"image_path"}),
+    ("video", 0.10, "replicate", {"prompt", "image_path"}, {"video_path"}),
+    ("music", 0.08, "sonauto", {"idea"}, {"music_path"}),
+    ("voice", 0.03, "openai", {"idea"}, {"voice"}),
+    ("compose", 0.02, None, {"video_path", "music_path", "voice"}, {"output"}),
+]
+
+
+def _batch_stages() -> List[PipelineStage]:
+    slots = {p: asyncio.Semaphore(n) for p, n in CAPACITY.items()}
+    return [ProviderStage(n, d, p, slots, r, o) for n, d, p, r, o in BATCH_STAGES]
+
+
+async def run_batch_benchmark(count: int, pipelines: int = 5) -> Tuple[float, float]:
+    """Time ``count`` videos as independent DAG pipelines (``pipelines`` in
+    flight, like ``run_multiple_videos``) and on the stage-pipelined engine."""
+    stages = _batch_stages()
+    scheduler = ParallelPipelineScheduler(pipelines * 4)
+    sem = asyncio.Semaphore(pipelines)
+
+    async def one() -> None:
+        async with sem:
+            await scheduler.execute_pipeline(stages, PipelineContext())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    baseline = time.perf_counter() - start
+
+    stages = _batch_stages()
+    workers = {s.name: CAPACITY.get(s.provider, 4) for s in stages}
+    engine = StagePipelinedBatchEngine(stages, workers)
+    start = time.perf_counter()
+    await engine.run(count)
+    return baseline, time.perf_counter() - start
+
+
+_CHAT_REPLY = {
+    "id": "chatcmpl-local",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "Idea: x\nPrompt: y"},
+            "finish_reason": "stop",
+        }
+    ],
+}
+
+
+async def run_client_benchmark(calls: int = 200) -> Tuple[float, float]:
+    """Mean seconds per chat call against a local stand-in for the OpenAI API,
+    building a client per call versus reusing the shared pooled client."""
+    from aiohttp import web
+    from openai import AsyncOpenAI
+    from optimization import connection_pool
+
+    async def chat(_: web.Request) -> web.Response:
+        return web.json_response(_CHAT_REPLY)
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/v1"
+    messages = [{"role": "user", "content": "idea"}]
+
+    async def timed(make_client) -> float:
+        start = time.perf_counter()
+        for _ in range(calls):
+            client = make_client()
+            await client.chat.completions.create(model="gpt-4o", messages=messages)
+        return (time.perf_counter() - start) / calls
+
+    def fresh() -> AsyncOpenAI:
+        return AsyncOpenAI(api_key="sk-local", base_url=base_url, timeout=30)
+
+    shared = connection_pool.get_openai_client("sk-local", 30)
+    shared.base_url = base_url
+    try:
+        per_call = await timed(fresh)
+        pooled = await timed(lambda: connection_pool.get_openai_client("sk-local", 30))
+    finally:
+        await connection_pool.close_all()
+        await runner.cleanup()
+    return per_call, pooled
+
+
+async def run_download_benchmark(
+    downloads: int = 20, size: int = 50 << 20
+) -> Tuple[float, float]:
+    """Peak traced memory in MiB for ``downloads`` concurrent ``size``-byte
+    downloads from a local server into files, buffering each body before
+    writing versus streaming it through :func:`iter_response`."""
+    import tempfile
+    import tracemalloc
+    from pathlib import Path
+
+    import aiohttp
+    from aiohttp import web
+    from optimization.streaming_io import iter_response, stream_write
+
+    payload = bytes(size)
+
+    async def media(request: web.Request) -> web.StreamResponse:
+        # Write in drained slices so the server side stays small too.
+        resp = web.StreamResponse(headers={"Content-Type": "video/mp4"})
+        resp.content_length = size
+        await resp.prepare(request)
+        view = memoryview(payload)
+        for offset in range(0, size, 1 << 16):
+            await resp.write(view[offset:offset + (1 << 16)])
+        await resp.write_eof()
+        return resp
+
+    app = web.Application()
+    app.router.add_get("/media", media)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/media"
+
+    async def buffered(resp: aiohttp.ClientResponse):
+        yield await resp.read()
+
+    async def peak(reader, out: Path) -> float:
+        async with aiohttp.ClientSession() as session:
+
+            async def one(i: int) -> str:
+                resp = await session.get(url)
+                return await stream_write(out / f"{i}.mp4", reader(resp))
+
+            tracemalloc.start()
+            try:
+                await asyncio.gather(*(one(i) for i in range(downloads)))
+                return tracemalloc.get_traced_memory()[1] / (1 << 20)
+            finally:
+                tracemalloc.stop()
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            whole = await peak(buffered, Path(tmp))
+            streamed = await peak(iter_response, Path(tmp))
+    finally:
+        await runner.cleanup()
+    return whole, streamed
+
+
+async def run_prompt_benchmark(pipelines: int = 500) -> Tuple[float, float]:
+    """Mean seconds spent assembling one pipeline's idea and voice prompts,
+    reading the templates through ``read_file`` versus the prompt registry."""
+    from services.idea_generator import IdeaGeneratorService
+    from utils import file_operations
+    from utils.prompt_templates import PromptRegistry
+
+    idea, voice = "prompts/idea_gen.txt", "prompts/voice_examples.txt"
+
+    async def timed(read) -> float:
+        start = time.perf_counter()
+        for _ in range(pipelines):
+            _ = await read(idea) + IdeaGeneratorService._avoid_section(["x"])
+            _ = f"Create a brief question for: x\n{await read(voice)}"
+        return (time.perf_counter() - start) / pipelines
+
+    registry = PromptRegistry()
+    return await timed(file_operations.read_file), await timed(registry.get)
+
+
+async def run_chat_batch_benchmark(
+    requests: int = 100, call_latency: float = 1.0, batch_latency: float = 5.0
+) -> Tuple[float, float]:
+    """Chat requests per second through ``openai_chat`` against a local
+    stand-in, one governed call per request versus batch-job mode."""
+    from config import Config
+    from optimization import connection_pool
+    from utils.api_clients import openai_chat
+    from utils.load_testing.openai_batch_stub import OpenAIBatchStub
+
+    cfg = Config("sk-local", "sa", "rep", 60)
+    cfg.pipeline.openai_batch_window = 0.5
+    cfg.pipeline.openai_batch_poll_interval = 0.5
+
+    async def timed(batch_mode: bool) -> float:
+        cfg.pipeline.openai_batch_mode = batch_mode
+        start = time.perf_counter()
+        await asyncio.gather(*(openai_chat(f"idea {i}", cfg) for i in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+    async with OpenAIBatchStub(call_latency, batch_latency) as stub:
+        connection_pool.get_openai_client(cfg.openai_api_key, cfg.api_timeout).base_url = stub.base_url
+        try:
+            return await timed(False), await timed(True)
+        finally:
+            await connection_pool.close_all()
+
+
+async def run_load_balancer_benchmark(
+    requests: int = 600, concurrency: int = 20
+) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    """(p50, p99) request latency in seconds over three local endpoints, one
+    of them ten times slower, with round-robin versus the latency-aware
+    :class:`LoadBalancer`."""
+    import aiohttp
+    from itertools import cycle
+    from infrastructure.load_balancer import LoadBalancer
+    from utils.load_testing.endpoint_stub import EndpointStub
+
+    def percentiles(samples: List[float]) -> Tuple[float, float]:
+        samples = sorted(samples)
+        return samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+    async with EndpointStub(0.005) as a, EndpointStub(0.005) as b, EndpointStub(0.05) as c:
+        urls = [a.base_url, b.base_url, c.base_url]
+        async with aiohttp.ClientSession() as session:
+
+            async def timed(pick) -> Tuple[float, float]:
+                gate = asyncio.Semaphore(concurrency)
+                latencies: List[float] = []
+
+                async def one() -> None:
+                    async with gate, pick() as base:
+                        start = time.perf_counter()
+                        async with session.get(f"{base}/v1/ping") as resp:
+                            await resp.read()
+                        latencies.append(time.perf_counter() - start)
+
+                await asyncio.gather(*(one() for _ in range(requests)))
+                return percentiles(latencies)
+
+            rotation = cycle(urls)
+
+            @asynccontextmanager
+            async def round_robin():
+                yield next(rotation)
+
+            balancer = LoadBalancer(urls, name="benchmark")
+
+            @asynccontextmanager
+            async def balanced():
+                async with balancer.request() as endpoint:
+                    yield endpoint.url
+
+            return await timed(round_robin), await timed(balanced)
+
+
+async def run_task_queue_benchmark(jobs: int = 10_000, batch: int = 100) -> Dict[str, float]:
+    """Jobs per second through a :class:`SQLiteTaskQueue` holding ``jobs``
+    queued jobs: enqueueing one at a time and in bulk, then draining with
+    one claim per job and with ``batch`` jobs per claim."""
+    import tempfile
+    from pydantic import BaseModel
+    from infrastructure.task_queue import SQLiteTaskQueue
+
+    class Job(BaseModel):
+        idea_type: str = "general"
+        video_count: int = 1
+
+    async def drain(queue: SQLiteTaskQueue, size: int) -> float:
+        start = time.perf_counter()
+        done = 0
+        while done < jobs:
+            for job_id, _ in await queue.get_tasks(size):
+                await queue.complete(job_id)
+                done += 1
+        return jobs / (time.perf_counter() - start)
+
+    rates: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = SQLiteTaskQueue(f"{tmp}/single.db", Job)
+        start = time.perf_counter()
+        for _ in range(jobs):
+            await queue.enqueue_video_generation(Job())
+        rates["enqueue"] = jobs / (time.perf_counter() - start)
+        rates["claim"] = await drain(queue, 1)
+        queue.close()
+
+        queue = SQLiteTaskQueue(f"{tmp}/bulk.db", Job)
+        start = time.perf_counter()
+        for offset in range(0, jobs, batch):
+            await queue.enqueue_many([Job() for _ in range(min(batch, jobs - offset))])
+        rates["enqueue_bulk"] = jobs / (time.perf_counter() - start)
+        rates["claim_bulk"] = await drain(queue, batch)
+        queue.close()
+    return rates
+
+
+async def run_fair_queue_benchmark(
+    bulk_jobs: int = 500, light_users: int = 50, active_users: int = 10_000
+) -> Dict[str, float]:
+    """How many jobs are served before the last of ``light_users``
+    one-video jobs queued behind one user's ``bulk_jobs`` ten-video jobs,
+    first in first out against fair queueing, and fair dequeues per second
+    with ``active_users`` users backlogged."""
+    from pydantic import BaseModel
+    from infrastructure.fair_share import FairQueue
+    from infrastructure.task_queue import TaskQueue
+
+    class Job(BaseModel):
+        video_count: int = 1
+
+    queue = TaskQueue()
+    for _ in range(bulk_jobs):
+        await queue.enqueue_video_generation(Job(video_count=10), user="bulk")
+    light = {
+        await queue.enqueue_video_generation(Job(), user=f"user{i}") for i in range(light_users)
+    }
+    served = 0
+    while light:
+        light.discard((await queue.get_task())[0])
+        served += 1
+
+    fair: FairQueue[int] = FairQueue()
+    for i in range(active_users * 5):
+        fair.push(f"user{i % active_users}", i, cost=1 + i % 10)
+    start = time.perf_counter()
+    while fair:
+        fair.pop()
+    pops = active_users * 5 / (time.perf_counter() - start)
+    return {"fifo_served": float(bulk_jobs + light_users), "fair_served": float(served), "pops": pops}
+
+
 if __name__ == "__main__":
     result = asyncio.run(run_benchmark())
     print(f"Execution time: {result:.2f}s")
+    for n in (10, 50, 200):
+        base, piped = asyncio.run(run_batch_benchmark(n))
+        print(
+            f"{n:>4} videos: per-video {n / base:6.1f}/s, "
+            f"stage-pipelined {n / piped:6.1f}/s ({base / piped:.2f}x)"
+        )
+    per_call, pooled = asyncio.run(run_client_benchmark())
+    print(
+        f"chat call: new client {per_call * 1000:.2f}ms, "
+        f"shared client {pooled * 1000:.2f}ms ({per_call / pooled:.2f}x)"
+    )
+    whole, streamed = asyncio.run(run_download_benchmark())
+    print(
+        f"20 x 50 MiB downloads: buffered peak {whole:.0f}MiB, "
+        f"streamed peak {streamed:.1f}MiB"
+    )
+    direct, cached = asyncio.run(run_prompt_benchmark())
+    print(
+        f"prompt assembly per pipeline: read_file {direct * 1e6:.0f}us, "
+        f"registry {cached * 1e6:.1f}us ({direct / cached:.0f}x)"
+    )
+    direct, batched = asyncio.run(run_chat_batch_benchmark())
+    print(
+        f"100 chat requests: per-call {direct:.1f}/s, "
+        f"batch job {batched:.1f}/s ({batched / direct:.1f}x)"
+    )
+    (rr50, rr99), (lb50, lb99) = asyncio.run(run_load_balancer_benchmark())
+    print(
+        f"600 requests over 3 endpoints (one slow): round-robin p50 {rr50 * 1000:.1f}ms "
+        f"p99 {rr99 * 1000:.1f}ms, latency-aware p50 {lb50 * 1000:.1f}ms p99 {lb99 * 1000:.1f}ms"
+    )
+    rates = asyncio.run(run_task_queue_benchmark())
+    print(
+        f"10k SQLite queue jobs: enqueue {rates['enqueue']:.0f}/s "
+        f"(bulk {rates['enqueue_bulk']:.0f}/s), claim+complete {rates['claim']:.0f}/s "
+        f"(100 per claim {rates['claim_bulk']:.0f}/s)"
+    )
+    fair = asyncio.run(run_fair_queue_benchmark())
+    print(
+        f"Jobs served before 50 light users finish behind a 500-job backlog: "
+        f"FIFO {fair['fifo_served']:.0f}, fair {fair['fair_served']:.0f}; "
+        f"{fair['pops']:.0f} fair dequeues/s with 10k active users"
+    )
@@ -1,14 +1,15 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Set
 import uuid
 
 from config import Config
 from infrastructure.di_container import DIContainer
-from utils.media_processing import merge_video_audio
+from utils.media_processing import merge_video_audio, composition_executor
 from monitoring.structured_logger import set_correlation_id
 from utils.monitoring import tracer, record_profiling_metrics
+from utils.deadline import check_deadline, deadline
 from profiling.app_profiler import ApplicationProfiler
 from analytics.usage_tracker import GenerationRequest, GenerationResult, UsageTracker
 from analytics.cost_analyzer import CostAnalyzer
@@ -23,24 +24,36 @@ from .stages import (
     Composition,
 )
 from .scheduler import PipelineScheduler
-from .state_manager import StateManager
+from .dag_scheduler import DAGPipelineScheduler
+from .batch_engine import StagePipelinedBatchEngine
+from .memo import MemoizedStage, get_memo
+from .state_manager import StateManager, JournalStateManager
+from storage.journal import get_journal
 from storage.persistence import PipelineStateManager, PipelineState
 from .progress import ProgressTracker
 
 
 class ContentPipeline:
-    def __init__(self, config: Config, container: DIContainer) -> None:
+    def __init__(
+        self, config: Config, container: DIContainer, pipeline_id: str | None = None
+    ) -> None:
         self.config = config
         self.container = container
-        self.pipeline_id = uuid.uuid4().hex
+        # Passing the ID of a run that crashed resumes it from its checkpoint.
+        self.pipeline_id = pipeline_id or uuid.uuid4().hex
         set_correlation_id(self.pipeline_id)
-        self.state_mgr = PipelineStateManager()
-        self.state = StateManager(f"{self.pipeline_id}_runtime.json")
+        self.journal = get_journal(
+            config.pipeline.checkpoint_journal, config.pipeline.checkpoint_fsync_interval
+        )
+        self.state_mgr = PipelineStateManager(journal=self.journal)
+        self.state = JournalStateManager(self.pipeline_id, self.journal)
         self.progress = ProgressTracker()
         self.usage_tracker = UsageTracker()
         self.cost_analyzer = CostAnalyzer()
         self.quality_metrics = QualityMetrics()
-        self.scheduler = PipelineScheduler(self.config.pipeline.video_batch_large)
+        self.scheduler = DAGPipelineScheduler(self.config.pipeline.video_batch_large)
+        if self.config.pipeline.composition_workers:
+            composition_executor.configure(self.config.pipeline.composition_workers)
         self.stages = self._build_stages()
         self.profiler = ApplicationProfiler()
 
@@ -55,9 +68,15 @@ class ContentPipeline:
         if voice:
             stages.append(VoiceGeneration(voice))
         stages.append(Composition(self.config.pipeline.default_video_duration))
+        cfg = self.config.pipeline
+        if cfg.stage_memo_max_bytes:
+            memo = get_memo(cfg.stage_memo_dir, cfg.stage_memo_max_bytes)
+            stages = [MemoizedStage(s, memo) for s in stages]
         return stages
 
-    async def run_single_video(self) -> Dict[str, str]:
+    async def run_single_video(self, deadline_seconds: float | None = None) -> Dict[str, str]:
+        """Generate one video; with ``deadline_seconds`` its stages are
+        cancelled once that long has passed."""
         from utils.monitoring import PIPELINE_SUCCESS, PIPELINE_FAILURE
         req = GenerationRequest(self.pipeline_id, {"videos": 1})
         await self.usage_tracker.track_generation_request(req)
@@ -65,9 +84,10 @@ class ContentPipeline:
         try:
             with tracer.trace_video_generation(self.pipeline_id):
                 saved = await self.state_mgr.load_state(self.pipeline_id)
-                result = await self.scheduler.run_pipeline(
-                    self.stages, self.state, self.progress, saved.context
-                )
+                async with deadline(deadline_seconds):
+                    result = await self.scheduler.run_pipeline(
+                        self.stages, self.state, self.progress, saved.context
+                    )
                 await self.state_mgr.save_state(
                     self.pipeline_id, PipelineState("completed", result)
                 )
@@ -85,36 +105,122 @@ class ContentPipeline:
             PIPELINE_FAILURE.inc()
             raise
 
-    async def run_multiple_videos(self, count: int) -> List[Dict[str, str]]:
-        async def single() -> Dict[str, str]:
-            pid = uuid.uuid4().hex
-            state = StateManager(f"state_{pid}.json")
-            scheduler = PipelineScheduler(self.config.pipeline.video_batch_large)
-            saved = await self.state_mgr.load_state(pid)
-            await self.usage_tracker.track_generation_request(
-                GenerationRequest(pid, {"videos": 1})
-            )
-            result = await scheduler.run_pipeline(
-                self.stages, state, ProgressTracker(), saved.context
-            )
-            await self.state_mgr.save_state(pid, PipelineState("completed", result))
+    async def _batch_ideas(self, count: int, first: int = 0) -> List[Dict[str, str] | None]:
+        """Generate ideas for a whole batch in one chat round trip when the
+        idea service supports it. Pipelines left without a seed generate
+        their own idea, and those resuming from a checkpoint need none."""
+        service = self.container["idea_generator"]
+        fresh = [
+            i for i in range(count)
+            if not JournalStateManager(self._item_id(first + i), self.journal).has_checkpoint()
+        ]
+        seeds: List[Dict[str, str] | None] = [None] * count
+        if len(fresh) > 1 and hasattr(service, "generate_many"):
+            ideas = await service.generate_many(len(fresh), strict=False)
+            for i, idea in zip(fresh, ideas):
+                seeds[i] = idea
+        return seeds
+
+    async def _run_batch(self, count: int, first: int = 0) -> List[Dict[str, str]]:
+        seeds = await self._batch_ideas(count, first)
+        return await asyncio.gather(
+            *(self._run_batch_item(first + i, seed) for i, seed in enumerate(seeds))
+        )
+
+    def _item_id(self, index: int) -> str:
+        return f"{self.pipeline_id}:{index}"
+
+    async def _run_batch_item(
+        self, index: int, seed: Dict[str, str] | None = None
+    ) -> Dict[str, str]:
+        """Run the ``index``-th video of this pipeline's batch. Its ID derives
+        from ``pipeline_id``, so re-running the batch resumes the video."""
+        check_deadline()
+        pid = self._item_id(index)
+        state = JournalStateManager(pid, self.journal)
+        saved = await self.state_mgr.load_state(pid)
+        if seed:
+            saved.context.idea = seed["idea"]
+            saved.context.prompt = seed["prompt"]
+        await self.usage_tracker.track_generation_request(
+            GenerationRequest(pid, {"videos": 1})
+        )
+        result = await self.scheduler.run_pipeline(
+            self.stages, state, ProgressTracker(), saved.context
+        )
+        await self.state_mgr.save_state(pid, PipelineState("completed", result))
+        await self.usage_tracker.track_generation_completion(
+            GenerationResult(pid, True)
+        )
+        return {"idea": result.idea or "", "video": result.output or ""}
+
+    async def run_multiple_videos(
+        self, count: int, deadline_seconds: float | None = None
+    ) -> List[Dict[str, str]]:
+        async with deadline(deadline_seconds):
+            return await self._run_batch(count)
+
+    async def stream_multiple_videos(
+        self, count: int, concurrency: int | None = None
+    ) -> AsyncIterator[Dict[str, str]]:
+        """Yield each video's result as soon as it completes.
+
+        At most ``concurrency`` pipelines (default ``video_batch_large``) are
+        in flight; a new one starts whenever a result is yielded. A failure
+        cancels the remaining pipelines and is raised to the consumer. Run
+        under :func:`utils.deadline.deadline` to bound the whole batch; no
+        pipeline starts after it has passed.
+        """
+        limit = concurrency or self.config.pipeline.video_batch_large
+        seeds = await self._batch_ideas(count)
+        running: Set[asyncio.Task] = set()
+        started = 0
+        try:
+            while started < count or running:
+                while started < count and len(running) < limit:
+                    running.add(
+                        asyncio.create_task(self._run_batch_item(started, seeds[started]))
+                    )
+                    started += 1
+                done, running = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def stream_multiple_videos_pipelined(
+        self, count: int
+    ) -> AsyncIterator[Dict[str, str]]:
+        """Like :meth:`stream_multiple_videos`, but on a
+        :class:`StagePipelinedBatchEngine` whose per-stage pools are sized
+        from the provider limits in ``config.pipeline``."""
+        engine = StagePipelinedBatchEngine.from_config(self.stages, self.config.pipeline)
+        await self.usage_tracker.track_generation_request(
+            GenerationRequest(self.pipeline_id, {"videos": count})
+        )
+        async for ctx in engine.stream(count):
             await self.usage_tracker.track_generation_completion(
-                GenerationResult(pid, True)
+                GenerationResult(self.pipeline_id, True)
             )
-            return {"idea": result.idea or "", "video": result.output or ""}
+            yield {"idea": ctx.idea or "", "video": ctx.output or ""}
 
-        return await asyncio.gather(*(single() for _ in range(count)))
+    async def run_multiple_videos_pipelined(self, count: int) -> List[Dict[str, str]]:
+        return [r async for r in self.stream_multiple_videos_pipelined(count)]
 
     async def run_multiple_videos_distributed(
         self, count: int, workers: int
     ) -> List[Dict[str, str]]:
         """Run videos across multiple workers and aggregate results."""
 
-        async def batch(n: int) -> List[Dict[str, str]]:
-            return await self.run_multiple_videos(n)
-
         parts = [count // workers + (1 if i < count % workers else 0) for i in range(workers)]
-        results = await asyncio.gather(*(batch(p) for p in parts if p))
+        firsts = [sum(parts[:i]) for i in range(workers)]
+        results = await asyncio.gather(
+            *(self._run_batch(p, first) for p, first in zip(parts, firsts) if p)
+        )
         merged: List[Dict[str, str]] = []
         for chunk in results:
             merged.extend(chunk)
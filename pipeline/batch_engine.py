@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field, replace
+from typing import AsyncIterator, Dict, Iterable, List, Set
+
+from config import PipelineConfig
+from utils.deadline import check_deadline
+from utils.media_processing import composition_executor
+from .parallel_scheduler import ParallelPipelineScheduler
+from .stages import PipelineStage, PipelineContext
+
+
+@dataclass
+class _BatchItem:
+    index: int
+    ctx: PipelineContext = field(default_factory=PipelineContext)
+    started: Set[str] = field(default_factory=set)
+    done: Set[str] = field(default_factory=set)
+
+
+class StagePipelinedBatchEngine:
+    """Run a batch of videos with one bounded worker pool per stage.
+
+    Every stage owns an inbound queue served by ``workers[stage.name]``
+    workers. A video is queued for a stage as soon as that stage's
+    dependencies have finished for it, so idea generation for video k+1
+    overlaps video rendering for video k, and each stage stays busy up to
+    its own capacity instead of the capacity of a whole pipeline slot.
+    """
+
+    def __init__(
+        self,
+        stages: Iterable[PipelineStage],
+        workers: Dict[str, int],
+        queue_size: int | None = None,
+    ) -> None:
+        self.stages: List[PipelineStage] = list(stages)
+        ParallelPipelineScheduler()._dependency_graph(self.stages)
+        self.requires = ParallelPipelineScheduler._dependencies(self.stages)
+        self.dependents: Dict[str, List[str]] = {
+            s.name: [n for n, reqs in self.requires.items() if s.name in reqs]
+            for s in self.stages
+        }
+        self.workers = {s.name: max(1, workers.get(s.name, 1)) for s in self.stages}
+        self.queue_size = queue_size
+
+    @classmethod
+    def from_config(
+        cls,
+        stages: Iterable[PipelineStage],
+        pipeline: PipelineConfig,
+        local_workers: int | None = None,
+    ) -> "StagePipelinedBatchEngine":
+        """Size each stage's pool to its provider's ``*_max_concurrency``.
+
+        Stages without a provider (composition) get ``local_workers``,
+        defaulting to the composition executor's worker count.
+        """
+        stages = list(stages)
+        workers: Dict[str, int] = {}
+        for stage in stages:
+            provider = getattr(stage, "provider", None)
+            if provider:
+                workers[stage.name] = getattr(pipeline, f"{provider}_max_concurrency")
+            else:
+                workers[stage.name] = local_workers or composition_executor.workers
+        return cls(stages, workers)
+
+    async def stream(self, count: int) -> AsyncIterator[PipelineContext]:
+        """Yield the context of each video as soon as all its stages finish.
+
+        The first stage failure cancels the batch and is raised.
+        """
+        queues: Dict[str, asyncio.Queue] = {
+            name: asyncio.Queue(self.queue_size or n * 2)
+            for name, n in self.workers.items()
+        }
+        finished: asyncio.Queue = asyncio.Queue()
+        roots = [s.name for s in self.stages if not self.requires[s.name]]
+
+        async def route(item: _BatchItem, names: Iterable[str]) -> None:
+            for name in names:
+                if name not in item.started and self.requires[name] <= item.done:
+                    item.started.add(name)
+                    await queues[name].put(item)
+            if len(item.done) == len(self.stages):
+                await finished.put((item, None))
+
+        async def worker(stage: PipelineStage) -> None:
+            queue = queues[stage.name]
+            while True:
+                item = await queue.get()
+                try:
+                    check_deadline()
+                    copy = replace(item.ctx, meta=dict(item.ctx.meta))
+                    result = await stage.execute(copy)
+                except Exception as exc:
+                    await finished.put((item, exc))
+                    continue
+                ParallelPipelineScheduler._merge(stage, result, item.ctx)
+                item.done.add(stage.name)
+                await route(item, self.dependents[stage.name])
+
+        async def feed() -> None:
+            for index in range(count):
+                await route(_BatchItem(index), roots)
+
+        tasks = [asyncio.create_task(feed())]
+        for stage in self.stages:
+            tasks.extend(
+                asyncio.create_task(worker(stage))
+                for _ in range(self.workers[stage.name])
+            )
+        try:
+            for _ in range(count):
+                item, exc = await finished.get()
+                if exc is not None:
+                    raise exc
+                yield item.ctx
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self, count: int) -> List[PipelineContext]:
+        return [ctx async for ctx in self.stream(count)]
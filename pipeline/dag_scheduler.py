@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Iterable
+
+from .parallel_scheduler import ParallelPipelineScheduler, StageExecutionError
+from .stages import PipelineStage, PipelineContext
+from .state_manager import StateManager
+from .progress import ProgressTracker
+
+
+class DAGPipelineScheduler(ParallelPipelineScheduler):
+    """Dependency-aware replacement for :class:`PipelineScheduler`.
+
+    Stages run as soon as the fields they require are available, so music
+    and voice generation overlap image and video rendering. ``concurrency``
+    bounds whole pipelines; ``stage_concurrency`` bounds stages across every
+    run sharing this scheduler and defaults to four per pipeline.
+    """
+
+    def __init__(
+        self, concurrency: int = 1, stage_concurrency: int | None = None
+    ) -> None:
+        super().__init__(stage_concurrency or concurrency * 4)
+        self.pipeline_sem = asyncio.Semaphore(concurrency)
+
+    async def run_pipeline(
+        self,
+        stages: Iterable[PipelineStage],
+        state: StateManager,
+        progress: ProgressTracker,
+        ctx: PipelineContext | None = None,
+    ) -> PipelineContext:
+        async with self.pipeline_sem:
+            last_stage, saved = await state.load()
+            if last_stage:
+                ctx = saved
+            try:
+                ctx = await self.execute_pipeline(
+                    stages, ctx or saved, state=state, progress=progress
+                )
+            except StageExecutionError as exc:
+                # PipelineScheduler callers expect the stage's own exception.
+                raise exc.__cause__ or exc
+            await state.clear()
+            return ctx
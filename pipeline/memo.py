@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter, Gauge
+
+from .stages import PipelineContext, PipelineStage
+
+MEMO_HITS = Counter("stage_memo_hits_total", "Stage outputs reused from the memo", ["stage"])
+MEMO_MISSES = Counter("stage_memo_misses_total", "Stage executions not found in the memo", ["stage"])
+MEMO_EVICTIONS = Counter("stage_memo_evictions_total", "Memo entries evicted for the byte budget")
+MEMO_BYTES = Gauge("stage_memo_bytes", "Bytes of media held by the stage memo")
+
+_CHUNK = 1 << 20
+# Index writes for LRU touches are batched: at most one per this many hits
+# or this many seconds. Touches lost in a crash only skew eviction order.
+_TOUCH_BATCH = 64
+_TOUCH_INTERVAL = 30.0
+
+# Context fields that hold media files, with the key holding the path for
+# fields that are dicts. Only these are hashed by content and stored.
+MEDIA_FIELDS: Dict[str, Optional[str]] = {
+    "image_path": None,
+    "video_path": None,
+    "music_path": None,
+    "output": None,
+    "voice": "filename",
+}
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _declared_path(name: str, value: Any) -> Any:
+    key = MEDIA_FIELDS[name]
+    return value.get(key) if key is not None and isinstance(value, dict) else value
+
+
+def _media_path(name: str, value: Any) -> Optional[str]:
+    """The media file the context field ``name`` points at, if it exists."""
+    if name not in MEDIA_FIELDS:
+        return None
+    path = _declared_path(name, value)
+    return path if isinstance(path, str) and os.path.isfile(path) else None
+
+
+def _with_media_path(name: str, value: Any, path: str) -> Any:
+    key = MEDIA_FIELDS[name]
+    return path if key is None else {**value, key: path}
+
+
+def _fingerprint(name: str, value: Any) -> Any:
+    """``value`` with the media file of a media field replaced by its sha256."""
+    path = _media_path(name, value)
+    if path is None:
+        return value
+    return _with_media_path(name, value, f"sha256:{_file_sha256(path)}")
+
+
+def _fresh_path(path: str) -> str:
+    """A new path beside ``path`` that no other run has written to."""
+    base = Path(path)
+    return str(base.with_name(f"{base.stem}_{uuid.uuid4().hex[:12]}{base.suffix}"))
+
+
+class StageMemo:
+    """Persistent content-addressed store of stage outputs.
+
+    Entries are keyed by a hash of the stage name, its settings and its
+    inputs, where input files contribute the sha256 of their content. Media
+    produced by a stage is copied into ``root/blobs`` under its own sha256.
+    On a hit the original file is reused if it still has that content;
+    otherwise the blob is copied to a fresh path beside it, so a restore
+    never overwrites media another run has since written there. Only the
+    fields in :data:`MEDIA_FIELDS` are treated as files. The JSON index at
+    ``root/index.json`` records each entry's size and last use; least
+    recently used entries are evicted once blobs exceed ``max_bytes``.
+    """
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self.index_path = self.root / "index.json"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._touches = 0
+        self._saved = time.monotonic()
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+        MEMO_BYTES.set(self._blob_bytes())
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        tmp.write_text(json.dumps(self._index))
+        os.replace(tmp, self.index_path)
+        self._touches = 0
+        self._saved = time.monotonic()
+
+    def flush(self) -> None:
+        """Write out LRU touches not yet saved."""
+        with self._lock:
+            if self._touches:
+                self._save_index()
+
+    def _blob_refs(self) -> tuple[Dict[str, int], Dict[str, int]]:
+        """Return ``(refcount, size)`` per blob across all index entries."""
+        refs: Dict[str, int] = {}
+        sizes: Dict[str, int] = {}
+        for entry in self._index.values():
+            for blob, size in entry["blobs"].items():
+                refs[blob] = refs.get(blob, 0) + 1
+                sizes[blob] = size
+        return refs, sizes
+
+    def _blob_bytes(self) -> int:
+        return sum(self._blob_refs()[1].values())
+
+    def key(self, stage: PipelineStage, settings: Dict[str, Any], ctx: PipelineContext) -> str:
+        inputs = {
+            name: _fingerprint(name, getattr(ctx, name, None)) for name in sorted(stage.requires)
+        }
+        payload = json.dumps(
+            {"stage": stage.name, "settings": settings, "inputs": inputs},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _restore(self, fields: Dict[str, Any], files: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """``fields`` with every media file present, or ``None`` if a blob is gone."""
+        restored = dict(fields)
+        for name, value in fields.items():
+            if name not in MEDIA_FIELDS:
+                continue
+            path = _declared_path(name, value)
+            blob = files.get(path) if isinstance(path, str) else None
+            if blob is None or (os.path.isfile(path) and _file_sha256(path) == blob):
+                continue
+            src = self.blobs / blob
+            if not src.is_file():
+                return None
+            dest = _fresh_path(path)
+            Path(dest).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(src, dest)
+            restored[name] = _with_media_path(name, value, dest)
+        return restored
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the memoised fields for ``key``, restoring their media files."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            fields = self._restore(entry["fields"], entry["files"])
+            if fields is None:
+                del self._index[key]
+                self._save_index()
+                return None
+            entry["used"] = time.time()
+            self._touches += 1
+            if (
+                self._touches >= _TOUCH_BATCH
+                or time.monotonic() - self._saved >= _TOUCH_INTERVAL
+            ):
+                self._save_index()
+            return fields
+
+    def store(self, key: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            self.blobs.mkdir(parents=True, exist_ok=True)
+            files: Dict[str, str] = {}
+            blobs: Dict[str, int] = {}
+            paths = [_media_path(name, value) for name, value in fields.items()]
+            for path in filter(None, paths):
+                blob = _file_sha256(path)
+                dest = self.blobs / blob
+                if not dest.exists():
+                    shutil.copyfile(path, dest)
+                files[path] = blob
+                blobs[blob] = dest.stat().st_size
+            old = self._index.pop(key, None)
+            self._index[key] = {
+                "fields": fields,
+                "files": files,
+                "blobs": blobs,
+                "used": time.time(),
+            }
+            self._evict(old)
+            self._save_index()
+
+    def _evict(self, replaced: Optional[Dict[str, Any]] = None) -> None:
+        """Drop least recently used entries until blobs fit ``max_bytes``."""
+        refs, sizes = self._blob_refs()
+        total = sum(sizes.values())
+        dropped = [replaced] if replaced else []
+        for key in sorted(self._index, key=lambda k: self._index[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            entry = self._index.pop(key)
+            MEMO_EVICTIONS.inc()
+            for blob in entry["blobs"]:
+                refs[blob] -= 1
+                if not refs[blob]:
+                    total -= sizes[blob]
+            dropped.append(entry)
+        for entry in dropped:
+            for blob in entry["blobs"]:
+                if not refs.get(blob):
+                    (self.blobs / blob).unlink(missing_ok=True)
+        MEMO_BYTES.set(total)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = {}
+            shutil.rmtree(self.root, ignore_errors=True)
+            MEMO_BYTES.set(0)
+
+
+class MemoizedStage(PipelineStage):
+    """Wrap a stage so identical inputs reuse its stored outputs.
+
+    Only stages that return settings from ``memo_settings()`` are memoised;
+    the wrapper keeps the wrapped stage's name and dependency declarations
+    so schedulers treat it exactly like the original.
+    """
+
+    def __init__(self, stage: PipelineStage, memo: StageMemo) -> None:
+        self.stage = stage
+        self.memo = memo
+        self.name = stage.name
+        self.requires = stage.requires
+        self.produces = stage.produces
+        self.provider = stage.provider
+
+    def memo_settings(self) -> Optional[Dict[str, Any]]:
+        return self.stage.memo_settings()
+
+    async def validate_inputs(self, ctx: PipelineContext) -> bool:
+        return await self.stage.validate_inputs(ctx)
+
+    async def execute(self, ctx: PipelineContext) -> PipelineContext:
+        settings = self.stage.memo_settings()
+        if settings is None or not await self.stage.validate_inputs(ctx):
+            return await self.stage.execute(ctx)
+        key = await asyncio.to_thread(self.memo.key, self.stage, settings, ctx)
+        fields = await asyncio.to_thread(self.memo.lookup, key)
+        if fields is not None:
+            MEMO_HITS.labels(stage=self.name).inc()
+            return replace(ctx, **fields)
+        MEMO_MISSES.labels(stage=self.name).inc()
+        result = await self.stage.execute(ctx)
+        produced = {f: getattr(result, f) for f in self.produces}
+        await asyncio.to_thread(self.memo.store, key, produced)
+        return result
+
+
+_memos: Dict[str, StageMemo] = {}
+
+
+def get_memo(root: str, max_bytes: int) -> StageMemo:
+    """Return the process-wide memo for ``root``, updating its byte budget."""
+    memo = _memos.get(root)
+    if memo is None:
+        memo = _memos[root] = StageMemo(root, max_bytes)
+        atexit.register(memo.flush)
+    memo.max_bytes = max_bytes
+    return memo
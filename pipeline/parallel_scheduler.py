@@ -1,9 +1,14 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Iterable, List, Dict, Set
+from dataclasses import replace
+from typing import Any, Iterable, List, Dict, Set
 
 from .stages import PipelineStage, PipelineContext
+from .state_manager import StateManager
+from .progress import ProgressTracker
+from utils.deadline import check_deadline
+from utils.provider_jobs import JobRecorder, recording
 
 
 class StageExecutionError(Exception):
@@ -14,17 +19,40 @@ class ParallelPipelineScheduler:
     def __init__(self, concurrency: int = 4) -> None:
         self.sem = asyncio.Semaphore(concurrency)
 
+    @staticmethod
+    def _dependencies(stages: Iterable[PipelineStage]) -> Dict[str, Set[str]]:
+        """Map each stage name to the names of the stages it waits for.
+
+        A requirement matches a stage by name or by one of its ``produces``
+        fields. Requirements nobody in ``stages`` provides are ignored.
+        """
+        stages = list(stages)
+        providers: Dict[str, Set[str]] = {}
+        for s in stages:
+            providers.setdefault(s.name, set()).add(s.name)
+            for field_name in getattr(s, "produces", ()):
+                providers.setdefault(field_name, set()).add(s.name)
+        return {
+            s.name: {
+                p
+                for req in getattr(s, "requires", ())
+                for p in providers.get(req, ())
+                if p != s.name
+            }
+            for s in stages
+        }
+
     def _dependency_graph(
         self, stages: Iterable[PipelineStage]
     ) -> List[List[PipelineStage]]:
+        stages = list(stages)
         stage_map: Dict[str, PipelineStage] = {s.name: s for s in stages}
-        in_deg: Dict[str, int] = {
-            s.name: len(getattr(s, "requires", set())) for s in stages
-        }
+        requires = self._dependencies(stages)
+        in_deg: Dict[str, int] = {name: len(reqs) for name, reqs in requires.items()}
         deps: Dict[str, List[str]] = {s.name: [] for s in stages}
-        for s in stages:
-            for dep in getattr(s, "requires", set()):
-                deps.setdefault(dep, []).append(s.name)
+        for name, reqs in requires.items():
+            for dep in reqs:
+                deps[dep].append(name)
         queue = [n for n, d in in_deg.items() if d == 0]
         groups: List[List[PipelineStage]] = []
         while queue:
@@ -41,30 +69,116 @@ class ParallelPipelineScheduler:
         return groups
 
     async def _run_stage(
-        self, stage: PipelineStage, ctx: PipelineContext
+        self,
+        stage: PipelineStage,
+        ctx: PipelineContext,
+        state: StateManager | None = None,
     ) -> PipelineContext:
         async with self.sem:
             try:
-                copy = PipelineContext(**vars(ctx))
-                return await stage.execute(copy)
+                copy = replace(ctx, meta=dict(ctx.meta))
+                # Provider jobs the stage starts are checkpointed as they are created.
+                recorder = JobRecorder(stage.name, copy.meta, state.record_job if state else None)
+                with recording(recorder):
+                    return await stage.execute(copy)
             except Exception as exc:
                 raise StageExecutionError(stage.name) from exc
 
     @staticmethod
-    def _merge(results: Iterable[PipelineContext], ctx: PipelineContext) -> PipelineContext:
-        for res in results:
-            for key, value in vars(res).items():
-                if value is not None:
-                    setattr(ctx, key, value)
+    def _merge(
+        stage: PipelineStage, result: PipelineContext, ctx: PipelineContext
+    ) -> PipelineContext:
+        """Copy the fields ``stage`` produced from ``result`` into ``ctx``.
+
+        Stages without a ``produces`` declaration contribute every non-None
+        field, which is only safe when they do not run alongside writers of
+        the same fields.
+        """
+        ctx.meta.update(result.meta)
+        fields = getattr(stage, "produces", ()) or [
+            k for k in vars(result) if k != "meta"
+        ]
+        for key in fields:
+            value = getattr(result, key)
+            if value is not None:
+                setattr(ctx, key, value)
         return ctx
 
+    @staticmethod
+    def _produced(stage: PipelineStage, ctx: PipelineContext) -> Dict[str, Any]:
+        return {f: getattr(ctx, f) for f in getattr(stage, "produces", ())}
+
     async def execute_pipeline(
-        self, stages: Iterable[PipelineStage], ctx: PipelineContext | None = None
+        self,
+        stages: Iterable[PipelineStage],
+        ctx: PipelineContext | None = None,
+        completed: Iterable[str] = (),
+        state: StateManager | None = None,
+        progress: ProgressTracker | None = None,
     ) -> PipelineContext:
+        """Run ``stages`` as a DAG, starting each one as soon as its
+        dependencies finish.
+
+        Stages named in ``completed`` are skipped. When ``state`` is given,
+        every finished node is checkpointed with the fields it produced and
+        nodes already recorded there are restored instead of re-run; nodes
+        that were cut short reattach to the provider jobs they had started.
+        If a node fails or is cancelled, nodes already in flight are allowed
+        to finish and are checkpointed before the error is raised. Once the
+        current deadline (see :mod:`utils.deadline`) has passed no further
+        node is started.
+        """
         ctx = ctx or PipelineContext()
-        groups = self._dependency_graph(list(stages))
-        for group in groups:
-            tasks = [self._run_stage(s, ctx) for s in group]
-            results = await asyncio.gather(*tasks)
-            ctx = self._merge(results, ctx)
+        stages = list(stages)
+        self._dependency_graph(stages)
+        requires = self._dependencies(stages)
+        names = {s.name for s in stages}
+        done: Set[str] = names & set(completed)
+        if state is not None:
+            for name, fields in (await state.completed_nodes()).items():
+                if name in names:
+                    for key, value in fields.items():
+                        setattr(ctx, key, value)
+                    done.add(name)
+            ctx.meta.update(await state.provider_jobs())
+        pending: Dict[str, PipelineStage] = {
+            s.name: s for s in stages if s.name not in done
+        }
+        running: Dict[asyncio.Task, PipelineStage] = {}
+        failure: BaseException | None = None
+        try:
+            while running or (pending and failure is None):
+                for name, stage in list(pending.items()):
+                    if failure is None and requires[name] <= done:
+                        # No stage starts once the request's deadline passed.
+                        check_deadline()
+                        del pending[name]
+                        if progress:
+                            await progress.update(name, 0.0)
+                        task = asyncio.create_task(self._run_stage(stage, ctx, state))
+                        running[task] = stage
+                finished, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in finished:
+                    stage = running.pop(task)
+                    # exception() raises for a task cancelled from outside.
+                    if task.cancelled():
+                        failure = failure or asyncio.CancelledError(f"stage {stage.name} cancelled")
+                        continue
+                    if task.exception() is not None:
+                        failure = failure or task.exception()
+                        continue
+                    ctx = self._merge(stage, task.result(), ctx)
+                    done.add(stage.name)
+                    if state:
+                        await state.save(stage.name, ctx, self._produced(stage, ctx))
+                    if progress:
+                        await progress.update(stage.name, 1.0)
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+        if failure is not None:
+            raise failure
         return ctx
@@ -6,6 +6,7 @@ from typing import Iterable
 from .stages import PipelineStage, PipelineContext
 from .state_manager import StateManager
 from .progress import ProgressTracker
+from utils.provider_jobs import JobRecorder, recording
 
 
 class PipelineScheduler:
@@ -22,6 +23,7 @@ class PipelineScheduler:
         async with self.sem:
             last_stage, saved = await state.load()
             ctx = ctx or saved
+            ctx.meta.update(await state.provider_jobs())
             resume = bool(last_stage)
             started = False
             for stage in stages:
@@ -30,7 +32,8 @@ class PipelineScheduler:
                         started = True
                     continue
                 await progress.update(stage.name, 0.0)
-                ctx = await stage.execute(ctx)
+                with recording(JobRecorder(stage.name, ctx.meta, state.record_job)):
+                    ctx = await stage.execute(ctx)
                 await state.save(stage.name, ctx)
                 await progress.update(stage.name, 1.0)
             await state.clear()
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import asyncio
+import uuid
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Any, Dict, Optional
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Optional
 
 from services.interfaces import IdeaGeneratorInterface, MediaGeneratorInterface
 
@@ -21,7 +23,19 @@ class PipelineContext:
 
 
 class PipelineStage(ABC):
+    """A unit of pipeline work.
+
+    ``requires`` lists the :class:`PipelineContext` fields a stage reads and
+    ``produces`` the fields it writes; schedulers derive the dependency graph
+    from them. A requirement that no other stage produces is expected to be
+    present on the incoming context.
+    """
+
     name: str
+    requires: FrozenSet[str] = frozenset()
+    produces: FrozenSet[str] = frozenset()
+    # External provider whose capacity bounds this stage (None for local work).
+    provider: Optional[str] = None
 
     @abstractmethod
     async def execute(self, ctx: PipelineContext) -> PipelineContext:
@@ -30,17 +44,36 @@ class PipelineStage(ABC):
     async def validate_inputs(self, ctx: PipelineContext) -> bool:
         return True
 
+    def memo_settings(self) -> Optional[Dict[str, Any]]:
+        """Model and settings that, with the inputs, determine the output.
+
+        ``None`` (the default) marks the stage as not memoisable.
+        """
+        return None
+
     async def cleanup(self, ctx: PipelineContext) -> None:  # pragma: no cover
         pass
 
 
+def _service_settings(service: Any) -> Optional[Dict[str, Any]]:
+    settings = getattr(service, "memo_settings", None)
+    if settings is None:
+        return None
+    return {"service": type(service).__name__, **settings()}
+
+
 class IdeaGeneration(PipelineStage):
     name = "idea_generation"
+    provider = "openai"
+    produces = frozenset({"idea", "prompt"})
 
     def __init__(self, service: IdeaGeneratorInterface) -> None:
         self.service = service
 
     async def execute(self, ctx: PipelineContext) -> PipelineContext:
+        if ctx.idea and ctx.prompt:
+            # Seeded by a batch that generated its ideas up front.
+            return ctx
         data = await self.service.generate()
         ctx.idea = data["idea"]
         ctx.prompt = data["prompt"]
@@ -49,10 +82,16 @@ class IdeaGeneration(PipelineStage):
 
 class ImageGeneration(PipelineStage):
     name = "image_generation"
+    provider = "replicate"
+    requires = frozenset({"prompt"})
+    produces = frozenset({"image_path"})
 
     def __init__(self, service: MediaGeneratorInterface) -> None:
         self.service = service
 
+    def memo_settings(self) -> Optional[Dict[str, Any]]:
+        return _service_settings(self.service)
+
     async def validate_inputs(self, ctx: PipelineContext) -> bool:
         return bool(ctx.prompt)
 
@@ -65,10 +104,16 @@ class ImageGeneration(PipelineStage):
 
 class VideoGeneration(PipelineStage):
     name = "video_generation"
+    provider = "replicate"
+    requires = frozenset({"prompt", "image_path"})
+    produces = frozenset({"video_path"})
 
     def __init__(self, service: MediaGeneratorInterface) -> None:
         self.service = service
 
+    def memo_settings(self) -> Optional[Dict[str, Any]]:
+        return _service_settings(self.service)
+
     async def validate_inputs(self, ctx: PipelineContext) -> bool:
         return bool(ctx.prompt and ctx.image_path)
 
@@ -83,10 +128,16 @@ class VideoGeneration(PipelineStage):
 
 class MusicGeneration(PipelineStage):
     name = "music_generation"
+    provider = "sonauto"
+    requires = frozenset({"idea"})
+    produces = frozenset({"music_path"})
 
     def __init__(self, service: MediaGeneratorInterface) -> None:
         self.service = service
 
+    def memo_settings(self) -> Optional[Dict[str, Any]]:
+        return _service_settings(self.service)
+
     async def validate_inputs(self, ctx: PipelineContext) -> bool:
         return bool(ctx.idea)
 
@@ -99,10 +150,16 @@ class MusicGeneration(PipelineStage):
 
 class VoiceGeneration(PipelineStage):
     name = "voice_generation"
+    provider = "openai"
+    requires = frozenset({"idea"})
+    produces = frozenset({"voice"})
 
     def __init__(self, service: MediaGeneratorInterface) -> None:
         self.service = service
 
+    def memo_settings(self) -> Optional[Dict[str, Any]]:
+        return _service_settings(self.service)
+
     async def validate_inputs(self, ctx: PipelineContext) -> bool:
         return bool(ctx.idea)
 
@@ -115,10 +172,16 @@ class VoiceGeneration(PipelineStage):
 
 class Composition(PipelineStage):
     name = "composition"
+    # ``voice`` only orders composition after a voice stage when one exists.
+    requires = frozenset({"video_path", "music_path", "voice"})
+    produces = frozenset({"output"})
 
     def __init__(self, duration: int) -> None:
         self.duration = duration
 
+    def memo_settings(self) -> Optional[Dict[str, Any]]:
+        return {"duration": self.duration}
+
     async def validate_inputs(self, ctx: PipelineContext) -> bool:
         return bool(ctx.video_path and ctx.music_path)
 
@@ -128,11 +191,13 @@ class Composition(PipelineStage):
         voice_file = ctx.voice["filename"] if ctx.voice else None
         from . import merge_video_audio
 
+        # A path per job so concurrent compositions never share an output.
+        output = Path(ctx.video_path).parent / f"final_{uuid.uuid4().hex}.mp4"
         ctx.output = await merge_video_audio(
             ctx.video_path,
             ctx.music_path,
             voice_file,
-            "final_output.mp4",
+            str(output),
             self.duration,
         )
         return ctx
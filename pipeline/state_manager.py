@@ -1,30 +1,132 @@
 from __future__ import annotations
 
 import asyncio
+import copy
 import json
+import os
+import time
 from dataclasses import asdict
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Dict, Tuple
 
+from storage.journal import CheckpointJournal
 from .stages import PipelineContext
 
 
 class StateManager:
+    """Checkpoint a pipeline run to a JSON file.
+
+    Besides the latest context, the checkpoint records every completed node
+    together with the fields it produced, so DAG runs can resume only the
+    nodes that had not finished. Provider jobs started by running nodes are
+    recorded the moment they are created (see :meth:`record_job`), so a
+    resumed node can reattach to them instead of paying for a second one.
+    """
+
     def __init__(self, path: str) -> None:
         self.path = Path(path)
+        self._completed: Dict[str, Dict[str, Any]] = {}
+        self._jobs: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
 
-    async def load(self) -> Tuple[str, PipelineContext]:
+    async def _read(self) -> Dict[str, Any]:
         if not self.path.exists():
-            return "", PipelineContext()
+            return {}
         data = await asyncio.to_thread(self.path.read_text)
-        payload = json.loads(data)
+        return json.loads(data)
+
+    def _write(self, data: str) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    async def load(self) -> Tuple[str, PipelineContext]:
+        payload = await self._read()
+        self._completed = payload.get("completed", {})
+        self._jobs = payload.get("jobs", {})
         ctx = PipelineContext(**payload.get("context", {}))
+        ctx.meta.update(self._jobs)
         return payload.get("stage", ""), ctx
 
-    async def save(self, stage: str, ctx: PipelineContext) -> None:
-        data = json.dumps({"stage": stage, "context": asdict(ctx)})
-        await asyncio.to_thread(self.path.write_text, data)
+    async def completed_nodes(self) -> Dict[str, Dict[str, Any]]:
+        """Return ``{node: produced_fields}`` for every checkpointed node."""
+        payload = await self._read()
+        self._completed = payload.get("completed", {})
+        return dict(self._completed)
 
-    async def clear(self) -> None:
+    async def provider_jobs(self) -> Dict[str, str]:
+        """Return the ``meta`` entries of every recorded provider job."""
+        payload = await self._read()
+        self._jobs = payload.get("jobs", {})
+        return dict(self._jobs)
+
+    async def record_job(self, key: str, job_id: str) -> None:
+        """Checkpoint a provider job as soon as it is created."""
+        async with self._lock:
+            self._jobs[key] = job_id
+            payload = await self._read()
+            payload["completed"] = dict(self._completed)
+            payload["jobs"] = dict(self._jobs)
+            await self._store(payload)
+
+    async def _store(self, payload: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write, json.dumps(payload))
+
+    async def _remove(self) -> None:
         if self.path.exists():
             await asyncio.to_thread(self.path.unlink)
+
+    async def save(
+        self,
+        stage: str,
+        ctx: PipelineContext,
+        produced: Dict[str, Any] | None = None,
+    ) -> None:
+        async with self._lock:
+            if produced is not None:
+                self._completed[stage] = produced
+            await self._store(
+                {
+                    "stage": stage,
+                    "context": asdict(ctx),
+                    "completed": dict(self._completed),
+                    "jobs": dict(self._jobs),
+                }
+            )
+
+    async def clear(self) -> None:
+        async with self._lock:
+            self._completed = {}
+            self._jobs = {}
+            await self._remove()
+
+
+class JournalStateManager(StateManager):
+    """Checkpoint a pipeline run as records in a shared :class:`CheckpointJournal`.
+
+    Behaves like :class:`StateManager` but appends to the process journal
+    instead of rewriting a file per pipeline; ``clear`` deletes the record
+    so compaction can reclaim it. Records carry the time they were saved,
+    so those of runs that never finished age out in
+    :meth:`PipelineStateManager.cleanup_old_states`.
+    """
+
+    def __init__(self, pipeline_id: str, journal: CheckpointJournal) -> None:
+        super().__init__(str(journal.path))
+        self.key = f"run:{pipeline_id}"
+        self.journal = journal
+
+    def has_checkpoint(self) -> bool:
+        return self.journal.get(self.key) is not None
+
+    async def _read(self) -> Dict[str, Any]:
+        return copy.deepcopy(self.journal.get(self.key) or {})
+
+    async def _store(self, payload: Dict[str, Any]) -> None:
+        await self.journal.put(self.key, {**payload, "saved": time.time()})
+
+    async def _remove(self) -> None:
+        await self.journal.delete(self.key)
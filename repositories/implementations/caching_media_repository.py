@@ -1,31 +1,42 @@
 from __future__ import annotations
 
-from typing import AsyncIterator, Dict
+from typing import AsyncIterator, Dict, Optional
 
 from ..media_repository import MediaRepository
 
 
 class CachingMediaRepository(MediaRepository):
-    """Cache decorator for another MediaRepository."""
+    """Cache decorator for another MediaRepository.
 
-    def __init__(self, repo: MediaRepository) -> None:
+    Media is streamed through to the wrapped repository; only items of at
+    most ``max_item_bytes`` are kept in the cache, so large videos are
+    never held whole in memory.
+    """
+
+    def __init__(self, repo: MediaRepository, max_item_bytes: int = 8 << 20) -> None:
         self._repo = repo
+        self._max_item_bytes = max_item_bytes
         self._cache: Dict[str, bytes] = {}
 
-    async def save_media(self, path: str, data: AsyncIterator[bytes]) -> str:
-        buf = bytearray()
+    async def _tee(self, path: str, data: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        buf: Optional[bytearray] = bytearray()
         async for chunk in data:
-            buf.extend(chunk)
-        self._cache[path] = bytes(buf)
-        async def _reader() -> AsyncIterator[bytes]:
-            yield self._cache[path]
-        await self._repo.save_media(path, _reader())
+            if buf is not None:
+                buf.extend(chunk)
+                if len(buf) > self._max_item_bytes:
+                    buf = None
+            yield chunk
+        if buf is not None:
+            self._cache[path] = bytes(buf)
+
+    async def save_media(self, path: str, data: AsyncIterator[bytes]) -> str:
+        self._cache.pop(path, None)
+        await self._repo.save_media(path, self._tee(path, data))
         return path
 
     async def load_media(self, path: str) -> AsyncIterator[bytes]:
-        if path not in self._cache:
-            chunks = []
-            async for chunk in self._repo.load_media(path):
-                chunks.append(chunk)
-            self._cache[path] = b"".join(chunks)
-        yield self._cache[path]
+        if path in self._cache:
+            yield self._cache[path]
+            return
+        async for chunk in self._tee(path, self._repo.load_media(path)):
+            yield chunk
@@ -11,9 +11,17 @@ from utils.api import api_call_with_retry
 
 from ..media_repository import MediaRepository
 
+# S3 requires every part of a multipart upload but the last to be at least 5 MiB.
+PART_SIZE = 8 << 20
+
 
 class S3MediaRepository(MediaRepository):
-    """Media storage backed by S3."""
+    """Media storage backed by S3.
+
+    Saves are streamed: a body larger than ``PART_SIZE`` is sent as a
+    multipart upload one part at a time, so at most one part is held in
+    memory.
+    """
 
     def __init__(self, bucket: str, prefix: str = "") -> None:
         self._bucket = bucket
@@ -27,12 +35,66 @@ class S3MediaRepository(MediaRepository):
         resp = await asyncio.to_thread(self._client.get_object, Bucket=self._bucket, Key=key)
         return await asyncio.to_thread(resp["Body"].read)
 
+    async def _upload_part(self, key: str, upload_id: str, number: int, body: bytes) -> dict:
+        resp = await asyncio.to_thread(
+            self._client.upload_part,
+            Bucket=self._bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=body,
+        )
+        return {"PartNumber": number, "ETag": resp["ETag"]}
+
+    async def _retry_part(self, key: str, upload_id: str, number: int, body: bytes) -> dict:
+        return await api_call_with_retry(
+            "s3_upload_part", lambda: self._upload_part(key, upload_id, number, body)
+        )
+
+    async def _put_multipart(self, key: str, buf: bytearray, rest: AsyncIterator[bytes]) -> None:
+        upload = await asyncio.to_thread(
+            self._client.create_multipart_upload, Bucket=self._bucket, Key=key
+        )
+        upload_id = upload["UploadId"]
+        parts = []
+        try:
+            while True:
+                while len(buf) >= PART_SIZE:
+                    body, buf = bytes(buf[:PART_SIZE]), buf[PART_SIZE:]
+                    parts.append(await self._retry_part(key, upload_id, len(parts) + 1, body))
+                chunk = await anext(rest, None)
+                if chunk is None:
+                    break
+                buf.extend(chunk)
+            if buf:
+                body = bytes(buf)
+                parts.append(await self._retry_part(key, upload_id, len(parts) + 1, body))
+            await asyncio.to_thread(
+                self._client.complete_multipart_upload,
+                Bucket=self._bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            # Uploaded parts are billed until the upload is aborted.
+            await asyncio.to_thread(
+                self._client.abort_multipart_upload,
+                Bucket=self._bucket,
+                Key=key,
+                UploadId=upload_id,
+            )
+            raise
+
     async def save_media(self, path: str, data: AsyncIterator[bytes]) -> str:
         key = f"{self._prefix}{path}"
         buf = bytearray()
-        async for chunk in data:
-            buf.extend(chunk)
         try:
+            async for chunk in data:
+                buf.extend(chunk)
+                if len(buf) >= PART_SIZE:
+                    await self._put_multipart(key, buf, data)
+                    return path
             await api_call_with_retry("s3_put", lambda: self._put(key, bytes(buf)))
             return path
         except BotoCoreError as exc:
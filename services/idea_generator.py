@@ -2,11 +2,15 @@ from __future__ import annotations
 
 import asyncio
 import json
+import re
 import time
-from typing import Dict, List
+import weakref
+from typing import Dict, List, Tuple
 
 from config import Config
+from exceptions import OpenAIError
 from utils import file_operations
+from utils.prompt_templates import prompt_registry
 from utils.api_clients import openai_chat
 from utils.monitoring import collector, tracer
 from security.input_validator import InputValidator
@@ -15,22 +19,61 @@ from monitoring.structured_logger import get_logger
 logger = get_logger(__name__)
 from .interfaces import IdeaGeneratorInterface
 
+_MAX_IDEAS_PER_CALL = 10
+_IDEA_RE = re.compile(r"\**[ \t]*Idea[ \t]*\d*[ \t]*\**[ \t]*:", re.IGNORECASE)
+_PROMPT_RE = re.compile(r"\**[ \t]*Prompt[ \t]*\**[ \t]*:", re.IGNORECASE)
+_TRAILING_NUMBER_RE = re.compile(r"(?:\s+(?:\d{1,2}[.)]|#+|-{3,}))+\s*$")
+
+_history_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _history_lock() -> asyncio.Lock:
+    """Per-event-loop lock serialising read-modify-write of the history file."""
+    loop = asyncio.get_running_loop()
+    lock = _history_locks.get(loop)
+    if lock is None:
+        lock = _history_locks[loop] = asyncio.Lock()
+    return lock
+
+
+def parse_ideas(content: str) -> List[Tuple[str, str]]:
+    """Extract ``(idea, prompt)`` pairs from a completion.
+
+    Tolerates numbering, markdown emphasis and pairs written inline or on
+    separate lines. Blocks without a ``Prompt:`` part are dropped.
+    """
+    pairs: List[Tuple[str, str]] = []
+    for block in _IDEA_RE.split(content)[1:]:
+        parts = _PROMPT_RE.split(block, maxsplit=1)
+        if len(parts) < 2:
+            continue
+        idea = " ".join(parts[0].replace("*", "").split())
+        prompt = " ".join(_TRAILING_NUMBER_RE.sub("", parts[1]).replace("*", "").split())
+        if idea and prompt:
+            pairs.append((idea, prompt))
+    return pairs
+
 
 class IdeaGeneratorService(IdeaGeneratorInterface):
     def __init__(self, config: Config) -> None:
         self.config = config
 
+    @staticmethod
+    def _avoid_section(history: List[str]) -> str:
+        if not history:
+            return ""
+        return "\n\nPlease avoid generating ideas similar to:\n" + "\n".join(
+            f"{i+1}. {idea}" for i, idea in enumerate(history)
+        )
+
     async def generate(self) -> Dict[str, str]:
         history = await self.get_history()
-        base = await file_operations.read_file("prompts/idea_gen.txt")
-        prompt = base
+        base = await prompt_registry.get("prompts/idea_gen.txt")
+        prompt = base + self._avoid_section(history)
         loop = asyncio.get_event_loop(); start = loop.time()
         logger.info("idea_generate_start")
-        if history:
-            avoid = "\n\nPlease avoid generating ideas similar to:\n" + "\n".join(
-                f"{i+1}. {idea}" for i, idea in enumerate(history)
-            )
-            prompt += avoid
         with tracer.trace_api_call("openai", "ideas"):
             response = await openai_chat(prompt, self.config)
         content = response.choices[0].message.content
@@ -39,12 +82,8 @@ class IdeaGeneratorService(IdeaGeneratorInterface):
         idea = await InputValidator.sanitize_text(idea.strip())
         prompt_clean = await InputValidator.sanitize_text(prompt_part.strip())
         result = {"idea": idea, "prompt": prompt_clean}
-        history.append(result["idea"])
-        history = history[-self.config.pipeline.max_stored_ideas :]
         try:
-            await file_operations.save_file(
-                self.config.pipeline.history_file, json.dumps(history).encode()
-            )
+            await self._record_history([result["idea"]])
             logger.info("idea_generate_done")
             return result
         except Exception:
@@ -53,6 +92,68 @@ class IdeaGeneratorService(IdeaGeneratorInterface):
         finally:
             collector.observe_response("idea", loop.time() - start)
 
+    async def generate_many(self, n: int, strict: bool = True) -> List[Dict[str, str]]:
+        """Generate ``n`` distinct idea/prompt pairs with as few chat calls
+        as possible (one per ``_MAX_IDEAS_PER_CALL`` ideas).
+
+        The template and history are read once and the history is updated
+        once, after all ideas are collected. If the model keeps returning
+        too few distinct ideas, raise ``OpenAIError`` or, with
+        ``strict=False``, return the ones collected so far.
+        """
+        if n < 1:
+            return []
+        history = await self.get_history()
+        base = await prompt_registry.get("prompts/idea_gen.txt")
+        loop = asyncio.get_event_loop(); start = loop.time()
+        logger.info("idea_generate_many_start", extra={"count": n})
+        results: List[Dict[str, str]] = []
+        seen = {idea.lower() for idea in history}
+        try:
+            calls = -(-n // _MAX_IDEAS_PER_CALL) + self.config.pipeline.retry_attempts - 1
+            for _ in range(calls):
+                want = min(n - len(results), _MAX_IDEAS_PER_CALL)
+                avoid = history + [r["idea"] for r in results]
+                prompt = (
+                    base
+                    + self._avoid_section(avoid)
+                    + f"\n\nInstead of one, create {want} distinct ideas. Write each"
+                    " as 'Idea: <idea>' followed by 'Prompt: <prompt>'."
+                )
+                with tracer.trace_api_call("openai", "ideas"):
+                    response = await openai_chat(prompt, self.config)
+                for idea, prompt_text in parse_ideas(response.choices[0].message.content):
+                    idea = await InputValidator.sanitize_text(idea)
+                    if idea.lower() in seen:
+                        continue
+                    seen.add(idea.lower())
+                    results.append(
+                        {"idea": idea, "prompt": await InputValidator.sanitize_text(prompt_text)}
+                    )
+                    if len(results) == n:
+                        break
+                if len(results) == n:
+                    break
+            if strict and len(results) < n:
+                raise OpenAIError(f"expected {n} ideas, got {len(results)}")
+            await self._record_history([r["idea"] for r in results])
+            logger.info("idea_generate_many_done", extra={"count": n})
+            return results
+        except Exception:
+            collector.increment_error("idea", "generate_many")
+            raise
+        finally:
+            collector.observe_response("idea", loop.time() - start)
+
+    async def _record_history(self, ideas: List[str]) -> None:
+        async with _history_lock():
+            history = await self.get_history()
+            history.extend(ideas)
+            history = history[-self.config.pipeline.max_stored_ideas :]
+            await file_operations.save_file(
+                self.config.pipeline.history_file, json.dumps(history).encode()
+            )
+
     async def get_history(self) -> List[str]:
         try:
             data = await file_operations.read_file(self.config.pipeline.history_file)
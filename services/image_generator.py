@@ -3,13 +3,15 @@ from __future__ import annotations
 import asyncio
 import time
 from pathlib import Path
-from typing import List, AsyncIterator
+from typing import Any, Dict, List, AsyncIterator
 
 from config import Config
 from utils.validation import sanitize_prompt, sanitize_prompt_param
 from repositories.media_repository import MediaRepository
 from utils.api_clients import replicate_run, http_get
+from optimization.streaming_io import iter_response
 from utils.monitoring import collector, tracer
+from utils.single_flight import generation_flight
 from monitoring.structured_logger import get_logger
 from security.input_validator import InputValidator
 
@@ -18,32 +20,41 @@ from .interfaces import MediaGeneratorInterface
 
 
 class ImageGeneratorService(MediaGeneratorInterface):
+    model = "black-forest-labs/flux-pro"
+    settings = {
+        "width": 768,
+        "height": 1344,
+        "output_format": "png",
+        "aspect_ratio": "9:16",
+        "safety_tolerance": 6,
+    }
+
     def __init__(self, config: Config, media_repo: MediaRepository) -> None:
         self.config = config
         self.media_repo = media_repo
 
+    def memo_settings(self) -> Dict[str, Any]:
+        return {"model": self.model, **self.settings}
+
     @sanitize_prompt_param
     async def generate(self, prompt: str, **kwargs) -> str:
+        # Identical concurrent prompts share one Flux call and one file.
+        return await generation_flight.do(
+            ("image", id(self.media_repo), prompt), lambda: self._generate(prompt)
+        )
+
+    async def _generate(self, prompt: str) -> str:
         filename = f"image/flux_image_{int(time.time())}.png"
         loop = asyncio.get_event_loop()
         start = loop.time()
         logger.info("image_generate_start", extra={"prompt": prompt})
-        inputs = {
-            "width": 768,
-            "height": 1344,
-            "prompt": prompt,
-            "output_format": "png",
-            "aspect_ratio": "9:16",
-            "safety_tolerance": 6,
-        }
+        inputs = {**self.settings, "prompt": prompt}
         try:
             with tracer.trace_api_call("replicate", "flux-pro"):
-                url = await replicate_run("black-forest-labs/flux-pro", inputs, self.config)
+                url = await replicate_run(self.model, inputs, self.config)
             with tracer.trace_api_call("replicate", "download"):
                 resp = await http_get(url, self.config)
-            async def _reader() -> AsyncIterator[bytes]:
-                yield await resp.read()
-            await self.media_repo.save_media(filename, _reader())
+                await self.media_repo.save_media(filename, iter_response(resp))
             logger.info("image_generate_done", extra={"file": filename})
             return filename
         except Exception:
@@ -53,13 +64,8 @@ class ImageGeneratorService(MediaGeneratorInterface):
             collector.observe_response("image", loop.time() - start)
 
     async def generate_batch(self, prompts: List[str]) -> List[str]:
-        sem = asyncio.Semaphore(5)
-
-        async def gen(p: str) -> str:
-            async with sem:
-                return await self.generate(p)
-
-        return await asyncio.gather(*(gen(p) for p in prompts))
+        # Flux calls and downloads are throttled by the shared provider governors.
+        return await asyncio.gather(*(self.generate(p) for p in prompts))
 
     async def get_supported_formats(self) -> List[str]:
         return ["png"]
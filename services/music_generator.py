@@ -2,74 +2,107 @@ from __future__ import annotations
 
 import asyncio
 import time
-from typing import Dict, List, AsyncIterator
+from typing import Any, Dict, List, AsyncIterator
 
 from config import Config
 from utils.validation import sanitize_prompt, sanitize_prompt_param
 from repositories.media_repository import MediaRepository
 from utils.api_clients import http_post, http_get
+from utils.deadline import clamp_timeout
+from optimization.streaming_io import iter_response
 from utils.monitoring import collector, tracer
+from utils.single_flight import generation_flight
+from utils.sonauto_poller import get_sonauto_poller
+from utils.provider_jobs import PROVIDER_JOBS_REATTACHED, record_job, recorded_job
 from monitoring.structured_logger import get_logger
 from security.input_validator import InputValidator
 
 logger = get_logger(__name__)
-from exceptions import SonautoError, NetworkError
+from exceptions import DeadlineExceededError, SonautoError
 from .interfaces import MediaGeneratorInterface
 
 
 class MusicGeneratorService(MediaGeneratorInterface):
+    settings = {
+        "tags": ["ethereal", "chants"],
+        "instrumental": True,
+        "prompt_strength": 2.3,
+        "output_format": "mp3",
+    }
+
     def __init__(self, config: Config, media_repo: MediaRepository) -> None:
         self.config = config
         self.media_repo = media_repo
 
+    def memo_settings(self) -> Dict[str, Any]:
+        return {"api": "https://api.sonauto.ai/v1/generations", **self.settings}
+
     async def _wait_for_music(self, task_id: str, headers: Dict[str, str]) -> str:
-        for _ in range(20):
-            await asyncio.sleep(5)
-            status = await http_get(
+        async def status() -> str:
+            resp = await http_get(
                 f"https://api.sonauto.ai/v1/generations/status/{task_id}",
                 self.config,
                 headers,
             )
-            if status.status != 200:
-                raise SonautoError(await status.text())
-            state = (await status.text()).strip('"')
-            if state == "FAILURE":
-                raise SonautoError("Music generation failed")
-            if state == "SUCCESS":
-                result = await http_get(
-                    f"https://api.sonauto.ai/v1/generations/{task_id}",
-                    self.config,
-                    headers,
-                )
-                if result.status != 200:
-                    raise SonautoError(await result.text())
-                data = await result.json()
-                return data["song_paths"][0]
-        raise NetworkError("Music generation timed out")
+            if resp.status != 200:
+                raise SonautoError(await resp.text())
+            return (await resp.text()).strip('"')
+
+        poller = get_sonauto_poller(self.config.pipeline.sonauto_status_checks_per_second)
+        try:
+            await asyncio.wait_for(poller.wait(task_id, status), clamp_timeout(None))
+        except asyncio.TimeoutError as exc:
+            raise DeadlineExceededError(f"sonauto task {task_id} outlived the request deadline") from exc
+        result = await http_get(
+            f"https://api.sonauto.ai/v1/generations/{task_id}",
+            self.config,
+            headers,
+        )
+        if result.status != 200:
+            raise SonautoError(await result.text())
+        data = await result.json()
+        return data["song_paths"][0]
+
+    async def _reattach(self, headers: Dict[str, str]) -> str | None:
+        """Song URL of the task this stage started before a restart, or
+        ``None`` when there is none or it can no longer deliver one."""
+        task_id = recorded_job("sonauto")
+        if task_id is None:
+            return None
+        try:
+            url = await self._wait_for_music(task_id, headers)
+        except DeadlineExceededError:
+            raise
+        except Exception as exc:
+            logger.warning("music_reattach_failed", extra={"task_id": task_id, "error": str(exc)})
+            return None
+        PROVIDER_JOBS_REATTACHED.labels(provider="sonauto").inc()
+        return url
 
     @sanitize_prompt_param
     async def generate(self, prompt: str, **kwargs) -> str:
+        # Identical concurrent prompts share one Sonauto task and one file.
+        return await generation_flight.do(
+            ("music", id(self.media_repo), prompt), lambda: self._generate(prompt)
+        )
+
+    async def _generate(self, prompt: str) -> str:
         filename = f"music/sonauto_music_{int(time.time())}.mp3"
         loop = asyncio.get_event_loop(); start = loop.time()
         logger.info("music_generate_start")
-        payload = {
-            "prompt": prompt,
-            "tags": ["ethereal", "chants"],
-            "instrumental": True,
-            "prompt_strength": 2.3,
-            "output_format": "mp3",
-        }
+        payload = {"prompt": prompt, **self.settings}
         headers = {"Authorization": f"Bearer {self.config.sonauto_api_key}", "Content-Type": "application/json"}
         try:
-            with tracer.trace_api_call("sonauto", "create"):
-                resp = await http_post("https://api.sonauto.ai/v1/generations", payload, headers, self.config)
-            data = await resp.json()
-            task_id = data["task_id"]
-            url = await self._wait_for_music(task_id, headers)
+            url = await self._reattach(headers)
+            if url is None:
+                with tracer.trace_api_call("sonauto", "create"):
+                    resp = await http_post("https://api.sonauto.ai/v1/generations", payload, headers, self.config)
+                data = await resp.json()
+                task_id = data["task_id"]
+                await record_job("sonauto", task_id)
+                url = await self._wait_for_music(task_id, headers)
             song = await http_get(url, self.config, None)
-            async def _reader() -> AsyncIterator[bytes]:
-                yield await song.read()
-            await self.media_repo.save_media(filename, _reader())
+            await self.media_repo.save_media(filename, iter_response(song))
             logger.info("music_generate_done", extra={"file": filename})
             return filename
         except Exception:
@@ -79,13 +112,8 @@ class MusicGeneratorService(MediaGeneratorInterface):
             collector.observe_response("music", loop.time() - start)
 
     async def generate_batch(self, prompts: List[str]) -> List[str]:
-        sem = asyncio.Semaphore(3)
-
-        async def gen(p: str) -> str:
-            async with sem:
-                return await self.generate(p)
-
-        return await asyncio.gather(*(gen(p) for p in prompts))
+        # Sonauto requests are throttled by the shared sonauto governor.
+        return await asyncio.gather(*(self.generate(p) for p in prompts))
 
     async def get_supported_formats(self) -> List[str]:
         return ["mp3"]
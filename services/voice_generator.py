@@ -2,13 +2,16 @@ from __future__ import annotations
 
 import asyncio
 import time
-from typing import Dict, List, AsyncIterator
+from typing import Any, Dict, List, AsyncIterator
 
 from config import Config
 from utils import file_operations
+from utils.prompt_templates import prompt_registry
 from repositories.media_repository import MediaRepository
 from utils.api_clients import openai_chat, openai_speech
+from optimization.streaming_io import iter_response
 from utils.monitoring import collector, tracer
+from utils.single_flight import generation_flight
 from monitoring.structured_logger import get_logger
 from utils.validation import sanitize_prompt, sanitize_prompt_param
 from security.input_validator import InputValidator
@@ -22,10 +25,20 @@ class VoiceGeneratorService(MediaGeneratorInterface):
         self.config = config
         self.media_repo = media_repo
 
+    def memo_settings(self) -> Dict[str, Any]:
+        return {"chat_model": "gpt-4o", "tts_model": "gpt-4o-mini-tts"}
+
     @sanitize_prompt_param
     async def generate(self, prompt: str, **kwargs) -> Dict[str, str]:
+        # Identical concurrent ideas share one dialog and one TTS clip.
+        result = await generation_flight.do(
+            ("voice", id(self.media_repo), prompt), lambda: self._generate(prompt)
+        )
+        return dict(result)
+
+    async def _generate(self, prompt: str) -> Dict[str, str]:
         idea = prompt
-        examples = await file_operations.read_file("prompts/voice_examples.txt")
+        examples = await prompt_registry.get("prompts/voice_examples.txt")
         loop = asyncio.get_event_loop(); start = loop.time()
         logger.info("voice_generate_start")
         chat_prompt = f"Create a brief question for: {idea}\n{examples}"
@@ -45,11 +58,12 @@ class VoiceGeneratorService(MediaGeneratorInterface):
             with tracer.trace_api_call("openai", "tts"):
                 speech = await openai_speech(dialog, voice, instructions, self.config)
             filename = f"voice/openai_voice_{int(time.time())}.mp3"
-            await asyncio.to_thread(speech.stream_to_file, filename)
-            async def _reader() -> AsyncIterator[bytes]:
-                async for chunk in file_operations.read_file_stream(filename):
-                    yield chunk
-            await self.media_repo.save_media(filename, _reader())
+            try:
+                await self.media_repo.save_media(filename, iter_response(speech))
+            except BaseException:
+                # iter_response closes the response only once it is iterated.
+                await speech.close()
+                raise
             logger.info("voice_generate_done", extra={"file": filename})
             return {"filename": filename, "dialog": dialog, "voice": voice, "instructions": instructions}
         except Exception:
@@ -59,13 +73,8 @@ class VoiceGeneratorService(MediaGeneratorInterface):
             collector.observe_response("voice", loop.time() - start)
 
     async def generate_batch(self, prompts: List[str]) -> List[Dict[str, str]]:
-        sem = asyncio.Semaphore(3)
-
-        async def gen(p: str) -> Dict[str, str]:
-            async with sem:
-                return await self.generate(p)
-
-        return await asyncio.gather(*(gen(p) for p in prompts))
+        # Chat and TTS calls are throttled by the shared openai governor.
+        return await asyncio.gather(*(self.generate(p) for p in prompts))
 
     async def get_supported_formats(self) -> List[str]:
         return ["mp3"]
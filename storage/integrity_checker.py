@@ -1,11 +1,14 @@
 import asyncio
 import hashlib
 import json
+import threading
 from pathlib import Path
 from typing import Dict
 
 from exceptions import FileOperationError
 
+_checksum_lock = threading.Lock()
+
 
 class IntegrityChecker:
     async def sha256(self, path: Path) -> str:
@@ -19,20 +22,21 @@ class IntegrityChecker:
         return await self.sha256(path) == checksum
 
     async def update_checksum_file(self, file: Path, name: str, checksum: str) -> None:
-        if file.exists():
-            try:
-                content = await asyncio.to_thread(file.read_text)
-                data = json.loads(content)
-            except OSError:
-                data = {}
-        else:
-            data = {}
-        data[name] = checksum
         try:
-            await asyncio.to_thread(file.write_text, json.dumps(data))
+            await asyncio.to_thread(self._update_checksum_file, file, name, checksum)
         except OSError as exc:
             raise FileOperationError(str(exc)) from exc
 
+    def _update_checksum_file(self, file: Path, name: str, checksum: str) -> None:
+        # Concurrent saves into one directory share its checksum file.
+        with _checksum_lock:
+            try:
+                data = json.loads(file.read_text()) if file.exists() else {}
+            except OSError:
+                data = {}
+            data[name] = checksum
+            file.write_text(json.dumps(data))
+
     async def load_checksums(self, file: Path) -> Dict[str, str]:
         if not file.exists():
             return {}
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from exceptions import FileOperationError
+
+JOURNAL_BATCH = Histogram(
+    "checkpoint_journal_batch_records",
+    "Records written per journal group commit",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+JOURNAL_FSYNCS = Counter("checkpoint_journal_fsyncs_total", "fsync calls on the checkpoint journal")
+JOURNAL_COMPACTIONS = Counter("checkpoint_journal_compactions_total", "Checkpoint journal compactions")
+JOURNAL_BYTES = Gauge("checkpoint_journal_bytes", "Size of the checkpoint journal file")
+
+_Pending = Tuple[bytes, asyncio.AbstractEventLoop, asyncio.Future]
+
+
+def _try_lock(path: Path) -> Optional[IO[bytes]]:
+    """Take the exclusive lock guarding the journal at ``path``; ``None``
+    if another open journal, in this or another process, holds it."""
+    lock = open(path.with_name(path.name + ".lock"), "ab")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+
+class CheckpointJournal:
+    """Append-only key/value journal shared by every pipeline in a process.
+
+    ``put`` and ``delete`` update an in-memory view at once and append one
+    JSON line to the journal. A writer thread commits whatever has queued up
+    in a single write, so concurrent pipelines share a write (and an fsync)
+    instead of rewriting one file each. With ``fsync_interval`` of 0 every
+    commit is fsynced before its callers resume; otherwise fsyncs are batched
+    to at most one per interval. Opening a journal replays it; once it has
+    grown ``compact_ratio`` times past its last compacted size it is
+    rewritten with only the live keys, reclaiming deleted pipelines.
+
+    A journal is owned by one process: it holds an exclusive ``flock`` on
+    ``<path>.lock`` while open, and opening a journal another one holds
+    raises :class:`FileOperationError`. The records of the journals in
+    ``adopt`` that nobody holds are merged into this one, which then
+    replaces them.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync_interval: float = 0.0,
+        compact_ratio: float = 4.0,
+        compact_min_bytes: int = 1 << 20,
+        adopt: Iterable[str] = (),
+        lock: Optional[IO[bytes]] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = lock or _try_lock(self.path)
+        if self._lock is None:
+            raise FileOperationError(f"checkpoint journal {self.path} is open in another process")
+        self.fsync_interval = fsync_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self._data: Dict[str, Any] = {}
+        self._cond = threading.Condition()
+        self._pending: List[_Pending] = []
+        self._closed = False
+        orphans = []
+        for other in map(Path, adopt):
+            other_lock = _try_lock(other)
+            if other_lock is not None:
+                orphans.append((other, other_lock))
+                self._replay(other)
+        # Own records are replayed last so they win over adopted ones.
+        self._replay(self.path)
+        self._file = open(self.path, "ab")
+        if orphans:
+            self._compact()
+            for other, other_lock in orphans:
+                other.unlink(missing_ok=True)
+                other_lock.close()
+        self._size = self._file.tell()
+        self._compact_at = max(compact_min_bytes, self._size * compact_ratio)
+        self._dirty = False
+        self._synced = time.monotonic()
+        JOURNAL_BYTES.set(self._size)
+        self._thread = threading.Thread(
+            target=self._writer, name="checkpoint-journal", daemon=True
+        )
+        self._thread.start()
+
+    def _replay(self, path: Path) -> None:
+        if not path.exists():
+            return
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final write from a crash; everything before it is intact.
+                    break
+                self._apply(record)
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        if record["op"] == "put":
+            self._data[record["k"]] = record["v"]
+        else:
+            self._data.pop(record["k"], None)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._cond:
+            return self._data.get(key)
+
+    def keys(self, prefix: str = "") -> List[str]:
+        with self._cond:
+            return [k for k in self._data if k.startswith(prefix)]
+
+    async def put(self, key: str, value: Any) -> None:
+        await self._append({"op": "put", "k": key, "v": value})
+
+    async def delete(self, key: str) -> None:
+        await self._append({"op": "del", "k": key})
+
+    async def _append(self, record: Dict[str, Any]) -> None:
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("checkpoint journal is closed")
+            self._apply(record)
+            self._pending.append((line, loop, fut))
+            self._cond.notify()
+        await fut
+
+    def _writer(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    timeout = None
+                    if self._dirty:
+                        timeout = max(0.0, self._synced + self.fsync_interval - time.monotonic())
+                        if timeout == 0.0:
+                            break
+                    self._cond.wait(timeout)
+                batch, self._pending = self._pending, []
+                closed = self._closed
+            error: Optional[OSError] = None
+            try:
+                if batch:
+                    self._file.write(b"".join(line for line, _, _ in batch))
+                    self._file.flush()
+                    self._size += sum(len(line) for line, _, _ in batch)
+                    self._dirty = True
+                    JOURNAL_BATCH.observe(len(batch))
+                    JOURNAL_BYTES.set(self._size)
+                if self._dirty and (
+                    closed or time.monotonic() - self._synced >= self.fsync_interval
+                ):
+                    os.fsync(self._file.fileno())
+                    JOURNAL_FSYNCS.inc()
+                    self._dirty = False
+                    self._synced = time.monotonic()
+            except OSError as exc:
+                error = exc
+            for _, loop, fut in batch:
+                try:
+                    loop.call_soon_threadsafe(_resolve, fut, error)
+                except RuntimeError:
+                    pass  # the caller's loop has closed
+            if error is None and self._size >= self._compact_at:
+                try:
+                    self._compact()
+                except OSError:
+                    # Keep appending to the old journal; retry after more growth.
+                    self._compact_at = self._size * self.compact_ratio
+            if closed and not batch:
+                self._file.close()
+                return
+
+    def _compact(self) -> None:
+        """Rewrite the journal as one ``put`` per live key."""
+        with self._cond:
+            snapshot = dict(self._data)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            for key, value in snapshot.items():
+                line = json.dumps({"op": "put", "k": key, "v": value}, separators=(",", ":"))
+                f.write(line.encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        try:
+            os.replace(tmp, self.path)
+        finally:
+            self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        self._compact_at = max(self.compact_min_bytes, self._size * self.compact_ratio)
+        self._dirty = False
+        JOURNAL_COMPACTIONS.inc()
+        JOURNAL_BYTES.set(self._size)
+
+    def compact(self) -> None:
+        """Compact on the next commit, regardless of size."""
+        with self._cond:
+            self._compact_at = 0
+            self._dirty = True
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._lock.close()
+
+
+def _resolve(fut: asyncio.Future, error: Optional[OSError]) -> None:
+    if fut.done():
+        return
+    if error is None:
+        fut.set_result(None)
+    else:
+        fut.set_exception(FileOperationError(f"checkpoint journal: {error}"))
+
+
+_journals: Dict[str, CheckpointJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def _slot_path(path: Path, slot: int) -> Path:
+    return path if slot == 0 else path.with_name(f"{path.stem}.{slot}{path.suffix}")
+
+
+def _open_slot(path: Path, fsync_interval: float) -> CheckpointJournal:
+    """Open the lowest slot of ``path`` no other process holds, adopting
+    the journals of every other slot left behind by a process that exited."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pattern = re.compile(rf"{re.escape(path.stem)}\.(\d+){re.escape(path.suffix)}")
+    slots = {0} | {
+        int(m.group(1)) for p in path.parent.iterdir() if (m := pattern.fullmatch(p.name))
+    }
+    slot = 0
+    while (lock := _try_lock(_slot_path(path, slot))) is None:
+        slot += 1
+    others = [str(_slot_path(path, s)) for s in sorted(slots - {slot})]
+    return CheckpointJournal(str(_slot_path(path, slot)), fsync_interval, adopt=others, lock=lock)
+
+
+def get_journal(path: str, fsync_interval: float = 0.0) -> CheckpointJournal:
+    """Return this process's journal for ``path``, opening it on first use.
+
+    Each process owns its journal: it takes ``path`` itself, or
+    ``<stem>.<n><suffix>`` for the lowest ``n`` no live process holds. A
+    restarted worker so reopens its predecessor's journal and resumes its
+    runs, and slots of processes that have since exited are merged in.
+    """
+    with _journals_lock:
+        journal = _journals.get(path)
+        if journal is None:
+            journal = _journals[path] = _open_slot(Path(path), fsync_interval)
+            atexit.register(journal.close)
+        journal.fsync_interval = fsync_interval
+        return journal
@@ -1,12 +1,14 @@
 import asyncio
 import json
+import time
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from typing import Any, TYPE_CHECKING
 from exceptions import FileOperationError
+from .journal import CheckpointJournal
 
 if TYPE_CHECKING:  # pragma: no cover
     from pipeline.stages import PipelineContext
@@ -21,11 +23,31 @@ class PipelineState:
 
 
 class PipelineStateManager:
-    def __init__(self, base_dir: str = "state") -> None:
+    """Persist pipeline states as ``base_dir/<id>.json`` files, or as records
+    in a :class:`CheckpointJournal` when one is given.
+
+    A journal-backed manager drops a pipeline's record once it is saved as
+    ``completed``: finished pipelines need no recovery, and compaction then
+    reclaims them.
+    """
+
+    def __init__(self, base_dir: str = "state", journal: Optional[CheckpointJournal] = None) -> None:
         self.base_dir = Path(base_dir)
-        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.journal = journal
+        if journal is None:
+            self.base_dir.mkdir(parents=True, exist_ok=True)
 
     async def save_state(self, pipeline_id: str, state: PipelineState) -> None:
+        if self.journal is not None:
+            key = f"state:{pipeline_id}"
+            if state.stage == "completed":
+                await self.journal.delete(key)
+            else:
+                await self.journal.put(
+                    key,
+                    {"stage": state.stage, "context": asdict(state.context), "saved": time.time()},
+                )
+            return
         path = self.base_dir / f"{pipeline_id}.json"
         data = json.dumps({"stage": state.stage, "context": asdict(state.context)})
         try:
@@ -34,6 +56,10 @@ class PipelineStateManager:
             raise FileOperationError(str(exc)) from exc
 
     async def load_state(self, pipeline_id: str) -> PipelineState:
+        if self.journal is not None:
+            from pipeline.stages import PipelineContext as PC
+            payload = self.journal.get(f"state:{pipeline_id}") or {}
+            return PipelineState(payload.get("stage", ""), PC(**payload.get("context", {})))
         path = self.base_dir / f"{pipeline_id}.json"
         if not path.exists():
             from pipeline.stages import PipelineContext as PC
@@ -48,9 +74,19 @@ class PipelineStateManager:
         return PipelineState(payload.get("stage", ""), ctx)
 
     async def list_recoverable_pipelines(self) -> List[str]:
+        if self.journal is not None:
+            return [k.split(":", 1)[1] for k in self.journal.keys("state:")]
         return [p.stem for p in self.base_dir.glob("*.json")]
 
     async def cleanup_old_states(self, max_age: timedelta) -> None:
+        if self.journal is not None:
+            cutoff = time.time() - max_age.total_seconds()
+            # "run:" records are node checkpoints of runs that never finished.
+            for key in self.journal.keys("state:") + self.journal.keys("run:"):
+                payload = self.journal.get(key)
+                if payload is not None and payload.get("saved", 0) <= cutoff:
+                    await self.journal.delete(key)
+            return
         now = datetime.utcnow()
         for p in self.base_dir.glob("*.json"):
             try:
@@ -0,0 +1,34 @@
+import os
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import pytest
+
+_state_dir = Path(tempfile.mkdtemp(prefix="pipeline-tests-"))
+
+
+def pytest_configure(config):
+    # api_app opens its task queue at import, before any fixture runs.
+    os.environ["PIPELINE_PIPELINE_TASK_QUEUE_PATH"] = str(_state_dir / "task_queue.db")
+    os.environ["PIPELINE_PIPELINE_CHECKPOINT_JOURNAL"] = str(_state_dir / "checkpoints.journal")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_state_dir, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path: Path, monkeypatch):
+    """Keep checkpoint journals of every pipeline under ``tmp_path``, also
+    for configs built in code rather than loaded from the environment."""
+    import pipeline
+    from storage.journal import get_journal
+
+    def tmp_journal(path: str, fsync_interval: float = 0.0):
+        return get_journal(str(tmp_path / "state" / Path(path).name), fsync_interval)
+
+    monkeypatch.setattr(pipeline, "get_journal", tmp_journal)
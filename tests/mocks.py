@@ -41,9 +41,13 @@ async def fake_openai_speech(
     class Speech:
         def __init__(self, data: bytes) -> None:
             self.data = data
+            self.closed = False
 
-        def stream_to_file(self, filename: str) -> None:
-            p = Path(filename); p.parent.mkdir(parents=True, exist_ok=True); p.write_bytes(self.data)
+        async def iter_bytes(self, chunk_size: int | None = None):
+            yield self.data
+
+        async def close(self) -> None:
+            self.closed = True
 
     return Speech(b"voice")
 
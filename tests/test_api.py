@@ -30,3 +30,86 @@ async def test_api_call_failure():
         raise ValueError("boom")
     with pytest.raises(APIError):
         await api_call_with_retry("fail", call, max_retries=1, timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_governor_bounds_in_flight():
+    from utils.provider_governor import ProviderGovernor
+
+    gov = ProviderGovernor("test", max_in_flight=2, rate=1000)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with gov:
+            peak = max(peak, gov.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call() for _ in range(10)))
+    assert peak == 2
+    assert gov.in_flight == 0 and gov.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_governor_token_bucket_rate():
+    from utils.provider_governor import ProviderGovernor
+
+    gov = ProviderGovernor("test", max_in_flight=10, rate=20, burst=1)
+    start = asyncio.get_event_loop().time()
+    for _ in range(4):
+        async with gov:
+            pass
+    assert asyncio.get_event_loop().time() - start >= 0.14
+
+
+@pytest.mark.asyncio
+async def test_governor_adapts_to_rate_limit_headers():
+    from utils.provider_governor import ProviderGovernor, rate_limit_delay
+
+    assert rate_limit_delay(200, {"x-ratelimit-remaining-requests": "0",
+                                  "x-ratelimit-reset-requests": "6m0s"}) == 360
+    assert rate_limit_delay(200, {"x-ratelimit-remaining-requests": "5",
+                                  "x-ratelimit-reset-requests": "1s"}) is None
+    assert rate_limit_delay(429, {"retry-after-ms": "20", "retry-after": "1"}) == 0.02
+
+    gov = ProviderGovernor("test", max_in_flight=8, rate=1000)
+    gov.observe(429, {"retry-after": "0.2"})
+    gov.observe(429, {})
+    assert gov.limit == 4  # one decrease per burst of rejections
+    start = asyncio.get_event_loop().time()
+    async with gov:
+        pass
+    assert asyncio.get_event_loop().time() - start >= 0.2
+    for _ in range(5):
+        gov.observe(200, {})
+    assert gov.limit == 5  # about one slot per window of successes
+    for _ in range(30):
+        gov.observe(200, {})
+    assert gov.limit == 8
+
+
+def test_get_governor_is_shared_and_configurable():
+    from config import Config
+    from utils.api_clients import get_governor
+
+    cfg = Config("sk", "sa", "rep", 60)
+    gov = get_governor("replicate", cfg)
+    assert get_governor("replicate", cfg) is gov
+    cfg.pipeline.replicate_max_concurrency = 7
+    assert get_governor("replicate", cfg).max_in_flight == 7
+
+
+@pytest.mark.asyncio
+async def test_api_clients_are_shared_per_credentials_and_timeout():
+    from optimization import connection_pool
+
+    chat = connection_pool.get_openai_client("sk-a", 60)
+    assert connection_pool.get_openai_client("sk-a", 60) is chat
+    assert connection_pool.get_openai_client("sk-a", 120) is not chat
+    assert connection_pool.get_openai_client("sk-b", 60) is not chat
+    rep = connection_pool.get_replicate_client("r-a", 60)
+    assert connection_pool.get_replicate_client("r-a", 60) is rep
+    assert connection_pool.pool_stats() == {"openai": 0, "replicate": 0}
+    await connection_pool.close_all()
+    assert connection_pool.get_openai_client("sk-a", 60) is not chat
+    await connection_pool.close_all()
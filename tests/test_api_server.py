@@ -9,16 +9,21 @@ from fastapi.testclient import TestClient
 
 from ai_video_pipeline import api_app
 
+enqueued = []
+
 
 @pytest.fixture(autouse=True)
 def patch_queue_and_auth(monkeypatch):
-    async def fake_enqueue(req):
+    jobs = {}
+
+    async def fake_enqueue(req, user, weight):
         job_id = "test_job"
-        api_app.queue._jobs[job_id] = api_app.JobStatus("completed")
+        enqueued.append((user, weight))
+        jobs[job_id] = api_app.JobStatus("completed")
         return job_id
 
     async def fake_status(job_id: str):
-        return api_app.queue._jobs[job_id]
+        return jobs[job_id]
 
     monkeypatch.setattr(api_app.queue, "enqueue_video_generation", fake_enqueue)
     monkeypatch.setattr(api_app.queue, "get_job_status", fake_status)
@@ -45,3 +50,148 @@ def test_generate_and_status(monkeypatch):
     job = resp.json()['job_id']
     status = client.get(f'/status/{job}', headers=headers)
     assert status.json()['status'] == 'completed'
+    assert enqueued == [("tester", 1.0)]  # queued under the caller's fair share
+
+
+class FakePipeline:
+    """Stands in for ContentPipeline; ``script`` says what each run does."""
+
+    script: list = []
+
+    def __init__(self, cfg, container, **kwargs) -> None:
+        pass
+
+    async def stream_multiple_videos(self, count):
+        action = FakePipeline.script.pop(0)
+        if isinstance(action, BaseException):
+            raise action
+        await action()
+        video = api_app.Path(self.out) / "raw.mp4"
+        video.write_bytes(b"v")
+        yield {"video": str(video)}
+
+
+@pytest.fixture
+def sqlite_queue(monkeypatch, tmp_path):
+    from config import Config
+
+    queue = api_app.SQLiteTaskQueue(
+        str(tmp_path / "queue.db"), api_app.GenerationRequest, retry_delay=0.01, max_attempts=2
+    )
+    FakePipeline.out = str(tmp_path)
+    monkeypatch.setattr(api_app, "queue", queue)
+    monkeypatch.setattr(api_app, "load_config", lambda: Config("sk", "sa", "rep", 60))
+    monkeypatch.setattr(api_app, "create_services", lambda cfg: None)
+    monkeypatch.setattr(api_app, "ContentPipeline", FakePipeline)
+    yield queue
+    queue.close()
+
+
+async def _run_until(queue, job_id, statuses):
+    manager = api_app.WorkerManager(queue, api_app._process_job)
+    await manager.start(1)
+    try:
+        for _ in range(200):
+            status = await queue.get_job_status(job_id)
+            if status.status in statuses and not await queue.depth():
+                return status
+            await asyncio.sleep(0.01)
+        raise AssertionError(status)
+    finally:
+        await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_provider_fault_is_retried_then_dead_lettered(sqlite_queue, tmp_path):
+    from exceptions import ReplicateError
+
+    req = api_app.GenerationRequest(video_count=1, output_dir=str(tmp_path / "out"))
+    FakePipeline.script = [ReplicateError("503 from kling"), lambda: asyncio.sleep(0)]
+    job_id = await sqlite_queue.enqueue_video_generation(req)
+    status = await _run_until(sqlite_queue, job_id, {"completed"})
+    assert status.progress == 100 and not FakePipeline.script
+
+    FakePipeline.script = [ReplicateError("503"), ReplicateError("503 again")]
+    job_id = await sqlite_queue.enqueue_video_generation(req)
+    status = await _run_until(sqlite_queue, job_id, {"failed"})
+    assert status.error.startswith("503 again") and "2 attempts" in status.error
+    assert [j for j, _ in await sqlite_queue.dead_letters()] == [job_id]
+
+    FakePipeline.script = [ValueError("bad prompt")]
+    job_id = await sqlite_queue.enqueue_video_generation(req)
+    status = await _run_until(sqlite_queue, job_id, {"failed"})
+    assert status.error == "bad prompt"  # not retried
+
+
+@pytest.mark.asyncio
+async def test_job_cancelled_while_running_stays_cancelled(sqlite_queue, tmp_path):
+    req = api_app.GenerationRequest(video_count=1, output_dir=str(tmp_path / "out"))
+    job_ids = []
+
+    async def cancel():
+        assert await sqlite_queue.cancel_job(job_ids[0])
+
+    FakePipeline.script = [cancel]
+    job_ids.append(await sqlite_queue.enqueue_video_generation(req))
+    status = await _run_until(sqlite_queue, job_ids[0], {"cancelled"})
+    await asyncio.sleep(0.05)
+    assert (await sqlite_queue.get_job_status(job_ids[0])).status == "cancelled"
+
+
+@pytest.mark.asyncio
+async def test_reclaimed_job_reattaches_to_its_provider_jobs(sqlite_queue, monkeypatch, tmp_path):
+    from pipeline import ContentPipeline
+    from services.container import Container
+    from utils.provider_jobs import record_job, recorded_job
+
+    started = asyncio.Event()
+    created = 0
+
+    class Idea:
+        async def generate(self):
+            return {"idea": "i", "prompt": "p"}
+
+    class Image:
+        async def generate(self, prompt):
+            return "image.png"
+
+    class Video:
+        async def generate(self, prompt, **kwargs):
+            nonlocal created
+            if recorded_job("kling") is None:
+                created += 1
+                await record_job("kling", "k1")
+                started.set()
+                await asyncio.Event().wait()  # still rendering when the worker dies
+            return "video.mp4"
+
+    class Music:
+        async def generate(self, prompt):
+            return "music.mp3"
+
+    def services(cfg):
+        container = Container()
+        for name, cls in [("idea", Idea), ("image", Image), ("video", Video), ("music", Music)]:
+            container.register_singleton(f"{name}_generator", cls)
+        return container
+
+    async def fake_merge(video, music, voice, out, duration):
+        final = tmp_path / "final.mp4"
+        final.write_bytes(b"v")
+        return str(final)
+
+    monkeypatch.setattr(api_app, "ContentPipeline", ContentPipeline)
+    monkeypatch.setattr(api_app, "create_services", services)
+    monkeypatch.setattr("pipeline.merge_video_audio", fake_merge)
+    sqlite_queue.visibility_timeout = 0.1
+    req = api_app.GenerationRequest(video_count=1, output_dir=str(tmp_path / "out"))
+    job_id = await sqlite_queue.enqueue_video_generation(req)
+
+    manager = api_app.WorkerManager(sqlite_queue, api_app._process_job)
+    await manager.start(1)
+    await asyncio.wait_for(started.wait(), 5)
+    await manager.stop()  # the worker is killed and its lease left to lapse
+
+    status = await _run_until(sqlite_queue, job_id, {"completed"})
+    assert status.progress == 100
+    assert created == 1
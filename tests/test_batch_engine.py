@@ -0,0 +1,97 @@
+import asyncio
+from pathlib import Path as _Path
+import sys
+sys.path.append(str(_Path(__file__).resolve().parents[1]))
+
+import pytest
+
+from config import Config
+from pipeline import ContentPipeline, PipelineContext, StagePipelinedBatchEngine
+from pipeline.stages import PipelineStage
+from services.container import Container
+
+
+class Stage(PipelineStage):
+    def __init__(self, name, requires=(), produces=(), delay=0.0, log=None, fail=False):
+        self.name = name
+        self.requires = frozenset(requires)
+        self.produces = frozenset(produces)
+        self.delay = delay
+        self.log = log if log is not None else []
+        self.fail = fail
+        self.active = 0
+        self.peak = 0
+
+    async def execute(self, ctx: PipelineContext) -> PipelineContext:
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.log.append(("start", self.name))
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        if self.fail:
+            raise RuntimeError(self.name)
+        for f in self.produces:
+            setattr(ctx, f, self.name)
+        self.log.append(("end", self.name))
+        return ctx
+
+
+def _graph(log, video_fail=False):
+    return [
+        Stage("idea", (), {"idea", "prompt"}, 0.01, log),
+        Stage("video", {"prompt"}, {"video_path"}, 0.05, log, fail=video_fail),
+        Stage("music", {"idea"}, {"music_path"}, 0.02, log),
+        Stage("compose", {"video_path", "music_path"}, {"output"}, 0.0, log),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_engine_overlaps_stages_across_videos() -> None:
+    log: list = []
+    stages = _graph(log)
+    engine = StagePipelinedBatchEngine(stages, {"video": 2})
+    results = await engine.run(4)
+    assert len(results) == 4 and all(r.output == "compose" for r in results)
+    # The second idea starts before the first video render has finished.
+    assert log.index(("start", "idea"), 1) < log.index(("end", "video"))
+    assert stages[1].peak == 2 and stages[0].peak == 1
+
+
+@pytest.mark.asyncio
+async def test_engine_raises_stage_failure() -> None:
+    engine = StagePipelinedBatchEngine(_graph([], video_fail=True), {})
+    with pytest.raises(RuntimeError, match="video"):
+        await engine.run(3)
+
+
+@pytest.mark.asyncio
+async def test_engine_pool_sizes_follow_provider_limits() -> None:
+    cfg = Config("sk", "sa", "rep", 60)
+    cfg.pipeline.replicate_max_concurrency = 6
+    stages = _graph([])
+    stages[1].provider = "replicate"
+    engine = StagePipelinedBatchEngine.from_config(stages, cfg.pipeline, local_workers=2)
+    assert engine.workers == {"idea": 2, "video": 6, "music": 2, "compose": 2}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_run_multiple_videos_pipelined(monkeypatch) -> None:
+    class Idea:
+        async def generate(self):
+            return {"idea": "i", "prompt": "p"}
+
+    class Media:
+        async def generate(self, prompt, **kwargs):
+            return "media"
+
+    async def fake_merge(*args, **kwargs):
+        return "final.mp4"
+
+    monkeypatch.setattr("pipeline.merge_video_audio", fake_merge)
+    container = Container()
+    container.register_singleton("idea_generator", Idea)
+    for name in ("image_generator", "video_generator", "music_generator"):
+        container.register_singleton(name, Media)
+    pipe = ContentPipeline(Config("sk", "sa", "rep", 60), container)
+    results = await pipe.run_multiple_videos_pipelined(3)
+    assert results == [{"idea": "i", "video": "final.mp4"}] * 3
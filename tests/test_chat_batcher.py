@@ -0,0 +1,53 @@
+import asyncio
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from config import Config
+from exceptions import OpenAIError
+from optimization import connection_pool
+from utils.api_clients import openai_chat
+from utils.chat_batcher import ChatBatcher
+from utils.load_testing.openai_batch_stub import OpenAIBatchStub
+
+
+@pytest.mark.asyncio
+async def test_batcher_fans_out_one_job_and_per_request_errors() -> None:
+    from openai import AsyncOpenAI
+
+    async with OpenAIBatchStub(batch_latency=0.1) as stub:
+        client = AsyncOpenAI(api_key="sk-local", base_url=stub.base_url)
+        batcher = ChatBatcher(client, window=0.05, poll_interval=0.05)
+        prompts = [f"idea {i}" for i in range(20)] + ["FAIL please"]
+        tasks = [asyncio.create_task(batcher.submit(p)) for p in prompts]
+        cancelled = asyncio.create_task(batcher.submit("leaving"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        await client.close()
+
+    assert len(stub.batches) == 1 and stub.chat_calls == 0
+    for prompt, result in zip(prompts[:-1], results):
+        assert result.choices[0].message.content.startswith(f"Idea: {prompt}")
+    assert isinstance(results[-1], OpenAIError)
+    assert cancelled.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_openai_chat_uses_batch_mode() -> None:
+    cfg = Config("sk-batch", "sa", "rep", 60)
+    cfg.pipeline.openai_batch_mode = True
+    cfg.pipeline.openai_batch_window = 0.05
+    cfg.pipeline.openai_batch_poll_interval = 0.05
+    async with OpenAIBatchStub() as stub:
+        connection_pool.get_openai_client(cfg.openai_api_key, cfg.api_timeout).base_url = stub.base_url
+        try:
+            first, second = await asyncio.gather(
+                openai_chat("question one", cfg), openai_chat("question two", cfg)
+            )
+        finally:
+            await connection_pool.close_all()
+    assert len(stub.batches) == 1 and stub.chat_calls == 0
+    assert "question two" in second.choices[0].message.content
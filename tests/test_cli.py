@@ -21,6 +21,10 @@ class DummyPipe:
             paths.append({"video": str(p)})
         return paths
 
+    async def stream_multiple_videos(self, count):
+        for item in await self.run_multiple_videos(count):
+            yield item
+
 
 def test_cli_generate(monkeypatch, tmp_path):
     monkeypatch.setenv('OPENAI_API_KEY', 'sk-testopenai1234567890abcd')
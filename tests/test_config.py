@@ -83,3 +83,12 @@ def test_hot_reload(monkeypatch, tmp_path):
     (cfg_dir / 'dev.json').write_text(json.dumps({'max_stored_ideas': 8}))
     cfg2 = reload_config()
     assert cfg1.pipeline.max_stored_ideas != cfg2.pipeline.max_stored_ideas
+
+
+@pytest.mark.parametrize("weight", [0, -1])
+def test_queue_weights_must_be_positive(weight):
+    with pytest.raises(ConfigError):
+        PipelineConfig(task_queue_user_weights={"acme": weight})
+    with pytest.raises(ConfigError):
+        PipelineConfig(task_queue_role_weights={"trial": weight})
+    assert PipelineConfig(task_queue_role_weights={"trial": 0.5}).task_queue_role_weights
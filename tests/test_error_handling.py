@@ -33,6 +33,73 @@ async def test_retry_async_failure():
         await retry_async("bad", bad, retries=1, timeout=0.1)
 
 
+@pytest.mark.asyncio
+async def test_retry_budget_fails_fast_when_spent():
+    from exceptions import RetryBudgetExhaustedError, get_budget
+
+    budget = get_budget("budget-test")
+    budget.tokens = 0
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        raise ValueError("down")
+
+    with pytest.raises(RetryBudgetExhaustedError):
+        await retry_async("op", flaky, retries=3, timeout=1, service="budget-test")
+    assert attempts == 1
+
+    for _ in range(10):
+        await retry_async("op", lambda: asyncio.sleep(0), service="budget-test")
+    assert budget.tokens == pytest.approx(1.0)
+    assert budget.try_spend() and not budget.try_spend()
+
+
+@pytest.mark.asyncio
+async def test_retry_async_clamped_to_deadline():
+    from exceptions import DeadlineExceededError
+    from utils.deadline import clamp_timeout, deadline
+
+    attempts = 0
+
+    async def hang():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(10)
+
+    start = asyncio.get_event_loop().time()
+    with pytest.raises(DeadlineExceededError):
+        async with deadline(0.1):
+            assert clamp_timeout(60) <= 0.1
+            await retry_async("op", hang, retries=3, timeout=60)
+    assert attempts == 1  # no backoff is started that would outlive the deadline
+    assert asyncio.get_event_loop().time() - start < 1
+    assert clamp_timeout(60) == 60
+
+
+@pytest.mark.asyncio
+async def test_openai_chat_surfaces_deadline(monkeypatch):
+    from types import SimpleNamespace
+
+    from config import Config
+    from exceptions import DeadlineExceededError
+    from utils import api_clients
+    from utils.deadline import deadline
+
+    async def unavailable(**kwargs):
+        raise ConnectionError("upstream reset")
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=unavailable)))
+    monkeypatch.setattr(api_clients, "get_openai_client", lambda *args: client)
+    cfg = Config("sk-deadline", "sa", "rep", 60)
+    # The retry's backoff would outlive the deadline, so retry_async gives up
+    # with DeadlineExceededError, which must not be reported as a provider fault.
+    with pytest.raises(DeadlineExceededError):
+        async with deadline(1):
+            await api_clients.openai_chat("idea", cfg)
+
+
 def test_circuit_breaker_open():
     breaker = CircuitBreaker(max_failures=1, reset_timeout=1)
 
@@ -45,6 +112,62 @@ def test_circuit_breaker_open():
         asyncio.run(breaker.call(lambda: asyncio.sleep(0)))
 
 
+@pytest.mark.asyncio
+async def test_circuit_breaker_rate_window_and_single_probe():
+    breaker = CircuitBreaker(
+        max_failures=2, reset_timeout=0.05, name="test", window_size=10, slow_call_duration=0.02
+    )
+
+    async def bad():
+        raise ValueError()
+
+    async def slow():
+        await asyncio.sleep(0.03)
+
+    for _ in range(3):
+        await breaker.call(lambda: asyncio.sleep(0))
+    with pytest.raises(ValueError):
+        await breaker.call(bad)
+    await breaker.call(slow)
+    assert breaker.state == "closed"  # two bad calls out of five
+    with pytest.raises(ValueError):
+        await breaker.call(bad)
+    assert breaker.state == "open"
+
+    await asyncio.sleep(0.06)
+    assert breaker.state == "half_open"
+    release = asyncio.Event()
+    probe = asyncio.create_task(breaker.call(release.wait))
+    await asyncio.sleep(0)
+    with pytest.raises(CircuitBreakerOpenError):
+        await breaker.call(lambda: asyncio.sleep(0))  # only one probe at a time
+    release.set()
+    await probe
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_timed_out_calls_open_the_breaker():
+    from exceptions import ServiceError
+    from utils.retry_logic import retry_async
+
+    breaker = CircuitBreaker(max_failures=2, reset_timeout=0.05, name="hang", window_size=5)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    for _ in range(2):
+        with pytest.raises(ServiceError):
+            await retry_async("hang", hang, retries=1, timeout=0.01, breaker=breaker)
+    assert breaker.state == "open" and breaker.failures == 2
+
+    # A probe that hangs too opens the breaker again.
+    await asyncio.sleep(0.06)
+    with pytest.raises(asyncio.TimeoutError):
+        await breaker.call(hang, timeout=0.01)
+    assert breaker.state == "open"
+
+
 def test_error_middleware_sanitizes():
     app = FastAPI()
     app.middleware("http")(error_middleware)
@@ -44,3 +44,45 @@ async def test_checksum_mismatch(tmp_path: Path, monkeypatch: pytest.MonkeyPatch
     file.write_bytes(b'changed')
     with pytest.raises(FileError):
         await file_operations.read_file(path)
+
+
+@pytest.mark.asyncio
+async def test_save_file_stream_hashes_chunks_as_written(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    import hashlib
+    from optimization.streaming_io import iter_response
+
+    monkeypatch.setattr(file_operations, "BASE_DIR", tmp_path)
+    monkeypatch.chdir(tmp_path)
+    chunks = [b'a' * 1000, b'b' * 1000, b'c' * 10]
+
+    class Content:
+        def __init__(self) -> None:
+            self.sizes = []
+
+        async def iter_chunked(self, size: int):
+            for chunk in chunks:
+                self.sizes.append(size)
+                yield chunk
+
+    class Resp:
+        content = Content()
+        released = False
+
+        def release(self) -> None:
+            self.released = True
+
+    resp = Resp()
+    await file_operations.save_file_stream('video/clip.mp4', iter_response(resp, 1000))
+    body = b''.join(chunks)
+    assert (tmp_path / 'video' / 'clip.mp4').read_bytes() == body
+    assert resp.released and resp.content.sizes == [1000] * 3
+    checks = json.loads((tmp_path / 'video' / '.checksums.json').read_text())
+    assert checks['clip.mp4'] == hashlib.sha256(body).hexdigest()
+
+    async def broken():
+        yield b'partial'
+        raise ConnectionError('reset')
+
+    with pytest.raises(FileError):
+        await file_operations.save_file_stream('video/broken.mp4', broken())
+    assert sorted(p.name for p in (tmp_path / 'video').iterdir()) == ['.checksums.json', 'clip.mp4']
@@ -34,3 +34,55 @@ async def test_generate_idea(monkeypatch, tmp_path: Path):
     result = await idea_generator.generate_idea(cfg)
     assert result["idea"] == "Test"
     assert result["prompt"] == "do it"
+
+
+def test_parse_ideas_handles_numbering_and_markdown():
+    content = (
+        "1. **Idea:** POV: A moon priest in Cornwall, 1325\n"
+        "**Prompt:** Point of view of your hands, 4K.\n\n"
+        "2. Idea: A hexer at dusk Prompt: Rune-etched hands, mist\n"
+        "3. Idea: missing prompt\n"
+    )
+    assert idea_generator.parse_ideas(content) == [
+        ("POV: A moon priest in Cornwall, 1325", "Point of view of your hands, 4K."),
+        ("A hexer at dusk", "Rune-etched hands, mist"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_generate_many_single_call_and_one_history_write(monkeypatch, tmp_path: Path):
+    cfg = Config("sk", "sa", "rep", 60)
+    cfg.pipeline.history_file = str(tmp_path / "hist.json")
+    calls = []
+    saves = []
+
+    async def fake_read(path: str) -> str:
+        return '["Old idea"]' if path == cfg.pipeline.history_file else "template"
+
+    async def fake_save(path: str, data: bytes) -> None:
+        saves.append(data)
+
+    class FakeResp:
+        def __init__(self, content: str) -> None:
+            msg = type("msg", (), {"content": content})()
+            self.choices = [type("choice", (), {"message": msg})()]
+
+    async def fake_chat(prompt: str, config: Config):
+        calls.append(prompt)
+        return FakeResp(
+            "Idea: Old idea Prompt: dup\n"
+            "Idea: First Prompt: one\nIdea: Second Prompt: two\nIdea: Third Prompt: three"
+        )
+
+    monkeypatch.setattr(idea_generator.file_operations, "read_file", fake_read)
+    monkeypatch.setattr(idea_generator.file_operations, "save_file", fake_save)
+    monkeypatch.setattr(idea_generator, "openai_chat", fake_chat)
+
+    svc = idea_generator.IdeaGeneratorService(cfg)
+    ideas = await svc.generate_many(3)
+    assert [i["idea"] for i in ideas] == ["First", "Second", "Third"]
+    assert len(calls) == 1 and "create 3 distinct ideas" in calls[0]
+    assert saves == [b'["Old idea", "First", "Second", "Third"]']
+    with pytest.raises(idea_generator.OpenAIError):
+        await svc.generate_many(5)
+    assert len(await svc.generate_many(5, strict=False)) == 3
@@ -0,0 +1,82 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from config import Config
+from infrastructure.load_balancer import LoadBalancer, configure_balancer
+from optimization import connection_pool
+from utils.api_clients import http_get, openai_chat
+from utils.load_testing.endpoint_stub import EndpointStub
+from utils.load_testing.openai_batch_stub import OpenAIBatchStub
+
+
+def test_failing_endpoint_is_ejected_then_readmitted():
+    balancer = LoadBalancer(["a", "b"], max_failures=2, eject_seconds=0.05)
+    bad, good = balancer.endpoints
+    for _ in range(2):
+        bad.in_flight += 1
+        balancer.release(bad, 0.01, False)
+    assert {balancer.select().url for _ in range(20)} == {"b"}
+
+    good.ejected_until = bad.ejected_until
+    assert balancer.select().url in {"a", "b"}  # all ejected: use them anyway
+
+    time.sleep(0.06)
+    assert {balancer.select().url for _ in range(50)} == {"a", "b"}
+
+
+def test_power_of_two_choices_weighs_latency_by_load():
+    balancer = LoadBalancer(["fast", "slow"])
+    fast, slow = balancer.endpoints
+    fast.latency, slow.latency = 0.01, 0.05
+    assert balancer.select() is fast
+    fast.in_flight = 5  # 0.06 expected wait against 0.05
+    assert balancer.select() is slow
+
+
+@pytest.mark.asyncio
+async def test_http_get_prefers_fast_endpoint():
+    cfg = Config("sk", "sa", "rep", 60)
+    cfg.pipeline.sonauto_requests_per_second = 1000
+    cfg.pipeline.sonauto_max_concurrency = 100
+    async with EndpointStub(0.1) as slow, EndpointStub(0.005) as fast:
+        cfg.pipeline.sonauto_endpoints = [slow.base_url, fast.base_url]
+        try:
+            for _ in range(6):
+                responses = await asyncio.gather(
+                    *(
+                        http_get("https://api.sonauto.ai/v1/generations/status/t1", cfg)
+                        for _ in range(10)
+                    )
+                )
+            body = await responses[0].json()
+        finally:
+            configure_balancer("sonauto", [])
+            await connection_pool.close_all()
+    assert body["path"] == "/v1/generations/status/t1"
+    assert slow.hits + fast.hits == 60
+    assert fast.hits > 3 * slow.hits
+
+
+@pytest.mark.asyncio
+async def test_openai_client_spreads_over_configured_endpoints():
+    cfg = Config("sk-balanced", "sa", "rep", 60)
+    cfg.pipeline.openai_requests_per_second = 1000
+    async with OpenAIBatchStub() as one, OpenAIBatchStub() as two:
+        cfg.pipeline.openai_endpoints = [
+            one.base_url.removesuffix("/v1"),
+            two.base_url.removesuffix("/v1"),
+        ]
+        try:
+            for i in range(10):
+                reply = await openai_chat(f"idea {i}", cfg)
+                assert reply.choices[0].message.content.startswith(f"Idea: idea {i}")
+        finally:
+            configure_balancer("openai", [])
+            await connection_pool.close_all()
+    assert one.chat_calls + two.chat_calls == 10
@@ -24,6 +24,10 @@ class DummyPipe:
             paths.append({"video": str(p)})
         return paths
 
+    async def stream_multiple_videos(self, count):
+        for item in await self.run_multiple_videos(count):
+            yield item
+
     async def run_music_only(self, prompt):
         return {"music": "done"}
 
@@ -9,7 +9,7 @@ from utils import media_processing
 
 @pytest.mark.asyncio
 async def test_merge_video_audio(monkeypatch):
-    async def fake_proc(cmd, stdout=None, stderr=None):
+    async def fake_proc(cmd, **kwargs):
         class P:
             returncode = 0
             async def communicate(self):
@@ -19,3 +19,72 @@ async def test_merge_video_audio(monkeypatch):
     monkeypatch.setattr(asyncio, "create_subprocess_shell", fake_proc)
     out = await media_processing.merge_video_audio("v.mp4", "m.mp3", None, "out.mp4", duration=1)
     assert out == "out.mp4"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_encode_kills_and_reaps_ffmpeg(tmp_path: Path):
+    pidfile = tmp_path / "pid"
+    # The sleep stands in for an ffmpeg running as a child of the shell.
+    cmd = f"sleep 30 & echo $! > {pidfile}; wait"
+    executor = media_processing.composition_executor
+    task = asyncio.create_task(executor.submit(media_processing._encode, cmd))
+    while not pidfile.exists() or not pidfile.read_text().strip():
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0.05)
+    pid = int(pidfile.read_text())
+    state = Path(f"/proc/{pid}/stat")
+    assert not state.exists() or state.read_text().split()[2] == "Z"
+    assert executor.running == 0
+
+
+def test_available_cpus_honours_cgroup_quota(monkeypatch, tmp_path: Path):
+    monkeypatch.setattr(media_processing.os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    assert media_processing.available_cpus(tmp_path) == 2
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert media_processing.available_cpus(tmp_path) == 8
+    (tmp_path / "cpu.max").unlink()
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("300000")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000")
+    assert media_processing.available_cpus(tmp_path) == 3
+
+
+@pytest.mark.asyncio
+async def test_composition_executor_queues_excess_encodes():
+    executor = media_processing.CompositionExecutor(workers=2)
+    running = peak = 0
+
+    async def encode(i: int) -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return i
+
+    results = await asyncio.gather(*(executor.submit(encode, i) for i in range(6)))
+    assert results == list(range(6))
+    assert peak == 2
+    assert executor.running == 0 and executor.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_composition_outputs_are_unique(monkeypatch):
+    from pipeline import Composition, PipelineContext
+
+    outputs = []
+
+    async def fake_merge(video, music, voice, out, duration):
+        outputs.append(out)
+        return out
+
+    monkeypatch.setattr("pipeline.merge_video_audio", fake_merge)
+    stage = Composition(5)
+    ctxs = [PipelineContext(video_path="video/v.mp4", music_path="m.mp3") for _ in range(3)]
+    await asyncio.gather(*(stage.execute(c) for c in ctxs))
+    assert len(set(outputs)) == 3
+    assert all(o.startswith("video") and o.endswith(".mp4") for o in outputs)
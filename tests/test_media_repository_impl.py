@@ -31,3 +31,61 @@ async def test_caching_repository() -> None:
     # second load uses cache
     data2 = [c async for c in repo.load_media("b.txt")][0]
     assert data2 == b"x"
+
+
+class FakeS3:
+    def __init__(self, fail_complete: bool = False) -> None:
+        self.fail_complete = fail_complete
+        self.parts: list = []
+        self.puts: list = []
+        self.completed = self.aborted = False
+
+    def put_object(self, Bucket, Key, Body):
+        self.puts.append(len(Body))
+
+    def create_multipart_upload(self, Bucket, Key):
+        return {"UploadId": "u1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.parts.append(len(Body))
+        return {"ETag": f"e{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        if self.fail_complete:
+            raise ValueError("upload rejected")
+        self.completed = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted = True
+
+
+async def _mib_chunks(count: int) -> AsyncIterator[bytes]:
+    for _ in range(count):
+        yield b"v" * (1 << 20)
+
+
+@pytest.mark.asyncio
+async def test_s3_saves_large_media_as_multipart_upload() -> None:
+    from repositories.implementations.s3_media_repository import PART_SIZE, S3MediaRepository
+    repo = S3MediaRepository("bucket")
+    repo._client = s3 = FakeS3()
+    await repo.save_media("small.png", _mib_chunks(2))
+    assert s3.puts == [2 << 20] and not s3.parts
+
+    await repo.save_media("video.mp4", _mib_chunks(20))
+    assert s3.parts == [PART_SIZE, PART_SIZE, 4 << 20] and s3.completed == [1, 2, 3]
+
+    repo._client = s3 = FakeS3(fail_complete=True)
+    with pytest.raises(ValueError):
+        await repo.save_media("video.mp4", _mib_chunks(20))
+    assert s3.aborted and not s3.completed
+
+
+@pytest.mark.asyncio
+async def test_caching_repository_streams_and_skips_large_items() -> None:
+    base = InMemoryMediaRepository()
+    repo = CachingMediaRepository(base, max_item_bytes=1 << 20)
+    await repo.save_media("big.mp4", _mib_chunks(3))
+    assert "big.mp4" not in repo._cache
+    assert len(b"".join([c async for c in repo.load_media("big.mp4")])) == 3 << 20
+    assert "big.mp4" not in repo._cache
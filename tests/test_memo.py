@@ -0,0 +1,114 @@
+from pathlib import Path
+import sys
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from pipeline import PipelineContext
+from pipeline.memo import MemoizedStage, StageMemo
+
+
+class RenderStage:
+    name = "render"
+    provider = None
+    requires = frozenset({"prompt", "image_path"})
+    produces = frozenset({"video_path"})
+
+    def __init__(self, out_dir: Path) -> None:
+        self.out_dir = out_dir
+        self.calls = 0
+
+    def memo_settings(self):
+        return {"model": "fake", "duration": 5}
+
+    async def validate_inputs(self, ctx: PipelineContext) -> bool:
+        return True
+
+    async def execute(self, ctx: PipelineContext) -> PipelineContext:
+        self.calls += 1
+        out = self.out_dir / f"video_{self.calls}.mp4"
+        out.write_bytes(ctx.prompt.encode() * 100)
+        ctx.video_path = str(out)
+        return ctx
+
+
+@pytest.mark.asyncio
+async def test_identical_inputs_reuse_stored_media(tmp_path: Path):
+    image = tmp_path / "img.png"
+    image.write_bytes(b"pixels")
+    inner = RenderStage(tmp_path)
+    stage = MemoizedStage(inner, StageMemo(str(tmp_path / "memo"), 1 << 20))
+
+    first = await stage.execute(PipelineContext(prompt="a", image_path=str(image)))
+    same = await stage.execute(PipelineContext(prompt="a", image_path=str(image)))
+    assert same.video_path == first.video_path  # still intact, reused in place
+    # Another run has since written its own media to the original path.
+    Path(first.video_path).write_bytes(b"someone else's render")
+    second = await stage.execute(PipelineContext(prompt="a", image_path=str(image)))
+    assert inner.calls == 1
+    assert second.video_path != first.video_path
+    assert Path(second.video_path).read_bytes() == b"a" * 100
+    assert Path(first.video_path).read_bytes() == b"someone else's render"
+
+    # A changed input file is a different key, as is a fresh index on disk.
+    image.write_bytes(b"other pixels")
+    await stage.execute(PipelineContext(prompt="a", image_path=str(image)))
+    assert inner.calls == 2
+    reloaded = MemoizedStage(inner, StageMemo(str(tmp_path / "memo"), 1 << 20))
+    await reloaded.execute(PipelineContext(prompt="a", image_path=str(image)))
+    assert inner.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_respects_byte_budget(tmp_path: Path):
+    inner = RenderStage(tmp_path)
+    memo = StageMemo(str(tmp_path / "memo"), 250)
+    stage = MemoizedStage(inner, memo)
+    for prompt in ("a", "b", "a", "c"):
+        await stage.execute(PipelineContext(prompt=prompt, image_path="img"))
+    assert inner.calls == 3
+    # "b" was least recently used when "c" pushed the memo over budget.
+    await stage.execute(PipelineContext(prompt="a", image_path="img"))
+    await stage.execute(PipelineContext(prompt="b", image_path="img"))
+    assert inner.calls == 4
+    assert sum(p.stat().st_size for p in memo.blobs.iterdir()) <= 250
+
+
+@pytest.mark.asyncio
+async def test_only_media_fields_are_fingerprinted(tmp_path: Path, monkeypatch):
+    from pipeline import memo as memo_module
+
+    inner = RenderStage(tmp_path)
+    stage = MemoizedStage(inner, StageMemo(str(tmp_path / "memo"), 1 << 20))
+    monkeypatch.chdir(tmp_path)
+    # A prompt that happens to name a file is text, not that file's content.
+    Path("sunset").write_text("v1")
+    await stage.execute(PipelineContext(prompt="sunset", image_path="img"))
+    Path("sunset").write_text("v2")
+    await stage.execute(PipelineContext(prompt="sunset", image_path="img"))
+    assert inner.calls == 1
+
+    hashed = []
+    monkeypatch.setattr(memo_module, "_file_sha256", lambda p: hashed.append(p) or "x")
+    memo_module._fingerprint("voice", {"filename": "sunset", "dialog": "sunset"})
+    memo_module._fingerprint("prompt", "sunset")
+    assert hashed == ["sunset"]
+
+
+@pytest.mark.asyncio
+async def test_lru_touches_are_batched(tmp_path: Path, monkeypatch):
+    inner = RenderStage(tmp_path)
+    memo = StageMemo(str(tmp_path / "memo"), 1 << 20)
+    stage = MemoizedStage(inner, memo)
+    await stage.execute(PipelineContext(prompt="a", image_path="img"))
+    save, saves = memo._save_index, []
+
+    def counted_save() -> None:
+        saves.append(1)
+        save()
+
+    monkeypatch.setattr(memo, "_save_index", counted_save)
+    for _ in range(10):
+        await stage.execute(PipelineContext(prompt="a", image_path="img"))
+    assert inner.calls == 1 and saves == []
+    memo.flush()
+    assert saves == [1]
@@ -60,3 +60,117 @@ async def test_memory_manager(tmp_path: _Path) -> None:
     MemoryManager.release_buffer(buf)
     buf2 = await MemoryManager.get_buffer(5)
     assert buf2 is buf
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_result_errors_and_survives_cancellation() -> None:
+    from utils.single_flight import SingleFlight
+
+    flight = SingleFlight("test")
+    calls = 0
+    release = asyncio.Event()
+
+    async def paid_call() -> str:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "result"
+
+    waiters = [asyncio.create_task(flight.do("k", paid_call)) for _ in range(4)]
+    await asyncio.sleep(0)
+    waiters[0].cancel()  # one caller leaving doesn't cancel the shared call
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*waiters[1:]) == ["result"] * 3
+    assert calls == 1 and flight.deduplicated == 3 and flight.in_flight() == 0
+
+    async def failing() -> str:
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        *(flight.do("bad", failing) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(r, ValueError) for r in results)
+
+    started = asyncio.Event()
+    cancelled = False
+
+    async def abandoned() -> str:
+        nonlocal cancelled
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return "never"
+
+    only = asyncio.create_task(flight.do("gone", abandoned))
+    await started.wait()
+    only.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await only
+    await asyncio.sleep(0)
+    assert cancelled and flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_across_requests_under_their_own_deadlines() -> None:
+    from exceptions import DeadlineExceededError
+    from utils.deadline import deadline, remaining
+    from utils.provider_jobs import JobRecorder, record_job, recording
+    from utils.single_flight import SingleFlight
+
+    flight = SingleFlight("contexts")
+    calls = 0
+    budgets = []
+    recorded = asyncio.Event()
+
+    async def paid_call() -> str:
+        nonlocal calls
+        calls += 1
+        budgets.append(remaining())
+        await record_job("replicate:model", f"p{calls}")
+        recorded.set()
+        await asyncio.sleep(0.2)
+        return "result"
+
+    async def request(seconds, recorder):
+        async with deadline(seconds):
+            with recording(recorder):
+                return await flight.do("k", paid_call)
+
+    short, long, late = (JobRecorder(f"video{i}", {}) for i in range(3))
+    first = asyncio.gather(
+        request(0.05, short), request(60, long), return_exceptions=True
+    )
+    await recorded.wait()
+    # A caller joining after the job was started gets it recorded too.
+    results = await asyncio.gather(first, request(60, late))
+    assert isinstance(results[0][0], DeadlineExceededError)
+    assert results[0][1] == results[1] == "result"
+    # The short deadline neither bounds the shared call nor cancels it.
+    assert calls == 1 and flight.deduplicated == 2 and budgets == [None]
+    assert [r.meta for r in (short, long, late)] == [
+        {f"provider_job:video{i}:replicate:model": "p1"} for i in range(3)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_api_cache_coalesces_concurrent_misses(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = APICache(ttl=60)
+    cfg = Config("k", "s", "r", 60)
+    calls = 0
+
+    async def slow_generate(self: ImageGeneratorService, prompt: str, **kw) -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return f"img_{prompt}"
+
+    monkeypatch.setattr(ImageGeneratorService, "generate", slow_generate)
+    results = await asyncio.gather(
+        *(cache.get_or_generate_image("a", cfg, InMemoryMediaRepository()) for _ in range(5))
+    )
+    assert results == ["img_a"] * 5
+    assert calls == 1 and cache.deduplicated == 4
@@ -123,3 +123,125 @@ async def test_response_cache() -> None:
     v2 = await cache.get_or_set("k", creator)
     assert v1 == v2
     assert cache.get("k") == "value"
+
+
+class FieldStage(PipelineStage):
+    def __init__(self, name: str, requires=(), produces=(), delay: float = 0.0) -> None:
+        self.name = name
+        self.requires = set(requires)
+        self.produces = set(produces)
+        self.delay = delay
+
+    async def execute(self, ctx: PipelineContext) -> PipelineContext:
+        await asyncio.sleep(self.delay)
+        for f in self.produces:
+            setattr(ctx, f, self.name)
+        return ctx
+
+
+@pytest.mark.asyncio
+async def test_dependencies_from_produced_fields() -> None:
+    stages = [
+        FieldStage("idea", produces={"idea", "prompt"}),
+        FieldStage("image", {"prompt"}, {"image_path"}),
+        FieldStage("video", {"prompt", "image_path"}, {"video_path"}),
+        FieldStage("music", {"idea"}, {"music_path"}),
+        FieldStage("compose", {"video_path", "music_path", "voice"}, {"output"}),
+    ]
+    groups = ParallelPipelineScheduler()._dependency_graph(stages)
+    assert [{s.name for s in g} for g in groups] == [
+        {"idea"}, {"image", "music"}, {"video"}, {"compose"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_branches_start_without_level_barrier() -> None:
+    stages = [
+        FieldStage("idea", produces={"idea", "prompt"}),
+        FieldStage("image", {"prompt"}, {"image_path"}, delay=0.05),
+        FieldStage("video", {"image_path"}, {"video_path"}, delay=0.05),
+        FieldStage("music", {"idea"}, {"music_path"}, delay=0.1),
+    ]
+    start = asyncio.get_event_loop().time()
+    ctx = await ParallelPipelineScheduler().execute_pipeline(stages, PipelineContext())
+    elapsed = asyncio.get_event_loop().time() - start
+    assert ctx.video_path == "video" and ctx.music_path == "music"
+    assert elapsed < 0.15
+
+
+@pytest.mark.asyncio
+async def test_resume_reruns_only_incomplete_branches(tmp_path: _Path) -> None:
+    from pipeline.state_manager import StateManager
+
+    runs: list = []
+
+    class Node(FieldStage):
+        def __init__(self, *a, fail: bool = False, **kw) -> None:
+            super().__init__(*a, **kw)
+            self.fail = fail
+
+        async def execute(self, ctx: PipelineContext) -> PipelineContext:
+            runs.append(self.name)
+            if self.fail:
+                raise RuntimeError(self.name)
+            return await super().execute(ctx)
+
+    def graph(fail: bool):
+        return [
+            Node("idea", produces={"idea"}),
+            Node("video", {"idea"}, {"video_path"}, delay=0.05),
+            Node("music", {"idea"}, {"music_path"}, fail=fail),
+            Node("voice", {"idea"}, {"voice"}, delay=0.02),
+            Node("compose", {"video_path", "music_path", "voice"}, {"output"}),
+        ]
+
+    state = StateManager(str(tmp_path / "run.json"))
+    with pytest.raises(parallel_mod.StageExecutionError):
+        await ParallelPipelineScheduler().execute_pipeline(
+            graph(True), PipelineContext(), state=state
+        )
+    assert set(await state.completed_nodes()) == {"idea", "video", "voice"}
+
+    runs.clear()
+    ctx = await ParallelPipelineScheduler().execute_pipeline(
+        graph(False), PipelineContext(), state=StateManager(str(tmp_path / "run.json"))
+    )
+    assert sorted(runs) == ["compose", "music"]
+    assert (ctx.video_path, ctx.voice, ctx.output) == ("video", "voice", "compose")
+
+
+@pytest.mark.asyncio
+async def test_deadline_cancels_running_stages_and_starts_no_more() -> None:
+    from exceptions import DeadlineExceededError
+    from utils.deadline import deadline, remaining
+
+    stages = [
+        FieldStage("idea", produces={"idea", "prompt"}),
+        FieldStage("image", {"prompt"}, {"image_path"}, delay=1.0),
+        FieldStage("video", {"image_path"}, {"video_path"}),
+    ]
+    start = asyncio.get_event_loop().time()
+    with pytest.raises(DeadlineExceededError):
+        async with deadline(0.05):
+            await ParallelPipelineScheduler().execute_pipeline(stages, PipelineContext())
+    assert asyncio.get_event_loop().time() - start < 0.5
+    assert remaining() is None
+
+
+@pytest.mark.asyncio
+async def test_cancelled_stage_lets_siblings_checkpoint(tmp_path: _Path) -> None:
+    from pipeline.state_manager import StateManager
+
+    class Cancelled(FieldStage):
+        async def execute(self, ctx: PipelineContext) -> PipelineContext:
+            raise asyncio.CancelledError()
+
+    stages = [
+        FieldStage("idea", produces={"idea"}),
+        Cancelled("music", {"idea"}, {"music_path"}),
+        FieldStage("video", {"idea"}, {"video_path"}, delay=0.05),
+    ]
+    state = StateManager(str(tmp_path / "run.json"))
+    with pytest.raises(asyncio.CancelledError):
+        await ParallelPipelineScheduler().execute_pipeline(stages, PipelineContext(), state=state)
+    assert set(await state.completed_nodes()) == {"idea", "video"}
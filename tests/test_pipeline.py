@@ -88,3 +88,137 @@ async def test_pipeline_run_multiple(monkeypatch):
     assert len(result) == 2
     assert all(r["video"] == "final.mp4" for r in result)
 
+
+
+@pytest.mark.asyncio
+async def test_pipeline_overlaps_audio_with_video(monkeypatch):
+    class SlowVideo(DummyVideo):
+        async def generate(self, prompt: str, **kwargs) -> str:
+            await asyncio.sleep(0.2)
+            return "video.mp4"
+
+    class SlowMusic(DummyMusic):
+        async def generate(self, prompt: str) -> str:
+            await asyncio.sleep(0.2)
+            return "music.mp3"
+
+    cfg = Config("sk", "sa", "rep", 60)
+    container = Container()
+    container.register_singleton("idea_generator", lambda: DummyIdea())
+    container.register_singleton("image_generator", lambda: DummyImage())
+    container.register_singleton("video_generator", lambda: SlowVideo())
+    container.register_singleton("music_generator", lambda: SlowMusic())
+    container.register_singleton("voice_generator", lambda: DummyVoice())
+    merged = {}
+
+    async def fake_merge(video, music, voice, out, duration):
+        merged.update(video=video, music=music, voice=voice)
+        return "final.mp4"
+
+    monkeypatch.setattr("pipeline.merge_video_audio", fake_merge)
+    pipe = ContentPipeline(cfg, container)
+    start = asyncio.get_event_loop().time()
+    await pipe.run_single_video()
+    assert asyncio.get_event_loop().time() - start < 0.35
+    assert merged == {"video": "video.mp4", "music": "music.mp3", "voice": "voice.mp3"}
+
+
+@pytest.mark.asyncio
+async def test_dag_scheduler_resumes_completed_stages(tmp_path):
+    from pipeline import (
+        DAGPipelineScheduler,
+        IdeaGeneration,
+        ImageGeneration,
+        MusicGeneration,
+        PipelineContext,
+        ProgressTracker,
+        StateManager,
+    )
+
+    class FailingIdea:
+        async def generate(self):
+            raise AssertionError("idea should not rerun")
+
+    state = StateManager(str(tmp_path / "state.json"))
+    await state.save(
+        "idea_generation",
+        PipelineContext(idea="i", prompt="p"),
+        {"idea": "i", "prompt": "p"},
+    )
+    stages = [
+        IdeaGeneration(FailingIdea()),
+        ImageGeneration(DummyImage()),
+        MusicGeneration(DummyMusic()),
+    ]
+    ctx = await DAGPipelineScheduler().run_pipeline(stages, state, ProgressTracker())
+    assert (ctx.idea, ctx.image_path, ctx.music_path) == ("i", "image.png", "music.mp3")
+    assert not (tmp_path / "state.json").exists()
+
+
+@pytest.mark.asyncio
+async def test_stream_multiple_videos_yields_as_completed(monkeypatch):
+    cfg = Config("sk", "sa", "rep", 60)
+    container = Container()
+    container.register_singleton("idea_generator", lambda: DummyIdea())
+    container.register_singleton("image_generator", lambda: DummyImage())
+    container.register_singleton("video_generator", lambda: DummyVideo())
+    container.register_singleton("music_generator", lambda: DummyMusic())
+    in_flight = peak = 0
+    delays = iter([0.2, 0.01, 0.01, 0.01])
+
+    async def fake_merge(video, music, voice, out, duration):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        delay = next(delays)
+        await asyncio.sleep(delay)
+        in_flight -= 1
+        return f"final_{delay}.mp4"
+
+    monkeypatch.setattr("pipeline.merge_video_audio", fake_merge)
+    pipe = ContentPipeline(cfg, container)
+    results = [r async for r in pipe.stream_multiple_videos(4, concurrency=2)]
+    assert [r["video"] for r in results][-1] == "final_0.2.mp4"
+    assert len(results) == 4 and peak == 2
+
+
+@pytest.mark.asyncio
+async def test_resumed_batch_seeds_only_items_without_checkpoints(monkeypatch):
+    from pipeline import PipelineContext
+    from pipeline.state_manager import JournalStateManager
+
+    class BatchIdea(DummyIdea):
+        requested = []
+
+        async def generate_many(self, n: int, strict: bool = True):
+            self.requested.append(n)
+            return [{"idea": f"seed{i}", "prompt": "p"} for i in range(n)]
+
+    cfg = Config("sk", "sa", "rep", 60)
+    container = Container()
+    container.register_singleton("idea_generator", lambda: BatchIdea())
+    container.register_singleton("image_generator", lambda: DummyImage())
+    container.register_singleton("video_generator", lambda: DummyVideo())
+    container.register_singleton("music_generator", lambda: DummyMusic())
+
+    async def fake_merge(video, music, voice, out, duration):
+        return "final.mp4"
+
+    monkeypatch.setattr("pipeline.merge_video_audio", fake_merge)
+    pipe = ContentPipeline(cfg, container, pipeline_id="job")
+    for index in (0, 2):
+        await JournalStateManager(f"job:{index}", pipe.journal).save(
+            "idea_generation",
+            PipelineContext(idea=f"kept{index}", prompt="p"),
+            {"idea": f"kept{index}", "prompt": "p"},
+        )
+    results = await pipe.run_multiple_videos(4)
+    assert BatchIdea.requested == [2]
+    assert [r["idea"] for r in results] == ["kept0", "seed0", "kept2", "seed1"]
+
+    for index in (0, 1):
+        await JournalStateManager(f"job:{index}", pipe.journal).save(
+            "idea_generation", PipelineContext(idea="i", prompt="p"), {"idea": "i", "prompt": "p"}
+        )
+    await pipe.run_multiple_videos(2)
+    assert BatchIdea.requested == [2]  # nothing left to seed
@@ -0,0 +1,44 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from utils import file_operations
+from utils.prompt_templates import PromptRegistry
+
+
+@pytest.mark.asyncio
+async def test_registry_reads_once_and_reloads_on_change(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(file_operations, "BASE_DIR", tmp_path)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "prompts").mkdir()
+    template = tmp_path / "prompts" / "t.txt"
+    template.write_text("Question for $idea: $missing")
+
+    reads = []
+    real_read = file_operations.read_file
+
+    async def counting_read(path: str) -> str:
+        reads.append(path)
+        return await real_read(path)
+
+    monkeypatch.setattr(file_operations, "read_file", counting_read)
+    registry = PromptRegistry(check_interval=0)
+    for _ in range(5):
+        assert await registry.render("prompts/t.txt", idea="bats") == "Question for bats: $missing"
+    assert len(reads) == 1
+
+    template.write_text("Changed template")
+    assert await registry.get("prompts/t.txt") == "Changed template"
+    assert len(reads) == 2
+
+    # A template that is not on disk is read every time rather than cached.
+    async def fake_read(path: str) -> str:
+        reads.append(path)
+        return "fake"
+
+    monkeypatch.setattr(file_operations, "read_file", fake_read)
+    assert await registry.get("prompts/absent.txt") == "fake"
+    assert await registry.get("prompts/absent.txt") == "fake"
+    assert len(reads) == 4
@@ -0,0 +1,160 @@
+import asyncio
+from pathlib import Path
+import sys
+import types
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from config import Config
+from exceptions import ReplicateError
+from utils import api_clients
+from utils.replicate_poller import PredictionPoller
+
+
+class FakePredictions:
+    """Predictions that finish after ``checks`` status requests each."""
+
+    def __init__(self, checks: int) -> None:
+        self.checks = checks
+        self.seen: dict = {}
+        self.created = 0
+        self.gets = 0
+        self.lists = 0
+
+    def _current(self, pid: str):
+        done = self.seen[pid] >= self.checks
+        return types.SimpleNamespace(
+            id=pid,
+            status="succeeded" if done else "processing",
+            output=f"out-{pid}" if done else None,
+            error=None,
+        )
+
+    async def async_create(self, **kwargs):
+        self.created += 1
+        pid = f"p{self.created}"
+        self.seen[pid] = 0
+        return self._current(pid)
+
+    async def async_get(self, pid: str):
+        self.gets += 1
+        self.seen[pid] += 1
+        return self._current(pid)
+
+    async def async_list(self):
+        self.lists += 1
+        for pid in self.seen:
+            self.seen[pid] += 1
+        return types.SimpleNamespace(results=[self._current(p) for p in self.seen])
+
+
+class FakeClient:
+    def __init__(self, checks: int) -> None:
+        self.predictions = FakePredictions(checks)
+        self.models = types.SimpleNamespace(predictions=self.predictions)
+
+
+@pytest.mark.asyncio
+async def test_poller_batches_status_checks_and_learns_latency():
+    client = FakeClient(checks=3)
+    poller = PredictionPoller(min_interval=0.01, default_latency=0.02)
+    created = [await client.predictions.async_create() for _ in range(20)]
+    done = await asyncio.gather(*(poller.wait(client, p, "kling") for p in created))
+    assert [p.output for p in done] == [f"out-p{i}" for i in range(1, 21)]
+    assert client.predictions.lists >= 1
+    # One list request stands in for twenty individual status requests.
+    assert client.predictions.gets + client.predictions.lists < 20 * 3
+    assert poller.outstanding == 0
+    assert poller.expected_latency("kling") != 0.02
+
+
+@pytest.mark.asyncio
+async def test_replicate_run_timeout_does_not_resubmit(monkeypatch):
+    client = FakeClient(checks=10**6)
+    cfg = Config("sk", "sa", "rep", 60)
+    cfg.api_timeout = 0.2
+    cfg.pipeline.replicate_requests_per_second = 1000  # polls share the budget
+    monkeypatch.setattr(api_clients, "get_replicate_client", lambda *a: client)
+    monkeypatch.setattr(
+        api_clients, "get_poller", lambda: PredictionPoller(min_interval=0.01, default_latency=0.02)
+    )
+    with pytest.raises(ReplicateError, match="did not finish"):
+        await api_clients.replicate_run("owner/model", {"prompt": "x"}, cfg)
+    assert client.predictions.created == 1
+
+    client.predictions.checks = 2
+    monkeypatch.setattr(api_clients, "transform_output", lambda out, c: out)
+    assert await api_clients.replicate_run("owner/model", {"prompt": "x"}, cfg) == "out-p2"
+    assert client.predictions.created == 2
+
+
+@pytest.mark.asyncio
+async def test_resumed_stage_reattaches_to_recorded_prediction(monkeypatch, tmp_path):
+    from pipeline.state_manager import StateManager
+    from utils.provider_jobs import JobRecorder, recording
+
+    client = FakeClient(checks=10**6)
+    cfg = Config("sk", "sa", "rep", 60)
+    cfg.api_timeout = 0.1
+    cfg.pipeline.replicate_requests_per_second = 1000  # polls share the budget
+    monkeypatch.setattr(api_clients, "get_replicate_client", lambda *a: client)
+    monkeypatch.setattr(
+        api_clients, "get_poller", lambda: PredictionPoller(min_interval=0.01, default_latency=0.02)
+    )
+    monkeypatch.setattr(api_clients, "transform_output", lambda out, c: out)
+    path = str(tmp_path / "run.json")
+
+    # The worker dies while the prediction is still rendering.
+    state = StateManager(path)
+    with recording(JobRecorder("video_generation", {}, state.record_job)):
+        with pytest.raises(ReplicateError):
+            await api_clients.replicate_run("owner/model", {"prompt": "x"}, cfg)
+    assert client.predictions.created == 1
+
+    client.predictions.checks = 2
+    resumed = StateManager(path)
+    meta = await resumed.provider_jobs()
+    assert list(meta.values()) == ["p1"]
+    with recording(JobRecorder("video_generation", meta, resumed.record_job)):
+        assert await api_clients.replicate_run("owner/model", {"prompt": "x"}, cfg) == "out-p1"
+    assert client.predictions.created == 1
+
+
+@pytest.mark.asyncio
+async def test_waiters_on_one_prediction_share_its_entry():
+    client = FakeClient(checks=3)
+    poller = PredictionPoller(min_interval=0.01, default_latency=0.02)
+    prediction = await client.predictions.async_create()
+    first, second, leaving = (
+        asyncio.create_task(poller.wait(client, prediction, "kling")) for _ in range(3)
+    )
+    await asyncio.sleep(0)
+    assert poller.outstanding == 1
+    leaving.cancel()  # one waiter giving up doesn't stop the others' polling
+    done = await asyncio.wait_for(asyncio.gather(first, second), 2)
+    assert [p.output for p in done] == ["out-p1"] * 2
+    assert poller.outstanding == 0
+
+
+@pytest.mark.asyncio
+async def test_status_polls_are_held_against_the_governor():
+    from utils.provider_governor import ProviderGovernor
+
+    client = FakeClient(checks=3)
+    governor = ProviderGovernor("replicate-polls", max_in_flight=1, rate=1000)
+    peak = 0
+    get = client.predictions.async_get
+
+    async def counted_get(pid: str):
+        nonlocal peak
+        peak = max(peak, governor._in_flight)
+        await asyncio.sleep(0.005)
+        return await get(pid)
+
+    client.predictions.async_get = counted_get
+    poller = PredictionPoller(min_interval=0.01, default_latency=0.02)
+    created = [await client.predictions.async_create() for _ in range(5)]
+    client.predictions.async_list = None  # force individual status requests
+    done = await asyncio.gather(*(poller.wait(client, p, "kling", governor) for p in created))
+    assert all(p.status == "succeeded" for p in done)
+    assert peak == 1  # every poll waited for the single slot
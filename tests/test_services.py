@@ -41,15 +41,6 @@ def patch_clients(monkeypatch: pytest.MonkeyPatch) -> None:
 
 @pytest_asyncio.fixture(autouse=True)
 async def patch_files(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
-    async def fake_speech(text: str, voice: str, instructions: str, config: Config):
-        class S:
-            def stream_to_file(self, filename: str) -> None:
-                f = tmp_path / filename
-                f.parent.mkdir(parents=True, exist_ok=True)
-                f.write_bytes(b"v")
-
-        return S()
-    monkeypatch.setattr(voice_module, "openai_speech", fake_speech)
     async def empty_stream():
         if False:
             yield b""
@@ -86,11 +77,48 @@ def test_generate_music(cfg: Config) -> None:
     assert result.startswith("music/")
 
 
+def test_generate_music_reattaches_to_recorded_task(
+    cfg: Config, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from utils.provider_jobs import JobRecorder, recording
+
+    monkeypatch.setattr(music_module, "http_post", mocks.fake_http_post_error)
+    meta = {"provider_job:music_generation:sonauto": "123"}
+
+    async def resume() -> str:
+        with recording(JobRecorder("music_generation", meta)):
+            return await MusicGeneratorService(cfg, InMemoryMediaRepository()).generate("idea")
+
+    assert asyncio.run(resume()).startswith("music/")
+
+
 def test_generate_voice(cfg: Config) -> None:
     repo = InMemoryMediaRepository()
     svc = VoiceGeneratorService(cfg, repo)
     result = asyncio.run(svc.generate("idea"))
     assert result["filename"].startswith("voice/")
+    # The clip streams straight into the repository without touching disk.
+    assert repo._store[result["filename"]] == b"voice"
+    assert not Path("voice").exists()
+
+
+def test_generate_voice_closes_speech_when_save_fails(
+    cfg: Config, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    opened = []
+
+    async def speech(*args):
+        opened.append(await mocks.fake_openai_speech(*args))
+        return opened[-1]
+
+    class FullRepo(InMemoryMediaRepository):
+        async def save_media(self, path, data):
+            raise OSError("disk full")  # before reading a single chunk
+
+    monkeypatch.setattr(voice_module, "openai_speech", speech)
+    with pytest.raises(OSError):
+        asyncio.run(VoiceGeneratorService(cfg, FullRepo()).generate("idea"))
+    assert opened[0].closed
 
 
 def test_generate_voice_invalid(cfg: Config) -> None:
@@ -0,0 +1,97 @@
+import asyncio
+from pathlib import Path
+import sys
+import time
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from exceptions import NetworkError, SonautoError
+from utils.sonauto_poller import SonautoPoller
+
+
+def test_checks_cluster_around_observed_completion_times():
+    poller = SonautoPoller(fallback_interval=5.0)
+    assert poller.next_delay(0.0) == 5.0
+    for seconds in [40, 42, 44, 45, 46, 48, 50, 55, 60, 90]:
+        poller.observe(seconds)
+    first = poller.next_delay(0.0)
+    assert first >= 40
+    # Near the typical finish consecutive checks are close together.
+    assert poller.next_delay(45.0) <= 3.0
+    # Past every observed completion, keep checking at a quarter of the median.
+    assert poller.next_delay(120.0) == pytest.approx(46 / 4)
+
+
+@pytest.mark.asyncio
+async def test_poller_multiplexes_tasks_under_a_rate_cap():
+    poller = SonautoPoller(rate=50.0, fallback_interval=0.01, min_gap=0.0)
+    calls: dict = {}
+
+    def status(task_id: str, finish_after: int):
+        async def check() -> str:
+            calls[task_id] = calls.get(task_id, 0) + 1
+            return "SUCCESS" if calls[task_id] >= finish_after else "PROCESSING"
+        return check
+
+    start = time.monotonic()
+    # Two waiters on task "t0" share its checks.
+    await asyncio.gather(
+        poller.wait("t0", status("t0", 2)),
+        poller.wait("t0", status("t0", 2)),
+        *(poller.wait(f"t{i}", status(f"t{i}", 2)) for i in range(1, 10)),
+    )
+    elapsed = time.monotonic() - start
+    assert calls == {f"t{i}": 2 for i in range(10)}
+    # 20 checks at 50/s with a one-token bucket take at least 19 / 50 s.
+    assert elapsed >= 19 / 50 * 0.9
+    assert poller.outstanding == 0
+
+
+@pytest.mark.asyncio
+async def test_poller_reports_failure_and_timeout():
+    poller = SonautoPoller(rate=100.0, fallback_interval=0.01, max_wait=0.05)
+
+    async def failed() -> str:
+        return "FAILURE"
+
+    async def running() -> str:
+        return "PROCESSING"
+
+    with pytest.raises(SonautoError):
+        await poller.wait("bad", failed)
+    with pytest.raises(NetworkError):
+        await poller.wait("slow", running)
+
+
+@pytest.mark.asyncio
+async def test_in_flight_checks_are_kept_and_cancelled_with_the_poller():
+    import gc
+
+    poller = SonautoPoller(rate=100.0, fallback_interval=0.01)
+    checking, release = asyncio.Event(), asyncio.Event()
+    cancelled = False
+
+    async def check() -> str:
+        nonlocal cancelled
+        checking.set()
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return "SUCCESS"
+
+    waiter = asyncio.create_task(poller.wait("t", check))
+    await checking.wait()
+    gc.collect()  # a check held only by the loop's weak references would go here
+    release.set()
+    await asyncio.wait_for(waiter, 1)
+    assert not poller._checks
+
+    release.clear()
+    checking.clear()
+    waiter = asyncio.create_task(poller.wait("t", check))
+    await checking.wait()
+    waiter.cancel()  # the last waiter leaving stops the poller
+    await asyncio.sleep(0.05)
+    assert cancelled and not poller._checks
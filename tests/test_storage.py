@@ -53,3 +53,83 @@ async def test_backup_and_recovery(tmp_path: Path) -> None:
     assert restored == "x"
     await bm.cleanup_backups()
     assert not any((tmp_path / "bkp").glob("*.zip"))
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_journal_group_commit_replay_and_compaction(tmp_path: Path) -> None:
+    from storage.journal import CheckpointJournal
+
+    path = tmp_path / "ckpt.journal"
+    journal = CheckpointJournal(str(path), compact_min_bytes=1 << 30)
+    await asyncio.gather(*(journal.put(f"run:{i}", {"stage": "s", "n": i}) for i in range(50)))
+    await asyncio.gather(*(journal.delete(f"run:{i}") for i in range(40)))
+    journal.close()
+    assert len(path.read_text().splitlines()) == 90
+
+    # A torn trailing record is ignored on replay.
+    with open(path, "a") as f:
+        f.write('{"op": "put", "k": "run:x"')
+    replayed = CheckpointJournal(str(path))
+    assert sorted(replayed.keys("run:")) == sorted(f"run:{i}" for i in range(40, 50))
+    assert replayed.get("run:45") == {"stage": "s", "n": 45}
+    replayed.compact()
+    await replayed.put("run:50", {"stage": "s", "n": 50})
+    replayed.close()
+    assert len(path.read_text().splitlines()) == 11
+
+
+@pytest.mark.asyncio
+async def test_journal_backed_state_managers(tmp_path: Path) -> None:
+    from storage.journal import CheckpointJournal
+    from pipeline.state_manager import JournalStateManager
+
+    journal = CheckpointJournal(str(tmp_path / "ckpt.journal"))
+    run = JournalStateManager("p1", journal)
+    await run.save("idea", PipelineContext(idea="x"), {"idea": "x"})
+    assert await JournalStateManager("p1", journal).completed_nodes() == {"idea": {"idea": "x"}}
+    stage, ctx = await JournalStateManager("p1", journal).load()
+    assert (stage, ctx.idea) == ("idea", "x")
+    await run.clear()
+    assert journal.get("run:p1") is None
+
+    mgr = PipelineStateManager(base_dir=tmp_path / "unused", journal=journal)
+    await mgr.save_state("p2", PipelineState("image", PipelineContext(prompt="p")))
+    assert (await mgr.load_state("p2")).context.prompt == "p"
+    assert await mgr.list_recoverable_pipelines() == ["p2"]
+    await mgr.save_state("p2", PipelineState("completed", PipelineContext()))
+    assert await mgr.list_recoverable_pipelines() == []
+    assert not (tmp_path / "unused").exists()
+    journal.close()
+
+
+@pytest.mark.asyncio
+async def test_each_process_owns_a_journal_slot(tmp_path: Path) -> None:
+    from exceptions import FileOperationError
+    from storage.journal import CheckpointJournal, _open_slot
+    from pipeline.state_manager import JournalStateManager
+
+    path = tmp_path / "ckpt.journal"
+    first = _open_slot(path, 0.0)
+    second = _open_slot(path, 0.0)
+    assert (first.path.name, second.path.name) == ("ckpt.journal", "ckpt.1.journal")
+    with pytest.raises(FileOperationError):
+        CheckpointJournal(str(path))
+    await first.put("run:a", {"stage": "idea"})
+    await second.put("run:b", {"stage": "image"})
+
+    # A restart takes the free slot back but leaves a live process's slot alone.
+    first.close()
+    restarted = _open_slot(path, 0.0)
+    assert restarted.keys("run:") == ["run:a"]
+    restarted.close()
+    # Once that process is gone its runs are adopted too.
+    second.close()
+    merged = _open_slot(path, 0.0)
+    assert sorted(merged.keys("run:")) == ["run:a", "run:b"]
+    assert not (tmp_path / "ckpt.1.journal").exists()
+
+    await JournalStateManager("c", merged).save("idea", PipelineContext(idea="x"), {})
+    mgr = PipelineStateManager(base_dir=tmp_path / "unused", journal=merged)
+    await mgr.cleanup_old_states(timedelta(seconds=0))
+    assert merged.keys("run:") == []
+    merged.close()
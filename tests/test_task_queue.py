@@ -1,12 +1,14 @@
+import asyncio
 import sys
 from pathlib import Path
 import pytest
 import pytest_asyncio
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from infrastructure.task_queue import TaskQueue
+from infrastructure.fair_share import user_weight
+from infrastructure.task_queue import SQLiteTaskQueue, TaskQueue
 
 
 class DummyRequest(BaseModel):
@@ -23,3 +25,134 @@ async def test_enqueue_status_cancel():
     assert cancelled
     status = await queue.get_job_status(job_id)
     assert status.status == "cancelled"
+
+
+class TimedRequest(BaseModel):
+    value: int = 0
+    _submitted_at: float = PrivateAttr(default=0.0)
+
+
+@pytest.mark.asyncio
+async def test_sqlite_queue_survives_restart(tmp_path):
+    path = str(tmp_path / "queue.db")
+    queue = SQLiteTaskQueue(path, TimedRequest)
+    request = TimedRequest(value=7)
+    request._submitted_at = 123.0
+    job_id = await queue.enqueue_video_generation(request)
+    other = await queue.enqueue_video_generation(TimedRequest())
+    assert await queue.cancel_job(other)
+    queue.close()
+
+    restarted = SQLiteTaskQueue(path, TimedRequest)
+    assert (await restarted.get_job_status(job_id)).status == "queued"
+    assert await restarted.depth() == 1
+    claimed_id, claimed = await restarted.get_task()
+    assert claimed_id == job_id
+    assert (claimed.value, claimed._submitted_at) == (7, 123.0)
+    await restarted.update_job(job_id, status="running", progress=50, result={"videos": ["a"]})
+    assert await restarted.complete(job_id)
+    status = await restarted.get_job_status(job_id)
+    assert (status.status, status.progress, status.result) == ("completed", 100, {"videos": ["a"]})
+    assert (await restarted.get_job_status(other)).status == "cancelled"
+    with pytest.raises(KeyError):
+        await restarted.get_job_status("missing")
+
+
+@pytest.mark.asyncio
+async def test_sqlite_queue_expired_lease_is_reclaimed_then_dead_lettered(tmp_path):
+    path = str(tmp_path / "queue.db")
+    crashed = SQLiteTaskQueue(path, TimedRequest, visibility_timeout=0.05, max_attempts=2)
+    job_id = await crashed.enqueue_video_generation(TimedRequest())
+    assert [j for j, _ in await crashed.claim(5)] == [job_id]
+    assert await crashed.claim(5) == []  # leased
+
+    survivor = SQLiteTaskQueue(path, TimedRequest, visibility_timeout=0.05, max_attempts=2)
+    await asyncio.sleep(0.06)
+    assert [j for j, _ in await survivor.claim(5)] == [job_id]
+    assert not await crashed.complete(job_id)  # its lease was lost
+
+    await asyncio.sleep(0.06)
+    assert await survivor.claim(5) == []
+    status = await survivor.get_job_status(job_id)
+    assert status.status == "failed" and "2 attempts" in status.error
+    assert [j for j, _ in await survivor.dead_letters()] == [job_id]
+    assert await survivor.requeue(job_id)
+    assert [j for j, _ in await survivor.claim(5)] == [job_id]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_queue_bulk_claim_and_retry(tmp_path):
+    queue = SQLiteTaskQueue(str(tmp_path / "queue.db"), TimedRequest, retry_delay=0.05, max_attempts=2)
+    ids = await queue.enqueue_many([TimedRequest(value=i) for i in range(10)])
+    first = await queue.get_tasks(4)
+    second = await queue.get_tasks(10)
+    assert [j for j, _ in first + second] == ids
+    assert [r.value for _, r in first] == [0, 1, 2, 3]
+
+    assert await queue.fail(ids[0], "boom")
+    assert (await queue.get_job_status(ids[0])).status == "queued"
+    assert await queue.claim(1) == []  # waits out the retry delay
+    (job_id, _), = await queue.get_tasks(1)
+    assert job_id == ids[0]
+    assert await queue.fail(job_id, "boom again")
+    status = await queue.get_job_status(job_id)
+    assert status.status == "failed" and status.error.startswith("boom again")
+
+
+class VideoRequest(BaseModel):
+    video_count: int = 1
+
+
+@pytest.mark.asyncio
+async def test_memory_queue_shares_by_weight():
+    queue = TaskQueue()
+    for _ in range(6):
+        await queue.enqueue_video_generation(VideoRequest(video_count=10), user="bulk")
+    light = [await queue.enqueue_video_generation(VideoRequest(), user="light") for _ in range(2)]
+    heavy = [await queue.enqueue_video_generation(VideoRequest(), user="vip", weight=3) for _ in range(3)]
+    assert await queue.depth_by_user() == {"bulk": 6, "light": 2, "vip": 3}
+
+    served = [(await queue.get_task())[0] for _ in range(6)]
+    # Everyone's first job starts at once; "vip" then gets three jobs for
+    # each of "light"'s, and both drain before "bulk"'s second 10-video job.
+    assert served[1:] == [light[0], heavy[0], heavy[1], heavy[2], light[1]]
+    assert await queue.depth() == 5
+
+
+@pytest.mark.asyncio
+async def test_sqlite_queue_fair_order_and_starvation_guard(tmp_path):
+    path = str(tmp_path / "queue.db")
+    queue = SQLiteTaskQueue(path, VideoRequest)
+    bulk = await queue.enqueue_many([VideoRequest(video_count=10)] * 5, user="bulk")
+    light = await queue.enqueue_many([VideoRequest()] * 3, user="light")
+    assert await queue.depth_by_user() == {"bulk": 5, "light": 3}
+    assert [j for j, _ in await queue.claim(5)] == [bulk[0], light[0], light[1], light[2], bulk[1]]
+
+    # The schedule lives in the database: a newcomer starts at the
+    # current virtual time instead of ahead of the bulk backlog.
+    other = SQLiteTaskQueue(path, VideoRequest)
+    late = await other.enqueue_video_generation(VideoRequest(), user="late")
+    assert [j for j, _ in await other.claim(1)] == [late]
+
+    patient = SQLiteTaskQueue(path, VideoRequest, max_wait=0.05)
+    starved = await patient.enqueue_video_generation(VideoRequest(video_count=10), user="bulk")
+    await asyncio.sleep(0.06)
+    fresh = await patient.enqueue_video_generation(VideoRequest(), user="fresh")
+    assert [j for j, _ in await patient.claim(4)] == [bulk[2], bulk[3], bulk[4], starved]
+    assert [j for j, _ in await patient.claim(1)] == [fresh]
+    assert await patient.depth() == 0
+
+
+def test_user_weight_prefers_user_then_best_role():
+    users, roles = {"acme": 4.0}, {"pro": 2.0, "trial": 0.5}
+    assert user_weight("acme", ["trial"], users, roles) == 4.0
+    assert user_weight("bob", ["trial", "pro"], users, roles) == 2.0
+    assert user_weight("eve", ["viewer"], users, roles) == 1.0
+
+
+@pytest.mark.asyncio
+async def test_non_positive_weight_is_rejected_at_enqueue(tmp_path):
+    for queue in (TaskQueue(), SQLiteTaskQueue(str(tmp_path / "queue.db"), VideoRequest)):
+        with pytest.raises(ValueError):
+            await queue.enqueue_video_generation(VideoRequest(), user="acme", weight=0)
+        assert await queue.depth() == 0
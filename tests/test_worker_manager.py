@@ -6,7 +6,7 @@ from pydantic import BaseModel
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from infrastructure.task_queue import TaskQueue
+from infrastructure.task_queue import SQLiteTaskQueue, TaskQueue
 from infrastructure.worker_manager import WorkerManager
 
 
@@ -28,3 +28,27 @@ async def test_worker_manager_executes_job():
     status = await queue.get_job_status(job)
     assert status.status == "completed"
     await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_worker_manager_renews_sqlite_lease(tmp_path):
+    queue = SQLiteTaskQueue(str(tmp_path / "queue.db"), DummyRequest, visibility_timeout=0.06)
+
+    runs = []
+
+    async def slow(job_id: str, req: DummyRequest) -> None:
+        runs.append(job_id)
+        await asyncio.sleep(0.2)  # outlives the lease unless it is renewed
+
+    manager = WorkerManager(queue, slow)
+    await manager.start(2)
+    job = await queue.enqueue_video_generation(DummyRequest())
+    for _ in range(100):
+        if (await queue.get_job_status(job)).status == "completed":
+            break
+        await asyncio.sleep(0.02)
+    await manager.stop()
+    assert (await queue.get_job_status(job)).status == "completed"
+    assert runs == [job]  # the idle worker never reclaimed it
+    assert queue._leases == {}
+    assert await queue.dead_letters() == []
@@ -24,7 +24,9 @@ async def api_call_with_retry(
         return result
 
     try:
-        return await retry_async(operation_name, wrapped, retries=max_retries, timeout=timeout, breaker=breaker)
+        return await retry_async(
+            operation_name, wrapped, retries=max_retries, timeout=timeout, breaker=breaker, service=service
+        )
     except CircuitBreakerOpenError as exc:
         raise APIError(f"{operation_name} unavailable") from exc
     except asyncio.TimeoutError as exc:
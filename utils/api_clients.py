@@ -1,24 +1,93 @@
 import asyncio
+from contextlib import AsyncExitStack
 from typing import Any, Dict, Optional
+from urllib.parse import urlparse
 
 import aiohttp
 import replicate
-from openai import AsyncOpenAI
+from replicate.helpers import transform_output
 
 from config import Config
+from infrastructure.load_balancer import LoadBalancer, configure_balancer
 from utils.api import api_call_with_retry
 from exceptions import (
     CircuitBreaker,
+    DeadlineExceededError,
     OpenAIError,
     ReplicateError,
     SonautoError,
 )
 from exceptions import get_policy
-from optimization.connection_pool import get_session
+from optimization.connection_pool import (
+    get_openai_client,
+    get_replicate_client,
+    get_session,
+    observe_responses,
+)
+from monitoring.structured_logger import get_logger
+from utils.chat_batcher import get_chat_batcher
+from utils.deadline import clamp_timeout
+from utils.provider_governor import ProviderGovernor
+from utils.provider_jobs import PROVIDER_JOBS_REATTACHED, record_job, recorded_job
+from utils.replicate_poller import get_poller
+
+logger = get_logger(__name__)
+
+# Calls taking this share of ``api_timeout`` count against a provider's
+# breaker like failures, well before the timeout itself cancels them.
+_SLOW_CALL_FRACTION = 0.75
+_openai_breaker = CircuitBreaker(name="openai")
+_replicate_breaker = CircuitBreaker(name="replicate")
+_sonauto_breaker = CircuitBreaker(name="sonauto")
+
+
+def _breaker(breaker: CircuitBreaker, config: Config) -> CircuitBreaker:
+    """Return ``breaker`` with its slow-call threshold taken from ``config``."""
+    breaker.slow_call_duration = config.api_timeout * _SLOW_CALL_FRACTION
+    return breaker
+
+_governors: Dict[str, ProviderGovernor] = {}
+_PROVIDER_HOSTS = {"api.sonauto.ai": "sonauto"}
+
+
+def get_governor(service: str, config: Config) -> ProviderGovernor:
+    """Return the process-wide governor for ``service``.
+
+    Limits come from ``config.pipeline`` and are re-applied when a caller
+    passes a config with different values. Every response from the
+    provider is reported to the governor so it can adapt to rate limits.
+    """
+    pipeline = config.pipeline
+    limits = (
+        getattr(pipeline, f"{service}_max_concurrency"),
+        getattr(pipeline, f"{service}_requests_per_second"),
+    )
+    governor = _governors.get(service)
+    if governor is None:
+        governor = _governors[service] = ProviderGovernor(service, *limits)
+        observe_responses(service, governor.observe)
+    elif (governor.max_in_flight, governor.rate) != limits:
+        governor.configure(*limits)
+    return governor
+
 
-_openai_breaker = CircuitBreaker()
-_replicate_breaker = CircuitBreaker()
-_sonauto_breaker = CircuitBreaker()
+def _balancer(service: str, config: Config) -> LoadBalancer | None:
+    """Return the balancer over ``service``'s configured endpoints, if any.
+
+    Client transports look it up per request, so calling this keeps the
+    provider's endpoints in step with ``config``.
+    """
+    return configure_balancer(service, getattr(config.pipeline, f"{service}_endpoints"))
+
+
+def _url_governor(url: str, config: Config) -> ProviderGovernor | None:
+    service = _PROVIDER_HOSTS.get(urlparse(url).hostname or "")
+    return get_governor(service, config) if service else None
+
+
+def _url_balancer(url: str, config: Config) -> LoadBalancer | None:
+    service = _PROVIDER_HOSTS.get(urlparse(url).hostname or "")
+    return _balancer(service, config) if service else None
 
 
 async def _get_session(timeout: int) -> aiohttp.ClientSession:
@@ -26,13 +95,20 @@ async def _get_session(timeout: int) -> aiohttp.ClientSession:
 
 
 async def openai_chat(prompt: str, config: Config, model: str = "gpt-4o") -> Any:
-    client = AsyncOpenAI(api_key=config.openai_api_key, timeout=config.api_timeout)
+    if config.pipeline.openai_batch_mode:
+        # Latency-insensitive runs trade minutes of delay for batch pricing and quota.
+        return await get_chat_batcher(config).submit(prompt, model)
+    _balancer("openai", config)
+    client = get_openai_client(config.openai_api_key, config.api_timeout)
+
+    governor = get_governor("openai", config)
 
     async def call() -> Any:
-        return await client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-        )
+        async with governor:
+            return await client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+            )
 
     try:
         return await api_call_with_retry(
@@ -40,8 +116,10 @@ async def openai_chat(prompt: str, config: Config, model: str = "gpt-4o") -> Any
             call,
             service="openai",
             timeout=config.api_timeout,
-            breaker=_openai_breaker,
+            breaker=_breaker(_openai_breaker, config),
         )
+    except DeadlineExceededError:
+        raise
     except Exception as exc:
         raise OpenAIError(str(exc)) from exc
 
@@ -49,15 +127,26 @@ async def openai_chat(prompt: str, config: Config, model: str = "gpt-4o") -> Any
 async def openai_speech(
     text: str, voice: str, instructions: str, config: Config
 ) -> Any:
-    client = AsyncOpenAI(api_key=config.openai_api_key, timeout=config.api_timeout)
+    """Open a streamed speech response; the caller must close it."""
+    _balancer("openai", config)
+    client = get_openai_client(config.openai_api_key, config.api_timeout)
+
+    governor = get_governor("openai", config)
 
     async def call() -> Any:
-        return await client.audio.speech.create(
-            model="gpt-4o-mini-tts",
-            voice=voice,
-            input=text,
-            instructions=instructions,
-        )
+        async with governor, AsyncExitStack() as stack:
+            response = await stack.enter_async_context(
+                client.audio.speech.with_streaming_response.create(
+                    model="gpt-4o-mini-tts",
+                    voice=voice,
+                    input=text,
+                    instructions=instructions,
+                )
+            )
+            # The open response now belongs to the caller, which reads the
+            # body in chunks and closes it (see iter_response).
+            stack.pop_all()
+            return response
 
     try:
         return await api_call_with_retry(
@@ -65,48 +154,133 @@ async def openai_speech(
             call,
             service="openai",
             timeout=config.api_timeout,
-            breaker=_openai_breaker,
+            breaker=_breaker(_openai_breaker, config),
         )
+    except DeadlineExceededError:
+        raise
     except Exception as exc:
         raise OpenAIError(str(exc)) from exc
 
 
+async def _create_prediction(client: replicate.Client, model: str, inputs: Dict[str, Any]) -> Any:
+    """Submit a prediction without waiting for it to finish."""
+    if ":" in model:
+        return await client.predictions.async_create(
+            version=model.split(":", 1)[1], input=inputs
+        )
+    return await client.models.predictions.async_create(model=model, input=inputs)
+
+
+async def _reattach_prediction(
+    client: replicate.Client, governor: ProviderGovernor, job_id: str
+) -> Any:
+    """Fetch a prediction started before a restart, or ``None`` if it is
+    gone or ended without output and must be submitted again."""
+    try:
+        async with governor:
+            prediction = await client.predictions.async_get(job_id)
+    except Exception as exc:
+        logger.warning("replicate_reattach_failed", extra={"prediction": job_id, "error": str(exc)})
+        return None
+    if prediction.status in ("failed", "canceled"):
+        return None
+    PROVIDER_JOBS_REATTACHED.labels(provider="replicate").inc()
+    return prediction
+
+
 async def replicate_run(model: str, inputs: Dict[str, Any], config: Config) -> Any:
-    client = replicate.Client(api_token=config.replicate_api_key)
+    """Create a prediction, wait for it via the shared poller, fetch its output.
 
-    async def call() -> Any:
-        return await replicate.async_run(client, model, input=inputs)
+    Only the create step is retried and held against the breaker; it and
+    every status poll are held against the governor. The wait is bounded
+    by ``api_timeout`` and never resubmits, so a slow render cannot start a
+    second paid prediction. The prediction ID is recorded with the running
+    stage (see :mod:`utils.provider_jobs`); a stage resumed after a crash
+    waits on that prediction instead of creating another.
+    """
+    _balancer("replicate", config)
+    client = get_replicate_client(config.replicate_api_key, config.api_timeout)
+
+    governor = get_governor("replicate", config)
+    job_key = f"replicate:{model}"
+
+    async def create() -> Any:
+        async with governor:
+            return await _create_prediction(client, model, inputs)
 
+    job_id = recorded_job(job_key)
+    prediction = None
+    if job_id is not None:
+        prediction = await _reattach_prediction(client, governor, job_id)
+    if prediction is None:
+        try:
+            prediction = await api_call_with_retry(
+                model,
+                create,
+                service="replicate",
+                timeout=config.api_timeout,
+                breaker=_breaker(_replicate_breaker, config),
+            )
+        except DeadlineExceededError:
+            raise
+        except Exception as exc:
+            raise ReplicateError(str(exc)) from exc
+        await record_job(job_key, prediction.id)
+    timeout = clamp_timeout(config.api_timeout)
     try:
-        return await api_call_with_retry(
-            model,
-            call,
-            service="replicate",
-            timeout=config.api_timeout,
-            breaker=_replicate_breaker,
+        prediction = await asyncio.wait_for(
+            get_poller().wait(client, prediction, model, governor), timeout
         )
+    except asyncio.TimeoutError as exc:
+        if timeout < config.api_timeout:
+            raise DeadlineExceededError(
+                f"prediction {prediction.id} outlived the request deadline"
+            ) from exc
+        raise ReplicateError(
+            f"prediction {prediction.id} did not finish within {config.api_timeout}s"
+        ) from exc
+    except DeadlineExceededError:
+        raise
     except Exception as exc:
         raise ReplicateError(str(exc)) from exc
+    if prediction.status != "succeeded":
+        raise ReplicateError(f"prediction {prediction.id} {prediction.status}: {prediction.error}")
+    return transform_output(prediction.output, client)
 
 
 async def http_get(
     url: str, config: Config, headers: Optional[Dict[str, str]] = None
 ) -> aiohttp.ClientResponse:
     session = await _get_session(config.api_timeout)
+    governor = _url_governor(url, config)
+    balancer = _url_balancer(url, config)
 
-    async def call() -> aiohttp.ClientResponse:
-        resp = await session.get(url, headers=headers)
+    async def send(target: str) -> aiohttp.ClientResponse:
+        if governor is None:
+            resp = await session.get(target, headers=headers)
+        else:
+            async with governor:
+                resp = await session.get(target, headers=headers)
+                governor.observe(resp.status, resp.headers)
         resp.raise_for_status()
         return resp
 
+    async def call() -> aiohttp.ClientResponse:
+        if balancer is None:
+            return await send(url)
+        async with balancer.request() as endpoint:
+            return await send(endpoint.rebase(url))
+
     try:
         return await api_call_with_retry(
             "http_get",
             call,
             service="sonauto",
             timeout=config.api_timeout,
-            breaker=_sonauto_breaker,
+            breaker=_breaker(_sonauto_breaker, config),
         )
+    except DeadlineExceededError:
+        raise
     except Exception as exc:
         raise SonautoError(str(exc)) from exc
 
@@ -115,19 +289,34 @@ async def http_post(
     url: str, payload: Dict[str, Any], headers: Dict[str, str], config: Config
 ) -> aiohttp.ClientResponse:
     session = await _get_session(config.api_timeout)
+    governor = _url_governor(url, config)
+    balancer = _url_balancer(url, config)
 
-    async def call() -> aiohttp.ClientResponse:
-        resp = await session.post(url, json=payload, headers=headers)
+    async def send(target: str) -> aiohttp.ClientResponse:
+        if governor is None:
+            resp = await session.post(target, json=payload, headers=headers)
+        else:
+            async with governor:
+                resp = await session.post(target, json=payload, headers=headers)
+                governor.observe(resp.status, resp.headers)
         resp.raise_for_status()
         return resp
 
+    async def call() -> aiohttp.ClientResponse:
+        if balancer is None:
+            return await send(url)
+        async with balancer.request() as endpoint:
+            return await send(endpoint.rebase(url))
+
     try:
         return await api_call_with_retry(
             "http_post",
             call,
             service="sonauto",
             timeout=config.api_timeout,
-            breaker=_sonauto_breaker,
+            breaker=_breaker(_sonauto_breaker, config),
         )
+    except DeadlineExceededError:
+        raise
     except Exception as exc:
         raise SonautoError(str(exc)) from exc
@@ -3,12 +3,21 @@ from __future__ import annotations
 import time
 from typing import Any, Dict, Tuple, Callable, Awaitable
 
+from utils.single_flight import SingleFlight
+
 
 class ResponseCache:
+    """TTL cache whose concurrent misses for one key share a single call."""
+
     def __init__(self, ttl: int = 300, max_items: int = 256) -> None:
         self.ttl = ttl
         self.max_items = max_items
         self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._flight = SingleFlight("response_cache")
+
+    @property
+    def deduplicated(self) -> int:
+        return self._flight.deduplicated
 
     def _prune(self) -> None:
         now = time.time()
@@ -30,10 +39,14 @@ class ResponseCache:
         hit = self.get(key)
         if hit is not None:
             return hit
-        value = await func()
-        self._cache[key] = (time.time(), value)
-        self._prune()
-        return value
+
+        async def fill() -> Any:
+            value = await func()
+            self._cache[key] = (time.time(), value)
+            self._prune()
+            return value
+
+        return await self._flight.do(key, fill)
 
     def clear(self) -> None:
         self._cache.clear()
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from prometheus_client import Counter, Histogram
+
+from config import Config
+from exceptions import OpenAIError
+from optimization.connection_pool import get_openai_client
+from utils.api import api_call_with_retry
+
+CHAT_BATCH_JOBS = Counter("openai_chat_batch_jobs_total", "Chat batch jobs submitted", ["status"])
+CHAT_BATCH_SIZE = Histogram(
+    "openai_chat_batch_requests",
+    "Chat requests per submitted batch job",
+    buckets=(1, 5, 10, 50, 100, 500, 1000, 5000, 50000),
+)
+CHAT_BATCH_SECONDS = Histogram(
+    "openai_chat_batch_seconds",
+    "Time from submitting a chat batch job until its results were read",
+    buckets=(10, 60, 300, 900, 1800, 3600, 4 * 3600, 12 * 3600, 24 * 3600),
+)
+
+# Batch statuses after which the job will not change again.
+TERMINAL = frozenset({"completed", "failed", "expired", "cancelled"})
+# The Batch API accepts at most this many requests per input file.
+MAX_BATCH_REQUESTS = 50_000
+
+
+@dataclass
+class _Request:
+    custom_id: str
+    body: Dict[str, Any]
+    future: asyncio.Future
+
+
+class ChatBatcher:
+    """Send chat completions through the OpenAI Batch API.
+
+    Requests submitted within ``window`` seconds of the first pending one
+    are written to one JSONL file, uploaded and submitted as a single batch
+    job (sooner if ``max_requests`` accumulate). The job is polled every
+    ``poll_interval`` seconds; once it reaches a terminal status its output
+    and error files are read and each waiting caller gets its own
+    ``ChatCompletion`` or an :class:`OpenAIError`. Callers can be cancelled
+    without affecting the rest of the batch.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        window: float = 5.0,
+        poll_interval: float = 30.0,
+        max_requests: int = MAX_BATCH_REQUESTS,
+    ) -> None:
+        self.client = client
+        self.window = window
+        self.poll_interval = poll_interval
+        self.max_requests = min(max_requests, MAX_BATCH_REQUESTS)
+        self._pending: List[_Request] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._jobs: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def submit(self, prompt: str, model: str = "gpt-4o") -> ChatCompletion:
+        """Queue one chat completion and wait for the batch that carries it."""
+        loop = asyncio.get_running_loop()
+        request = _Request(
+            uuid4().hex,
+            {"model": model, "messages": [{"role": "user", "content": prompt}]},
+            loop.create_future(),
+        )
+        self._pending.append(request)
+        if len(self._pending) >= self.max_requests:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self.flush)
+        return await request.future
+
+    def flush(self) -> None:
+        """Submit everything pending now rather than at the end of the window."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = [r for r in self._pending if not r.future.done()]
+        self._pending = []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._jobs.add(task)
+        task.add_done_callback(self._jobs.discard)
+
+    async def _run(self, batch: List[_Request]) -> None:
+        try:
+            status, job_id, records = await self._execute(batch)
+        except Exception as exc:
+            CHAT_BATCH_JOBS.labels(status="error").inc()
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(OpenAIError(f"chat batch failed: {exc}"))
+            return
+        CHAT_BATCH_JOBS.labels(status=status).inc()
+        for request in batch:
+            if request.future.done():
+                continue
+            record = records.get(request.custom_id)
+            try:
+                request.future.set_result(_completion(record, job_id, status))
+            except OpenAIError as exc:
+                request.future.set_exception(exc)
+
+    async def _execute(self, batch: List[_Request]) -> Tuple[str, str, Dict[str, Dict[str, Any]]]:
+        lines = "".join(
+            json.dumps(
+                {
+                    "custom_id": r.custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": r.body,
+                },
+                separators=(",", ":"),
+            )
+            + "\n"
+            for r in batch
+        ).encode()
+
+        async def submit() -> Any:
+            upload = await self.client.files.create(
+                file=("chat_batch.jsonl", lines), purpose="batch"
+            )
+            return await self.client.batches.create(
+                input_file_id=upload.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
+            )
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        job = await api_call_with_retry("openai_batch_submit", submit, service="openai")
+        CHAT_BATCH_SIZE.observe(len(batch))
+        while job.status not in TERMINAL:
+            await asyncio.sleep(self.poll_interval)
+            job = await api_call_with_retry(
+                "openai_batch_status",
+                lambda: self.client.batches.retrieve(job.id),
+                service="openai",
+            )
+        records: Dict[str, Dict[str, Any]] = {}
+        # Expired or cancelled jobs still report what they finished.
+        for file_id in (job.output_file_id, job.error_file_id):
+            if not file_id:
+                continue
+            content = await api_call_with_retry(
+                "openai_batch_results",
+                lambda: self.client.files.content(file_id),
+                service="openai",
+            )
+            for line in content.text.splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["custom_id"]] = record
+        CHAT_BATCH_SECONDS.observe(loop.time() - start)
+        return job.status, job.id, records
+
+
+def _completion(record: Optional[Dict[str, Any]], job_id: str, status: str) -> ChatCompletion:
+    if record is None:
+        raise OpenAIError(f"chat batch {job_id} {status} without a result for this request")
+    response = record.get("response") or {}
+    if record.get("error") or response.get("status_code") != 200:
+        error = record.get("error") or response.get("body", {}).get("error")
+        raise OpenAIError(f"chat batch {job_id} request failed: {error}")
+    return ChatCompletion.model_validate(response["body"])
+
+
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ChatBatcher]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_chat_batcher(config: Config) -> ChatBatcher:
+    """Return the chat batcher for the running loop, configured from ``config``."""
+    loop = asyncio.get_running_loop()
+    pipeline = config.pipeline
+    client = get_openai_client(config.openai_api_key, config.api_timeout)
+    batcher = _batchers.get(loop)
+    if batcher is None or batcher.client is not client:
+        batcher = _batchers[loop] = ChatBatcher(client)
+    batcher.window = pipeline.openai_batch_window
+    batcher.poll_interval = pipeline.openai_batch_poll_interval
+    return batcher
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+
+from prometheus_client import Counter
+
+from exceptions import DeadlineExceededError
+
+DEADLINE_EXCEEDED = Counter(
+    "deadline_exceeded_total", "Requests whose work was cancelled at their deadline"
+)
+
+# Absolute ``time.monotonic()`` time by which the current request must finish.
+# Tasks copy the context they are created in, so stages, retries and provider
+# waits started under a deadline all see it.
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, ``None`` without one."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def expires_at() -> Optional[float]:
+    """``time.monotonic()`` time of the current deadline, ``None`` without one."""
+    return _deadline.get()
+
+
+def clear_deadline() -> None:
+    """Drop the deadline from the current context, for work shared by
+    callers that each wait for it under a deadline of their own."""
+    _deadline.set(None)
+
+
+def check_deadline() -> None:
+    """Raise :class:`DeadlineExceededError` if the current deadline has passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceededError("deadline exceeded")
+
+
+def clamp_timeout(timeout: Optional[float]) -> Optional[float]:
+    """Return ``timeout`` cut down to the time left before the deadline.
+
+    ``None`` means no timeout of its own, so the time left is returned
+    as-is. Raises :class:`DeadlineExceededError` once no time is left.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceededError("deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+@asynccontextmanager
+async def deadline(seconds: Optional[float]) -> AsyncIterator[None]:
+    """Run the body under a deadline ``seconds`` from now.
+
+    The body is cancelled when the deadline passes, together with every
+    task it is waiting on, and :class:`DeadlineExceededError` is raised in
+    its place. An enclosing deadline that ends sooner still wins;
+    ``None`` leaves the current deadline as it is.
+    """
+    outer = _deadline.get()
+    at = None if seconds is None else time.monotonic() + seconds
+    if at is None or (outer is not None and outer <= at):
+        yield
+        return
+    token = _deadline.set(at)
+    try:
+        async with asyncio.timeout(max(0.0, at - time.monotonic())) as scope:
+            yield
+    except TimeoutError as exc:
+        if not scope.expired():
+            raise
+        DEADLINE_EXCEEDED.inc()
+        raise DeadlineExceededError("deadline exceeded") from exc
+    finally:
+        _deadline.reset(token)
@@ -1,4 +1,5 @@
 import asyncio
+import os
 from pathlib import Path
 from typing import AsyncIterable, Iterable
 
@@ -19,6 +20,12 @@ def _resolve(path: str, allowed: Iterable[str]) -> Path:
     return validate_file_path(Path(path), [BASE_DIR / d for d in allowed])
 
 
+def _write_atomic(file_path: Path, data: bytes) -> None:
+    tmp = file_path.with_name(f".{file_path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, file_path)
+
+
 async def read_file(path: str) -> str:
     file_path = _resolve(path, ["prompts", "image", "video", "music", "voice", "."])  # allow reading from these
     loop = asyncio.get_event_loop()
@@ -43,7 +50,7 @@ async def save_file(path: str, data: bytes) -> None:
     loop = asyncio.get_event_loop()
     start = loop.time()
     try:
-        await asyncio.to_thread(file_path.write_bytes, data)
+        await asyncio.to_thread(_write_atomic, file_path, data)
         checksum = await integrity.sha256(file_path)
         await integrity.update_checksum_file(
             file_path.parent / ".checksums.json", file_path.name, checksum
@@ -62,4 +69,14 @@ async def read_file_stream(path: str, chunk_size: int = 65536) -> AsyncIterable[
 
 async def save_file_stream(path: str, data: AsyncIterable[bytes]) -> None:
     file_path = _resolve(path, ["image", "video", "music", "voice"])
-    await stream_write(file_path, data)
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    try:
+        checksum = await stream_write(file_path, data)
+        await integrity.update_checksum_file(
+            file_path.parent / ".checksums.json", file_path.name, checksum
+        )
+    except OSError as exc:
+        raise FileOperationError(str(exc)) from exc
+    finally:
+        FILE_PROCESS_TIME.labels(operation="save_file_stream").observe(loop.time() - start)
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Optional
+
+from aiohttp import web
+
+
+class EndpointStub:
+    """Local stand-in for one regional endpoint or proxy of a provider API.
+
+    Answers any GET or POST after ``latency`` seconds, or with ``status``
+    when it is set (e.g. 503 for an endpoint that is down); both can be
+    changed while it runs. ``hits`` counts the requests it received. Use as
+    ``async with EndpointStub(0.01) as stub:`` and balance over
+    ``stub.base_url``.
+    """
+
+    def __init__(self, latency: float = 0.0, status: Optional[int] = None) -> None:
+        self.latency = latency
+        self.status = status
+        self.hits = 0
+        self.base_url = ""
+        self._runner: Optional[web.AppRunner] = None
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self._handle)
+        self.app = app
+
+    async def __aenter__(self) -> "EndpointStub":
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.hits += 1
+        await asyncio.sleep(self.latency)
+        if self.status is not None:
+            return web.json_response({"error": "unavailable"}, status=self.status)
+        return web.json_response({"path": request.path, "ok": True})
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from aiohttp import web
+
+
+def _completion(content: str, model: str) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+    }
+
+
+def _echo(prompt: str) -> str:
+    return f"Idea: {prompt[:40]}\nPrompt: {prompt[:80]}"
+
+
+class OpenAIBatchStub:
+    """Local stand-in for the OpenAI chat and Batch endpoints.
+
+    Serves ``/v1/chat/completions`` after ``call_latency`` seconds and runs
+    batch jobs (``/v1/files``, ``/v1/batches``) that complete
+    ``batch_latency`` seconds after submission. Replies come from
+    ``reply(prompt)``; prompts containing ``fail_marker`` get a per-request
+    error in the job's error file. Use as ``async with OpenAIBatchStub() as
+    stub:`` and point a client at ``stub.base_url``.
+    """
+
+    def __init__(
+        self,
+        call_latency: float = 0.0,
+        batch_latency: float = 0.0,
+        reply: Callable[[str], str] = _echo,
+        fail_marker: str = "FAIL",
+    ) -> None:
+        self.call_latency = call_latency
+        self.batch_latency = batch_latency
+        self.reply = reply
+        self.fail_marker = fail_marker
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.chat_calls = 0
+        self.base_url = ""
+        self._runner: Optional[web.AppRunner] = None
+        app = web.Application(client_max_size=200 << 20)
+        app.router.add_post("/v1/chat/completions", self._chat)
+        app.router.add_post("/v1/files", self._upload)
+        app.router.add_get("/v1/files/{file_id}/content", self._content)
+        app.router.add_post("/v1/batches", self._create_batch)
+        app.router.add_get("/v1/batches/{batch_id}", self._get_batch)
+        self.app = app
+
+    async def __aenter__(self) -> "OpenAIBatchStub":
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/v1"
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _answer(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        prompt = body["messages"][-1]["content"]
+        if self.fail_marker and self.fail_marker in prompt:
+            return None
+        return _completion(self.reply(prompt), body.get("model", "gpt-4o"))
+
+    async def _chat(self, request: web.Request) -> web.Response:
+        self.chat_calls += 1
+        body = await request.json()
+        await asyncio.sleep(self.call_latency)
+        answer = self._answer(body)
+        if answer is None:
+            return web.json_response({"error": {"message": "rejected"}}, status=400)
+        return web.json_response(answer)
+
+    async def _upload(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        upload = form["file"]
+        file_id = f"file-{uuid4().hex[:12]}"
+        self.files[file_id] = upload.file.read()
+        return web.json_response(
+            {
+                "id": file_id,
+                "object": "file",
+                "bytes": len(self.files[file_id]),
+                "created_at": int(time.time()),
+                "filename": upload.filename,
+                "purpose": form.get("purpose", "batch"),
+                "status": "processed",
+            }
+        )
+
+    async def _content(self, request: web.Request) -> web.Response:
+        data = self.files.get(request.match_info["file_id"])
+        if data is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=data, content_type="application/jsonl")
+
+    async def _create_batch(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        batch_id = f"batch_{uuid4().hex[:12]}"
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"],
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+        }
+        asyncio.get_running_loop().call_later(self.batch_latency, self._finish, batch_id)
+        return web.json_response(self.batches[batch_id])
+
+    def _finish(self, batch_id: str) -> None:
+        batch = self.batches[batch_id]
+        output: List[str] = []
+        errors: List[str] = []
+        for line in self.files[batch["input_file_id"]].decode().splitlines():
+            request = json.loads(line)
+            answer = self._answer(request["body"])
+            if answer is None:
+                errors.append(
+                    json.dumps(
+                        {
+                            "custom_id": request["custom_id"],
+                            "response": {"status_code": 400, "body": {"error": {"message": "rejected"}}},
+                            "error": None,
+                        }
+                    )
+                )
+            else:
+                output.append(
+                    json.dumps(
+                        {
+                            "custom_id": request["custom_id"],
+                            "response": {"status_code": 200, "body": answer},
+                            "error": None,
+                        }
+                    )
+                )
+        for key, lines in (("output_file_id", output), ("error_file_id", errors)):
+            if lines:
+                file_id = f"file-{uuid4().hex[:12]}"
+                self.files[file_id] = ("\n".join(lines) + "\n").encode()
+                batch[key] = file_id
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    async def _get_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            raise web.HTTPNotFound()
+        return web.json_response(batch)
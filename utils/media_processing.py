@@ -1,8 +1,157 @@
+from __future__ import annotations
+
 import asyncio
-from typing import Optional
+import math
+import os
+import signal
+import time
+from collections import deque
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Optional, TypeVar
+
+from prometheus_client import Gauge, Histogram
 
 from exceptions import FFmpegError
 
+T = TypeVar("T")
+
+COMPOSITION_QUEUE_WAIT = Histogram(
+    "composition_queue_wait_seconds", "Time an encode waited for a composition worker"
+)
+COMPOSITION_ENCODE_TIME = Histogram(
+    "composition_encode_seconds", "Wall time of one ffmpeg composition encode"
+)
+COMPOSITION_QUEUED = Gauge("composition_queued_jobs", "Encodes waiting for a worker")
+COMPOSITION_RUNNING = Gauge("composition_running_jobs", "Encodes currently running")
+
+_CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+
+def _cgroup_cpu_limit(root: Path = _CGROUP_ROOT) -> Optional[float]:
+    """Return the CPU quota of the current cgroup in cores, if one is set."""
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        quota, period = (root / "cpu.max").read_text().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: quota of -1 means unlimited
+        quota = int((root / "cpu" / "cpu.cfs_quota_us").read_text())
+        period = int((root / "cpu" / "cpu.cfs_period_us").read_text())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus(root: Path = _CGROUP_ROOT) -> int:
+    """CPUs this process may use: its affinity mask capped by the cgroup quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit(root)
+    if limit:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+class CompositionExecutor:
+    """Bound concurrent ffmpeg encodes to the CPUs available to the process.
+
+    ``workers`` encodes run at once (half the available CPUs by default)
+    and each gets ``threads`` encoder threads; excess encodes queue in FIFO
+    order instead of oversubscribing the cores.
+    """
+
+    def __init__(self, workers: int | None = None) -> None:
+        self._running = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.configure(workers)
+
+    def configure(self, workers: int | None = None) -> None:
+        cpus = available_cpus()
+        self.workers = workers or max(1, cpus // 2)
+        self.threads = max(1, cpus // self.workers)
+        self._wake()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _wake(self) -> None:
+        while self._waiters and self._running < self.workers:
+            fut = self._waiters.popleft()
+            if fut.done() or fut.get_loop().is_closed():
+                continue
+            self._running += 1
+            fut.set_result(None)
+        COMPOSITION_QUEUED.set(len(self._waiters))
+
+    async def _acquire(self) -> None:
+        if self._running < self.workers and not self._waiters:
+            self._running += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        COMPOSITION_QUEUED.set(len(self._waiters))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release()
+            elif fut in self._waiters:
+                self._waiters.remove(fut)
+                COMPOSITION_QUEUED.set(len(self._waiters))
+            raise
+
+    def _release(self) -> None:
+        self._running -= 1
+        self._wake()
+
+    async def submit(self, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """Run ``fn`` once a worker is free, recording queue wait and encode time."""
+        queued = time.monotonic()
+        await self._acquire()
+        started = time.monotonic()
+        COMPOSITION_QUEUE_WAIT.observe(started - queued)
+        COMPOSITION_RUNNING.set(self._running)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            COMPOSITION_ENCODE_TIME.observe(time.monotonic() - started)
+            self._release()
+            COMPOSITION_RUNNING.set(self._running)
+
+
+composition_executor = CompositionExecutor()
+
+
+async def _encode(cmd: str) -> None:
+    # Own session, so a kill reaches ffmpeg and not just the shell around it.
+    process = await asyncio.create_subprocess_shell(
+        cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    try:
+        _, err = await process.communicate()
+    except BaseException:
+        # Cancelled (deadline, consumer gone): stop the encode before the
+        # executor slot is released, so it stops using the CPU too.
+        with suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        raise FFmpegError(f"ffmpeg failed: {err.decode()}")
+
 
 async def merge_video_audio(
     video_path: str,
@@ -21,12 +170,8 @@ async def merge_video_audio(
     else:
         cmd += '-map 0:v -map 1:a '
     cmd += (
-        f'-shortest -t {duration} -c:v libx264 -c:a aac -b:a 192k "{output}"'
+        f'-shortest -t {duration} -c:v libx264 -threads {composition_executor.threads} '
+        f'-c:a aac -b:a 192k "{output}"'
     )
-    process = await asyncio.create_subprocess_shell(
-        cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    _, err = await process.communicate()
-    if process.returncode != 0:
-        raise FFmpegError(f"ffmpeg failed: {err.decode()}")
+    await composition_executor.submit(_encode, cmd)
     return output
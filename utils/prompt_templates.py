@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+from string import Template
+from typing import Any, Dict, Optional, Tuple
+
+from prometheus_client import Counter
+
+from utils import file_operations
+
+PROMPT_TEMPLATE_LOADS = Counter(
+    "prompt_template_loads_total", "Prompt templates read and verified from disk"
+)
+PROMPT_TEMPLATE_HITS = Counter(
+    "prompt_template_hits_total", "Prompt template lookups served from memory"
+)
+
+_Signature = Tuple[int, int, int]
+
+
+@dataclass
+class _Entry:
+    signature: _Signature
+    text: str
+    template: Template
+    checked: float
+
+
+class PromptRegistry:
+    """Keep verified prompt templates in memory.
+
+    A template is read through :func:`file_operations.read_file`, which
+    checks it against ``.checksums.json``, the first time it is asked for.
+    Later lookups within ``check_interval`` seconds of the last check are
+    served without touching the filesystem; after that one ``stat`` call
+    decides whether the file changed (mtime, size or inode) and must be
+    read again.
+    """
+
+    def __init__(self, check_interval: float = 1.0) -> None:
+        self.check_interval = check_interval
+        self._entries: Dict[str, _Entry] = {}
+
+    @staticmethod
+    def _signature(path: str) -> Optional[_Signature]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    async def _entry(self, path: str) -> _Entry:
+        key = os.path.abspath(path)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            if now - entry.checked < self.check_interval:
+                PROMPT_TEMPLATE_HITS.inc()
+                return entry
+            if self._signature(key) == entry.signature:
+                entry.checked = now
+                PROMPT_TEMPLATE_HITS.inc()
+                return entry
+        signature = self._signature(key)
+        text = await file_operations.read_file(path)
+        PROMPT_TEMPLATE_LOADS.inc()
+        entry = _Entry(signature, text, Template(text), now)
+        # Only cache what is still on disk unchanged since it was read.
+        if signature is not None and self._signature(key) == signature:
+            self._entries[key] = entry
+        else:
+            self._entries.pop(key, None)
+        return entry
+
+    async def get(self, path: str) -> str:
+        """Return the text of the template at ``path``."""
+        return (await self._entry(path)).text
+
+    async def render(self, path: str, **params: Any) -> str:
+        """Return the template at ``path`` with ``$name`` placeholders filled
+        from ``params``; placeholders without a value are left as they are."""
+        return (await self._entry(path)).template.safe_substitute(params)
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(os.path.abspath(path), None)
+
+
+prompt_registry = PromptRegistry()
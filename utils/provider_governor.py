@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Mapping, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+PROVIDER_IN_FLIGHT = Gauge(
+    "provider_in_flight_requests", "Requests in flight per provider", ["provider"]
+)
+PROVIDER_WAIT = Histogram(
+    "provider_governor_wait_seconds",
+    "Time spent waiting for a provider slot and rate token",
+    ["provider"],
+)
+PROVIDER_CONCURRENCY_LIMIT = Gauge(
+    "provider_concurrency_limit", "Adaptive in-flight limit per provider", ["provider"]
+)
+PROVIDER_RATE_LIMITED = Counter(
+    "provider_rate_limited_total", "429 responses seen per provider", ["provider"]
+)
+PROVIDER_BLOCKED = Histogram(
+    "provider_rate_limit_delay_seconds",
+    "Time new requests were held until a provider's rate limit reset",
+    ["provider"],
+)
+
+# Reset durations as OpenAI sends them, e.g. "1s", "6m0s", "20ms".
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_seconds(value: Optional[str]) -> Optional[float]:
+    """Seconds until ``value``: a delta, an epoch time, a duration or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parts = _DURATION_RE.findall(value)
+        if parts and "".join(n + u for n, u in parts) == value:
+            return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    # Large values are absolute epoch seconds rather than a delta.
+    return max(0.0, number - time.time()) if number > 1e9 else max(0.0, number)
+
+
+def rate_limit_delay(status: int, headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds a provider asked callers to hold off for, if it said.
+
+    ``Retry-After`` (and OpenAI's ``retry-after-ms``) apply to any status;
+    otherwise an exhausted ``x-ratelimit-remaining-requests`` means waiting
+    for ``x-ratelimit-reset-requests`` (or ``x-ratelimit-reset``).
+    """
+    retry_ms = headers.get("retry-after-ms")
+    if retry_ms is not None:
+        delay = _parse_seconds(retry_ms)
+        if delay is not None:
+            return delay / 1000
+    delay = _parse_seconds(headers.get("retry-after"))
+    if delay is not None:
+        return delay
+    remaining = headers.get("x-ratelimit-remaining-requests", headers.get("x-ratelimit-remaining"))
+    if remaining is not None and remaining.strip() in ("0", "0.0"):
+        return _parse_seconds(
+            headers.get("x-ratelimit-reset-requests", headers.get("x-ratelimit-reset"))
+        )
+    return None
+
+
+def retry_after_hint(exc: BaseException) -> Optional[float]:
+    """``rate_limit_delay`` for the HTTP response behind ``exc``, if any."""
+    while exc is not None:
+        response = getattr(exc, "response", None)
+        headers = getattr(response, "headers", None) or getattr(exc, "headers", None)
+        status = getattr(response, "status_code", None) or getattr(exc, "status", None)
+        if headers is not None and isinstance(status, int):
+            return rate_limit_delay(status, headers)
+        exc = exc.__cause__
+    return None
+
+
+class ProviderGovernor:
+    """Bound in-flight requests and request rate for one provider.
+
+    Slots are handed out in FIFO order; the rate is a token bucket refilled
+    at ``rate`` tokens per second holding at most ``burst`` tokens. Use as
+    ``async with governor:`` around a single outbound request.
+
+    Responses reported through :meth:`observe` adapt the in-flight limit
+    between 1 and ``max_in_flight``: each success adds ``1/limit`` (about
+    one slot per full window of requests) and a 429 multiplies it by
+    ``decrease``, at most once per ``cooldown`` seconds so one burst of
+    rejections counts as one signal. When the provider says how long to
+    wait, new requests are held until then instead of being sent to fail.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        rate: float,
+        burst: float | None = None,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+    ) -> None:
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._limit = float(max_in_flight)
+        self._decreased = float("-inf")
+        self._blocked_until = 0.0
+        PROVIDER_CONCURRENCY_LIMIT.labels(provider=name).set(max_in_flight)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def limit(self) -> int:
+        """Requests currently allowed in flight."""
+        return max(1, min(self.max_in_flight, int(self._limit)))
+
+    def configure(self, max_in_flight: int, rate: float, burst: float | None = None) -> None:
+        # An unthrottled limit follows the new ceiling; a reduced one keeps its value.
+        if self._limit >= self.max_in_flight:
+            self._limit = float(max_in_flight)
+        self.max_in_flight = max_in_flight
+        self._limit = min(self._limit, float(max_in_flight))
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = min(self._tokens, self.burst)
+        PROVIDER_CONCURRENCY_LIMIT.labels(provider=self.name).set(self.limit)
+        self._wake()
+
+    def observe(self, status: int, headers: Mapping[str, str]) -> None:
+        """Adapt to one response from the provider."""
+        now = time.monotonic()
+        if status == 429:
+            PROVIDER_RATE_LIMITED.labels(provider=self.name).inc()
+            if now - self._decreased >= self.cooldown:
+                self._limit = max(1.0, self._limit * self.decrease)
+                self._decreased = now
+        elif status < 400:
+            self._limit = min(float(self.max_in_flight), self._limit + 1 / self._limit)
+        delay = rate_limit_delay(status, headers)
+        if delay:
+            self._blocked_until = max(self._blocked_until, now + delay)
+        PROVIDER_CONCURRENCY_LIMIT.labels(provider=self.name).set(self.limit)
+        self._wake()
+
+    async def _wait_unblocked(self) -> None:
+        start = time.monotonic()
+        if self._blocked_until <= start:
+            return
+        while (delay := self._blocked_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+        PROVIDER_BLOCKED.labels(provider=self.name).observe(time.monotonic() - start)
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            fut = self._waiters.popleft()
+            if fut.done() or fut.get_loop().is_closed():
+                continue
+            self._in_flight += 1
+            fut.set_result(None)
+
+    async def _acquire_slot(self) -> None:
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release_slot()
+            elif fut in self._waiters:
+                self._waiters.remove(fut)
+            raise
+
+    def _release_slot(self) -> None:
+        self._in_flight -= 1
+        self._wake()
+
+    async def _take_token(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self) -> "ProviderGovernor":
+        start = time.monotonic()
+        await self._acquire_slot()
+        try:
+            await self._wait_unblocked()
+            await self._take_token()
+        except BaseException:
+            self._release_slot()
+            raise
+        PROVIDER_WAIT.labels(provider=self.name).observe(time.monotonic() - start)
+        PROVIDER_IN_FLIGHT.labels(provider=self.name).set(self._in_flight)
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self._release_slot()
+        PROVIDER_IN_FLIGHT.labels(provider=self.name).set(self._in_flight)
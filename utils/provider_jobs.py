@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from prometheus_client import Counter
+
+PROVIDER_JOBS_REATTACHED = Counter(
+    "provider_jobs_reattached_total",
+    "Provider jobs picked up again after a restart instead of resubmitted",
+    ["provider"],
+)
+
+# ``PipelineContext.meta`` keys holding provider jobs start with this.
+META_PREFIX = "provider_job:"
+
+
+class JobRecorder:
+    """Remember the provider jobs a pipeline stage starts.
+
+    Each job ID lives in ``meta`` under ``provider_job:<stage>:<key>``,
+    where ``key`` names the job within the stage (``replicate:<model>``,
+    ``sonauto``). ``persist(meta_key, job_id)`` is awaited as soon as a job
+    is recorded so the ID survives a crash in the middle of the stage.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        meta: Dict[str, Any],
+        persist: Optional[Callable[[str, str], Awaitable[None]]] = None,
+    ) -> None:
+        self.stage = stage
+        self.meta = meta
+        self.persist = persist
+
+    def meta_key(self, key: str) -> str:
+        return f"{META_PREFIX}{self.stage}:{key}"
+
+    def get(self, key: str) -> Optional[str]:
+        return self.meta.get(self.meta_key(key))
+
+    async def record(self, key: str, job_id: str) -> None:
+        meta_key = self.meta_key(key)
+        self.meta[meta_key] = job_id
+        if self.persist is not None:
+            await self.persist(meta_key, job_id)
+
+
+_recorder: ContextVar[Optional[JobRecorder]] = ContextVar("provider_job_recorder", default=None)
+
+
+@contextmanager
+def recording(recorder: JobRecorder) -> Iterator[JobRecorder]:
+    """Make ``recorder`` the one provider calls in this context report to."""
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def current_recorder() -> Optional[JobRecorder]:
+    return _recorder.get()
+
+
+def recorded_job(key: str) -> Optional[str]:
+    """ID of the job ``key`` the current stage started before, if any."""
+    recorder = _recorder.get()
+    return None if recorder is None else recorder.get(key)
+
+
+async def record_job(key: str, job_id: str) -> None:
+    """Record a job the current stage just started; a no-op outside a stage."""
+    recorder = _recorder.get()
+    if recorder is not None:
+        await recorder.record(key, job_id)
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import weakref
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+PREDICTIONS_OUTSTANDING = Gauge(
+    "replicate_predictions_outstanding", "Replicate predictions awaiting completion"
+)
+PREDICTION_SECONDS = Histogram(
+    "replicate_prediction_seconds",
+    "Time from submission to a terminal status per model",
+    ["model"],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200),
+)
+STATUS_REQUESTS = Counter(
+    "replicate_status_requests_total", "Status requests made by the poller", ["kind"]
+)
+
+TERMINAL = frozenset({"succeeded", "failed", "canceled"})
+
+
+@dataclass
+class _Tracked:
+    client: Any
+    prediction: Any
+    model: str
+    future: asyncio.Future
+    submitted: float
+    due: float
+    errors: int = 0
+    governor: Any = None
+    waiters: int = 0
+
+
+class PredictionPoller:
+    """Poll every outstanding Replicate prediction from one background task.
+
+    Each prediction is checked again after a model-specific interval: a
+    tenth of that model's smoothed completion time, clamped between
+    ``min_interval`` and ``max_interval``, and never before half the
+    expected completion time has passed. When several checks fall due
+    together, one ``list`` request per client covers the recent ones and
+    only the rest are fetched individually. Waiters get the terminal
+    prediction through a future, so no coroutine holds a connection, retry
+    or breaker slot while a render runs. Each status request is held
+    against the governor the prediction was submitted with, so polling
+    shares the provider's rate budget and its 429s slow it down too.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 1.0,
+        max_interval: float = 30.0,
+        default_latency: float = 10.0,
+        max_errors: int = 5,
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_latency = default_latency
+        self.max_errors = max_errors
+        self._pending: Dict[str, _Tracked] = {}
+        # Smoothed submission-to-completion seconds per model.
+        self._latency: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def outstanding(self) -> int:
+        return len(self._pending)
+
+    def expected_latency(self, model: str) -> float:
+        return self._latency.get(model, self.default_latency)
+
+    def interval(self, model: str) -> float:
+        return min(self.max_interval, max(self.min_interval, self.expected_latency(model) / 10))
+
+    def _observe(self, model: str, seconds: float) -> None:
+        mean = self._latency.get(model)
+        self._latency[model] = seconds if mean is None else mean + 0.2 * (seconds - mean)
+        PREDICTION_SECONDS.labels(model=model).observe(seconds)
+
+    async def wait(
+        self, client: Any, prediction: Any, model: str, governor: Any = None
+    ) -> Any:
+        """Return ``prediction`` once it reaches a terminal status.
+
+        Callers waiting on the same prediction share one tracked entry,
+        which is dropped once the last of them stops waiting.
+        """
+        if prediction.status in TERMINAL:
+            return prediction
+        tracked = self._pending.get(prediction.id)
+        if tracked is None:
+            now = time.monotonic()
+            first = max(self.interval(model), self.expected_latency(model) / 2)
+            tracked = self._pending[prediction.id] = _Tracked(
+                client,
+                prediction,
+                model,
+                asyncio.get_running_loop().create_future(),
+                now,
+                now + first,
+                governor=governor,
+            )
+            PREDICTIONS_OUTSTANDING.set(len(self._pending))
+            self._ensure_running()
+        tracked.waiters += 1
+        try:
+            return await asyncio.shield(tracked.future)
+        finally:
+            tracked.waiters -= 1
+            if tracked.waiters == 0 and self._pending.get(prediction.id) is tracked:
+                del self._pending[prediction.id]
+            PREDICTIONS_OUTSTANDING.set(len(self._pending))
+
+    def _ensure_running(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while self._pending:
+            self._wakeup.clear()
+            now = time.monotonic()
+            waiting = [t for t in self._pending.values() if not t.future.done()]
+            if not waiting:
+                return
+            due = [t for t in waiting if t.due <= now]
+            if due:
+                await self._check(due)
+                continue
+            delay = min(t.due for t in waiting) - now
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, delay))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check(self, due: List[_Tracked]) -> None:
+        by_client: Dict[int, List[_Tracked]] = {}
+        for tracked in due:
+            by_client.setdefault(id(tracked.client), []).append(tracked)
+        for group in by_client.values():
+            remaining = group
+            if len(group) > 1:
+                remaining = await self._check_listed(group)
+            await asyncio.gather(*(self._check_one(t) for t in remaining))
+
+    async def _check_listed(self, group: List[_Tracked]) -> List[_Tracked]:
+        """Resolve what one ``list`` page can; return the predictions it missed."""
+        try:
+            STATUS_REQUESTS.labels(kind="list").inc()
+            async with group[0].governor or nullcontext():
+                page = await group[0].client.predictions.async_list()
+        except Exception:
+            return group
+        listed = {p.id: p for p in page.results}
+        missed: List[_Tracked] = []
+        for tracked in group:
+            summary = listed.get(tracked.prediction.id)
+            if summary is None:
+                missed.append(tracked)
+            elif summary.status in TERMINAL:
+                # List entries may omit output; fetch the full prediction.
+                missed.append(tracked)
+            else:
+                self._reschedule(tracked)
+        return missed
+
+    async def _check_one(self, tracked: _Tracked) -> None:
+        try:
+            STATUS_REQUESTS.labels(kind="get").inc()
+            async with tracked.governor or nullcontext():
+                current = await tracked.client.predictions.async_get(tracked.prediction.id)
+        except Exception as exc:
+            tracked.errors += 1
+            if tracked.errors >= self.max_errors and not tracked.future.done():
+                tracked.future.set_exception(exc)
+            else:
+                self._reschedule(tracked, backoff=2 ** tracked.errors)
+            return
+        tracked.errors = 0
+        if current.status not in TERMINAL:
+            self._reschedule(tracked)
+            return
+        self._observe(tracked.model, time.monotonic() - tracked.submitted)
+        self._pending.pop(tracked.prediction.id, None)
+        if not tracked.future.done():
+            tracked.future.set_result(current)
+
+    def _reschedule(self, tracked: _Tracked, backoff: float = 1.0) -> None:
+        tracked.due = time.monotonic() + self.interval(tracked.model) * backoff
+
+
+_pollers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, PredictionPoller]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_poller() -> PredictionPoller:
+    """Return the prediction poller for the running event loop."""
+    loop = asyncio.get_running_loop()
+    poller = _pollers.get(loop)
+    if poller is None:
+        poller = _pollers[loop] = PredictionPoller()
+    return poller
@@ -6,10 +6,12 @@ import random
 import time
 from typing import Awaitable, Callable, TypeVar
 
-from exceptions import ServiceError
+from exceptions import DeadlineExceededError, RetryBudgetExhaustedError, ServiceError, get_budget
 from monitoring.structured_logger import correlation_id
 from monitoring.metrics_collector import MetricsCollector
 from utils.circuit_breaker import CircuitBreaker
+from utils.deadline import clamp_timeout, remaining
+from utils.provider_governor import retry_after_hint
 
 T = TypeVar("T")
 collector = MetricsCollector()
@@ -21,19 +23,55 @@ async def retry_async(
     retries: int = 3,
     timeout: int = 60,
     breaker: CircuitBreaker | None = None,
+    service: str | None = None,
 ) -> T:
     logger = logging.getLogger(operation)
     start = time.time()
+    # Retries to a service are drawn from its budget, refilled by successes.
+    budget = get_budget(service) if service else None
     for attempt in range(1, retries + 1):
+        # Each attempt gets at most the time left before the request's deadline.
+        attempt_timeout = clamp_timeout(timeout)
         try:
-            call = func if breaker is None else (lambda: breaker.call(func))
-            return await asyncio.wait_for(call(), timeout=timeout)
+            if breaker is None:
+                result = await asyncio.wait_for(func(), timeout=attempt_timeout)
+            else:
+                # The breaker applies the timeout so it sees a hung call time out.
+                result = await breaker.call(func, timeout=attempt_timeout)
+            if budget is not None:
+                budget.record_success()
+            return result
+        except DeadlineExceededError:
+            raise
         except Exception as exc:
+            # Wait as long as a rate-limited provider asked, else back off.
+            hint = retry_after_hint(exc)
+            delay = min(2 ** attempt + random.random() if hint is None else hint, 60)
+            left = remaining()
+            if left is not None and (left <= 0 or (attempt < retries and delay >= left)):
+                # Out of time, or no retry could start before the deadline.
+                cid = correlation_id.get()
+                collector.increment_error(operation, "deadline")
+                logger.error("%s deadline exceeded", operation, extra={"cid": cid, "attempt": attempt})
+                raise DeadlineExceededError(
+                    f"{operation}: deadline exceeded",
+                    correlation_id=cid,
+                    context={"op": operation, "attempt": attempt, "elapsed": time.time() - start},
+                ) from exc
             if attempt == retries:
                 cid = correlation_id.get()
                 err = ServiceError(str(exc), correlation_id=cid, context={"op": operation, "attempt": attempt, "elapsed": time.time() - start})
                 collector.increment_error(operation, "retry")
                 logger.error("%s failed", operation, extra={"cid": cid, "attempt": attempt})
                 raise err from exc
-            await asyncio.sleep(min(2 ** attempt + random.random(), 60))
+            if budget is not None and not budget.try_spend():
+                cid = correlation_id.get()
+                collector.increment_error(operation, "retry_budget")
+                logger.error("%s retry budget exhausted", operation, extra={"cid": cid, "attempt": attempt})
+                raise RetryBudgetExhaustedError(
+                    f"{operation}: {service} retry budget exhausted",
+                    correlation_id=cid,
+                    context={"op": operation, "attempt": attempt, "elapsed": time.time() - start},
+                ) from exc
+            await asyncio.sleep(delay)
     raise ServiceError(f"{operation} failed", correlation_id=correlation_id.get())
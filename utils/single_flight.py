@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import weakref
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+from prometheus_client import Counter
+
+from utils.deadline import clear_deadline
+from utils.provider_jobs import JobRecorder, current_recorder, recording
+
+SINGLE_FLIGHT_DEDUPLICATED = Counter(
+    "single_flight_deduplicated_total",
+    "Calls that joined an identical call already in flight",
+    ["name"],
+)
+
+T = TypeVar("T")
+
+
+class _SharedRecorder(JobRecorder):
+    """Record the provider jobs of a shared call with every caller's recorder.
+
+    Lookups go to the first caller's recorder, so a resumed stage still
+    reattaches to the job it had started; callers joining later get the
+    jobs recorded so far.
+    """
+
+    def __init__(self, leader: Optional[JobRecorder]) -> None:
+        super().__init__(leader.stage if leader else "", leader.meta if leader else {})
+        self.jobs: Dict[str, str] = {}
+        self.recorders: List[JobRecorder] = []
+
+    async def join(self, recorder: Optional[JobRecorder]) -> None:
+        if recorder is None or any(r is recorder for r in self.recorders):
+            return
+        self.recorders.append(recorder)
+        for key, job_id in list(self.jobs.items()):
+            await recorder.record(key, job_id)
+
+    async def record(self, key: str, job_id: str) -> None:
+        self.jobs[key] = job_id
+        await asyncio.gather(*(r.record(key, job_id) for r in list(self.recorders)))
+
+
+@dataclass
+class _Call:
+    task: asyncio.Task
+    recorder: _SharedRecorder
+    waiters: int = 1
+
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers with the same key.
+
+    The first caller for a key starts ``func()`` in its own task; callers
+    arriving before it finishes wait on that task instead of starting
+    another. All of them get its result or its exception. A caller that is
+    cancelled stops waiting without disturbing the others, and the call
+    itself is cancelled only once every caller has gone. Nothing is kept
+    after the call finishes, so a later caller starts afresh.
+
+    Callers from different requests share a call too. The shared task runs
+    without a deadline, each caller waiting under its own (see
+    :mod:`utils.deadline`), and provider jobs it starts are recorded with
+    every caller's recorder (see :mod:`utils.provider_jobs`).
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.deduplicated = 0
+        # Tasks belong to the loop that started them.
+        self._calls: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, _Call]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def in_flight(self) -> int:
+        try:
+            return len(self._calls.get(asyncio.get_running_loop(), ()))
+        except RuntimeError:
+            return 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        calls = self._calls.get(loop)
+        if calls is None:
+            calls = self._calls[loop] = {}
+        call = calls.get(key)
+        if call is None:
+            recorder = _SharedRecorder(current_recorder())
+            call = calls[key] = _Call(loop.create_task(_shared(func, recorder)), recorder)
+            call.task.add_done_callback(lambda _: _forget(calls, key, call))
+        else:
+            call.waiters += 1
+            self.deduplicated += 1
+            SINGLE_FLIGHT_DEDUPLICATED.labels(name=self.name).inc()
+        try:
+            await call.recorder.join(current_recorder())
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+            raise
+
+
+async def _shared(func: Callable[[], Awaitable[T]], recorder: _SharedRecorder) -> T:
+    # The task runs in a copy of the first caller's context.
+    clear_deadline()
+    with recording(recorder):
+        return await func()
+
+
+def _forget(calls: Dict[Hashable, _Call], key: Hashable, call: _Call) -> None:
+    if calls.get(key) is call:
+        del calls[key]
+    # Retrieve the exception so an abandoned call isn't reported as unhandled.
+    if not call.task.cancelled():
+        call.task.exception()
+
+
+# Shared by the generation services so identical concurrent requests make one paid call.
+generation_flight = SingleFlight("generation")
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from exceptions import NetworkError, SonautoError
+
+SONAUTO_OUTSTANDING = Gauge("sonauto_tasks_outstanding", "Sonauto tasks awaiting completion")
+SONAUTO_STATUS_CHECKS = Counter("sonauto_status_checks_total", "Sonauto status requests made")
+SONAUTO_TASK_SECONDS = Histogram(
+    "sonauto_task_seconds",
+    "Time from submission until a Sonauto task was seen to succeed",
+    buckets=(10, 20, 30, 45, 60, 90, 120, 180, 300),
+)
+
+# Quantiles of past completion times at which to check a task.
+_LEVELS = [i / 20 for i in range(1, 20)] + [0.99]
+
+
+@dataclass
+class _Task:
+    task_id: str
+    check: Callable[[], Awaitable[str]]
+    future: asyncio.Future
+    started: float
+    due: float
+    waiters: int = 1
+    checking: bool = False
+
+
+class SonautoPoller:
+    """Multiplex status checks for every outstanding Sonauto task.
+
+    Once ``min_samples`` completions have been seen, each task is checked
+    at the quantiles of the observed completion times that lie past its
+    age, so checks are sparse early and dense around the usual finish;
+    past the slowest observed completion it is checked every quarter of
+    the median. Until then it falls back to a fixed ``fallback_interval``.
+    All status requests share a token bucket of ``rate`` per second, and
+    concurrent waiters on one task ID share its checks.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        fallback_interval: float = 5.0,
+        min_gap: float = 1.0,
+        max_wait: float = 100.0,
+        min_samples: int = 5,
+        history: int = 200,
+    ) -> None:
+        self.rate = rate
+        self.fallback_interval = fallback_interval
+        self.min_gap = min_gap
+        self.max_wait = max_wait
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=history)
+        self._quantiles: List[float] = []
+        self._median = 0.0
+        self._tasks: Dict[str, _Task] = {}
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._runner: Optional[asyncio.Task] = None
+        # The loop keeps only weak references to tasks; in-flight checks live here.
+        self._checks: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def outstanding(self) -> int:
+        return len(self._tasks)
+
+    def observe(self, seconds: float) -> None:
+        """Record a completion time and refresh the check schedule."""
+        self._samples.append(seconds)
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+        self._quantiles = [ordered[round(level * last)] for level in _LEVELS]
+        self._median = ordered[last // 2]
+        SONAUTO_TASK_SECONDS.observe(seconds)
+
+    def next_delay(self, age: float) -> float:
+        """Seconds until the next check of a task submitted ``age`` seconds ago."""
+        if len(self._samples) < self.min_samples:
+            return self.fallback_interval
+        for q in self._quantiles:
+            if q >= age + self.min_gap:
+                return q - age
+        return max(self.min_gap, self._median / 4)
+
+    async def wait(self, task_id: str, check: Callable[[], Awaitable[str]]) -> None:
+        """Return once ``check()`` reports ``SUCCESS`` for ``task_id``.
+
+        Raises :class:`SonautoError` on ``FAILURE`` and :class:`NetworkError`
+        when the task is still running after ``max_wait`` seconds.
+        """
+        task = self._tasks.get(task_id)
+        if task is None:
+            now = time.monotonic()
+            task = _Task(
+                task_id,
+                check,
+                asyncio.get_running_loop().create_future(),
+                now,
+                now + self.next_delay(0.0),
+            )
+            self._tasks[task_id] = task
+            SONAUTO_OUTSTANDING.set(len(self._tasks))
+        else:
+            task.waiters += 1
+        self._ensure_running()
+        try:
+            await asyncio.shield(task.future)
+        finally:
+            task.waiters -= 1
+            if task.waiters == 0 and self._tasks.get(task_id) is task:
+                del self._tasks[task_id]
+                SONAUTO_OUTSTANDING.set(len(self._tasks))
+                if self._wakeup is not None:
+                    self._wakeup.set()
+
+    def _ensure_running(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def _take_token(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(1.0, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def _run(self) -> None:
+        try:
+            await self._schedule()
+        finally:
+            # Checks still in flight have no one left to report to.
+            for check in self._checks:
+                check.cancel()
+
+    async def _schedule(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            self._wakeup.clear()
+            waiting = [t for t in self._tasks.values() if not t.future.done() and not t.checking]
+            if not waiting:
+                if not self._tasks:
+                    return
+                await self._wakeup.wait()
+                continue
+            task = min(waiting, key=lambda t: t.due)
+            delay = task.due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._take_token()
+            if task.future.done():
+                continue
+            task.checking = True
+            check = asyncio.get_running_loop().create_task(self._check(task))
+            self._checks.add(check)
+            check.add_done_callback(self._checks.discard)
+
+    async def _check(self, task: _Task) -> None:
+        try:
+            SONAUTO_STATUS_CHECKS.inc()
+            state = await task.check()
+        except Exception as exc:
+            if not task.future.done():
+                task.future.set_exception(exc)
+            return
+        finally:
+            task.checking = False
+            if self._wakeup is not None:
+                self._wakeup.set()
+        age = time.monotonic() - task.started
+        if task.future.done():
+            return
+        if state == "SUCCESS":
+            self.observe(age)
+            task.future.set_result(None)
+        elif state == "FAILURE":
+            task.future.set_exception(SonautoError("Music generation failed"))
+        elif age >= self.max_wait:
+            task.future.set_exception(NetworkError("Music generation timed out"))
+        else:
+            task.due = time.monotonic() + min(self.next_delay(age), self.max_wait - age)
+
+
+_pollers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SonautoPoller]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_sonauto_poller(rate: float) -> SonautoPoller:
+    """Return the Sonauto poller for the running loop, capped at ``rate`` checks/s."""
+    loop = asyncio.get_running_loop()
+    poller = _pollers.get(loop)
+    if poller is None:
+        poller = _pollers[loop] = SonautoPoller(rate)
+    poller.rate = rate
+    return poller